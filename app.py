@@ -1,21 +1,257 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+import time
+# Taken before the heavy imports so the startup log covers them too
+STARTED = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, g, Response, send_file
+from datetime import datetime, timezone
+from http import HTTPStatus
+import base64
+import binascii
+import hashlib
+import csv
+import io
 import json
-from pathlib import Path
+import logging
+import sys
 from secret_santa import SecretSanta
+from solvers import STRATEGIES
+from storage import DEFAULT_ROOT, event_directory, find_store
+from cache import LRUCache
+from event_state import EventStateStore
+from ingest import (CONTENT_TYPES, DEFAULT_MAX_BYTES, DEFAULT_MAX_PARTICIPANTS, RosterTooLarge, format_for_filename,
+                    parse_roster, roster_digest)
+from metrics import registry
+from assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, Asset, AssetCache
+from jobs import DEFAULT_MAX_QUEUED, DEFAULT_TIME_LIMIT, DEFAULT_WORKERS, JobRunner, JobStore
+from retention import Sweeper
+from tokens import RevocationCache, TokenError
+import tokens
+import profiling
 import os
 import uuid
-import tempfile
 
-app = Flask(__name__)
-app.secret_key = os.urandom(24)  # For session management
+# Static files are served from memory by static_file() below
+app = Flask(__name__, static_folder=None)
+# For session management; must be the same in every worker, so set SECRET_KEY
+# or preload the app before gunicorn forks
+app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(24)
+
+# Store SecretSanta instances per event (session-based isolation), shared by
+# all gunicorn workers on the host; each worker keeps a bounded number decoded
+event_santas = EventStateStore(
+    on_evict=lambda event_id: registry.inc('secret_santa_event_evictions_total', {'reason': 'memory'})
+)
+# Longest time-to-live an upload may ask for with ?ttl_days=
+app.config['MAX_EVENT_TTL_DAYS'] = float(os.environ.get('MAX_EVENT_TTL_DAYS', 365))
+
+# Upload limits; larger rosters are rejected while they are being read
+app.config['MAX_ROSTER_BYTES'] = int(os.environ.get('MAX_ROSTER_BYTES', DEFAULT_MAX_BYTES))
+app.config['MAX_ROSTER_PARTICIPANTS'] = int(os.environ.get('MAX_ROSTER_PARTICIPANTS', DEFAULT_MAX_PARTICIPANTS))
+# Validated rosters and their compiled models by (format, SHA-256 of the
+# upload), shared by every event in this worker. Organizers re-upload the
+# same file while they tweak other settings; a repeat skips parsing,
+# validation and compiling. Large rosters are big, so only a few are kept.
+roster_cache = LRUCache(maxsize=int(os.environ.get('ROSTER_CACHE_SIZE', 8)))
+
+def lookup_roster(fmt, digest):
+    cached = roster_cache.get((fmt, digest))
+    registry.inc('secret_santa_roster_cache_total', {'result': 'miss' if cached is None else 'hit'})
+    return cached
+# Most gifts per participant /generate accepts
+app.config['MAX_GIFTS'] = int(os.environ.get('MAX_GIFTS', 5))
+
+# Assignment records served by /check_assignment, keyed by (event_id, name)
+# and stored with the event's shared version. Any worker that saves pairings
+# moves the version on, so no worker serves a record replaced elsewhere.
+assignment_cache = LRUCache(
+    maxsize=int(os.environ.get('ASSIGNMENT_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('ASSIGNMENT_CACHE_TTL', 60))
+)
+
+# Startup and time-to-first-byte timings, logged once per process
+startup_log = logging.getLogger('secret_santa.startup')
+if not startup_log.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter('%(asctime)s [%(process)d] [startup] %(message)s'))
+    startup_log.addHandler(_handler)
+    startup_log.setLevel(logging.INFO)
+    startup_log.propagate = False
+
+# Every file under static/, read and compressed once; with gunicorn's
+# preload_app this happens in the master before the workers fork
+static_assets = AssetCache(os.path.join(app.root_path, 'static'))
+app.jinja_env.globals['asset_version'] = static_assets.version
+
+# The index has no per-request content, so it is rendered once
+index_page = None
+
+def warm_up():
+    """Compile and render the index template ahead of the first request."""
+    global index_page
+    template_path = os.path.join(app.root_path, 'templates', 'index.html')
+    with app.app_context():
+        html = render_template('index.html')
+    index_page = Asset(html.encode('utf-8'), 'text/html; charset=utf-8', os.path.getmtime(template_path))
+
+def send_asset(asset, cache_control):
+    """Serve an in-memory asset with validators and the best accepted encoding."""
+    encoding, body = asset.select(request.accept_encodings)
+    response = Response(body, content_type=asset.mimetype)
+    if encoding is not None:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(asset.etag(encoding))
+    response.last_modified = datetime.fromtimestamp(asset.mtime, timezone.utc)
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
+
+@app.route('/static/<path:filename>', endpoint='static')
+def static_file(filename):
+    asset = static_assets.get(filename)
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    # Only URLs carrying the current content hash may be cached for good
+    versioned = request.args.get('v') == asset.version
+    return send_asset(asset, IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL)
+
+first_request_served = False
+
+# Pairing generation runs as background jobs in killable solver processes
+app.config['JOB_TIME_LIMIT'] = float(os.environ.get('JOB_TIME_LIMIT', DEFAULT_TIME_LIMIT))
+# /feasibility runs in the request thread, so it only gets this long
+app.config['FEASIBILITY_TIME_LIMIT'] = float(os.environ.get('FEASIBILITY_TIME_LIMIT', 2.0))
+job_store = JobStore()
+
+# Signed, encrypted reveal tokens, checked without touching the event store;
+# off unless REVEAL_TOKEN_KEY is set, to the same value on every replica
+app.config['REVEAL_TOKEN_KEY'] = tokens.SECRET
+app.config['REVEAL_TOKEN_TTL'] = tokens.DEFAULT_TTL
+revocations = RevocationCache(event_santas.revocations)
+
+def revoke_tokens(event_id, givers=None):
+    """Invalidate reveal tokens issued so far, for some givers or the whole event."""
+    if app.config['REVEAL_TOKEN_KEY']:
+        event_santas.revoke(event_id, givers)
+        revocations.invalidate()
+
+# Reveals keep their event alive; each worker restarts an event's
+# time-to-live at most once per interval instead of writing on every reveal
+REVEAL_TOUCH_INTERVAL = 3600
+recently_revealed = LRUCache(maxsize=1024, ttl=REVEAL_TOUCH_INTERVAL)
+
+def note_reveal(event_id):
+    if recently_revealed.get(event_id) is None:
+        recently_revealed.set(event_id, True)
+        event_santas.touch(event_id)
+
+def finish_generation(job_id, payload, outcome):
+    """Record metrics and drop cached assignments and tokens once a job ends."""
+    stats = outcome['stats'] if outcome else {}
+    success = bool(outcome and outcome['success'])
+    record_solver_run(payload['strategy'], stats, success)
+    if 'save_seconds' in stats:
+        registry.observe('secret_santa_storage_duration_seconds', stats['save_seconds'], {'operation': 'write'})
+    if success:
+        assignment_cache.invalidate_where(lambda key: key[0] == payload['event_id'])
+        revoke_tokens(payload['event_id'])
+        # Tells every worker its cached assignments are stale
+        event_santas.bump(payload['event_id'])
+
+job_runner = JobRunner(
+    job_store,
+    workers=int(os.environ.get('JOB_WORKERS', DEFAULT_WORKERS)),
+    max_queued=int(os.environ.get('JOB_MAX_QUEUED', DEFAULT_MAX_QUEUED)),
+    on_finish=finish_generation
+)
+
+def expire_event(event_id):
+    registry.inc('secret_santa_event_evictions_total', {'reason': 'expired'})
+    assignment_cache.invalidate_where(lambda key: key[0] == event_id)
+
+# Removes events past their time-to-live in the background of every worker
+sweeper = Sweeper(event_santas, job_store, on_evict=expire_event)
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    sweeper.start()
 
-# Store SecretSanta instances per event (session-based isolation)
-# In production, consider using Redis or a database for this
-event_santas = {}
+@app.after_request
+def record_request(response):
+    """Record latency and outcome of every request for /metrics."""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    if 'request_started' in g:
+        registry.observe('secret_santa_request_duration_seconds',
+                         time.perf_counter() - g.request_started, {'route': route})
+    registry.inc('secret_santa_requests_total', {'route': route, 'status': response.status_code})
+    if response.status_code >= 400:
+        error_type = HTTPStatus(response.status_code).phrase.lower().replace(' ', '_')
+        registry.inc('secret_santa_request_failures_total', {'route': route, 'error': error_type})
+    log_first_request(route)
+    return response
+
+def log_first_request(route):
+    global first_request_served
+    if first_request_served or 'request_started' not in g:
+        return
+    first_request_served = True
+    now = time.perf_counter()
+    startup_log.info('first request %s served in %.1f ms, %.1f ms after process start',
+                     route, (now - g.request_started) * 1000, (now - STARTED) * 1000)
+
+def start_profile():
+    if profiling.requested(request.headers.get(profiling.HEADER)):
+        g.profile = profiling.Profile(f"{request.method}-{request.path}").start()
+
+def save_profile(response):
+    """Save the request's profile and name it in the X-Profile-Id header."""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile.stop()
+    return response
+
+def get_profile(profile_id):
+    """A saved profile's JSON report, with the summary and solver trace events."""
+    if not profiling.authorized(request.headers.get(profiling.HEADER)):
+        return jsonify({'error': 'Not found'}), 404
+    path = profiling.profile_path(profile_id, '.json')
+    if path is None:
+        return jsonify({'error': 'No such profile'}), 404
+    return send_file(path.resolve(), mimetype='application/json')
+
+def download_profile(profile_id):
+    """The raw cProfile stats, for pstats or snakeviz."""
+    if not profiling.authorized(request.headers.get(profiling.HEADER)):
+        return jsonify({'error': 'Not found'}), 404
+    path = profiling.profile_path(profile_id, '.prof')
+    if path is None:
+        return jsonify({'error': 'No such profile'}), 404
+    return send_file(path.resolve(), mimetype='application/octet-stream',
+                     as_attachment=True, download_name=f"{profile_id}.prof")
+
+# Profiling hooks and routes only exist when profiling is configured, so a
+# normal deployment does not pay even for the header check
+if profiling.available():
+    app.before_request(start_profile)
+    app.after_request(save_profile)
+    app.add_url_rule('/profiles/<profile_id>', view_func=get_profile)
+    app.add_url_rule('/profiles/<profile_id>/pstats', view_func=download_profile)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics, summed over every worker on the host."""
+    events, participants = event_santas.totals()
+    text = registry.render({
+        'secret_santa_events': events,
+        'secret_santa_participants': participants
+    })
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    if index_page is None or app.debug:
+        warm_up()
+    return send_asset(index_page, REVALIDATE_CACHE_CONTROL)
 
 def get_or_create_event_id():
     """Get the event ID from session or create a new one."""
@@ -26,69 +262,395 @@ def get_or_create_event_id():
 def get_santa_for_session():
     """Get the SecretSanta instance for the current session."""
     event_id = get_or_create_event_id()
-    if event_id not in event_santas:
-        event_santas[event_id] = SecretSanta()
-    return event_santas[event_id]
+    santa = event_santas.load(event_id)
+    if santa is None:
+        santa = SecretSanta()
+    return santa
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+    fmt = CONTENT_TYPES.get(request.mimetype)
+    if fmt is not None:
+        # Roster sent as the raw request body, parsed straight off the stream
+        stream = request.stream
+    else:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        fmt = format_for_filename(file.filename)
+        if fmt is None:
+            return jsonify({'error': 'File must be JSON, NDJSON or CSV'}), 400
+        stream = file.stream
     
-    if not file.filename.endswith('.json'):
-        return jsonify({'error': 'File must be JSON'}), 400
+    # Days to keep the event after its last change; the server default if absent
+    ttl = None
+    if 'ttl_days' in request.args:
+        try:
+            ttl_days = float(request.args['ttl_days'])
+        except ValueError:
+            ttl_days = 0
+        if not 0 < ttl_days <= app.config['MAX_EVENT_TTL_DAYS']:
+            return jsonify({'error': f"ttl_days must be a number of days up to {app.config['MAX_EVENT_TTL_DAYS']:g}"}), 400
+        ttl = ttl_days * 24 * 3600
     
-    # Get session-specific SecretSanta instance
-    santa = get_santa_for_session()
+    # Load into a fresh instance so a failed upload keeps the previous roster
+    santa = SecretSanta()
     event_id = get_or_create_event_id()
     
-    # Use unique temporary filename to prevent conflicts
-    temp_filename = f"temp_participants_{event_id}_{uuid.uuid4().hex[:8]}.json"
-    temp_path = Path(tempfile.gettempdir()) / temp_filename
-    
+    max_bytes = app.config['MAX_ROSTER_BYTES']
     try:
-        file.save(temp_path)
-        
-        # Load participants
-        if santa.load_from_file(str(temp_path)):
-            # Clean up
-            temp_path.unlink()
-            return jsonify({'message': 'Participants loaded successfully', 'event_id': event_id})
-        else:
-            # Clean up
-            temp_path.unlink()
-            return jsonify({'error': 'Failed to load participants'}), 400
+        # Seekable uploads are hashed first, so a repeat skips parsing; a
+        # raw body is hashed while parsed and only reuses the compiled model
+        digest = roster_digest(stream, max_bytes)
+        cached = None if digest is None else lookup_roster(fmt, digest)
+        if cached is None:
+            hasher = hashlib.sha256()
+            participants, errors = parse_roster(
+                stream, fmt,
+                max_bytes=max_bytes,
+                max_participants=app.config['MAX_ROSTER_PARTICIPANTS'],
+                digest=hasher
+            )
+            if digest is None and not errors:
+                digest = hasher.hexdigest()
+                cached = lookup_roster(fmt, digest)
+    except RosterTooLarge:
+        return jsonify({'error': 'Failed to load participants',
+                        'errors': [{'row': 0, 'message': f'Roster exceeds {max_bytes} bytes'}]}), 400
     except Exception as e:
-        # Ensure cleanup on error
-        if temp_path.exists():
-            temp_path.unlink()
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+    
+    if cached is not None:
+        participants, model = cached
+        santa.load_participants(participants, model)
+    else:
+        if errors:
+            return jsonify({'error': 'Failed to load participants', 'errors': errors}), 400
+        santa.load_participants(participants)
+        roster_cache.set((fmt, digest), (participants, santa.shared_model()))
+    event_santas.save(event_id, santa, ttl=ttl)
+    return jsonify({'message': 'Participants loaded successfully', 'event_id': event_id})
 
 @app.route('/generate', methods=['POST'])
 def generate_pairings():
     santa = get_santa_for_session()
     event_id = get_or_create_event_id()
     
-    pairings = santa.generate_pairings()
-    if pairings:
-        # Save to event-specific directory
-        event_dir = f"secret_santa_pairings/{event_id}"
-        santa.save_pairings(pairings, base_dir=event_dir)
-        return jsonify({
-            'message': 'Pairings generated successfully',
-            'passwords': santa.passwords,
-            'event_id': event_id
-        })
+    # Optional solver selection, e.g. {"strategy": "matching"}, previous
+    # event IDs whose pairings should not be repeated, and gifts per person
+    options = request.get_json(silent=True) or {}
+    history_ids = options.get('history', [])
+    gifts = options.get('gifts', 1)
+    strategy = options.get('strategy', 'weighted' if history_ids and gifts == 1 else 'auto')
+    if strategy not in STRATEGIES:
+        return jsonify({'error': f'Unknown strategy: {strategy}'}), 400
+    if not isinstance(gifts, int) or isinstance(gifts, bool) or not 1 <= gifts <= app.config['MAX_GIFTS']:
+        return jsonify({'error': f"gifts must be a whole number from 1 to {app.config['MAX_GIFTS']}"}), 400
+    if gifts > 1 and history_ids:
+        return jsonify({'error': 'history is not supported with more than one gift'}), 400
+    
+    # Seconds the solver may run; capped by the server's JOB_TIME_LIMIT
+    time_limit = options.get('time_limit', app.config['JOB_TIME_LIMIT'])
+    if not isinstance(time_limit, (int, float)) or isinstance(time_limit, bool) or time_limit <= 0:
+        return jsonify({'error': 'time_limit must be a positive number of seconds'}), 400
+    time_limit = min(time_limit, app.config['JOB_TIME_LIMIT'])
+    if len(santa.participants) < 2:
+        return jsonify({'error': 'Need at least 2 participants'}), 400
+    
+    history_files = [event_directory(h) for h in history_ids]
+    if not santa.load_history(history_files):
+        return jsonify({'error': 'Could not load previous events'}), 400
+    
+    # Solve in the background and save to the event-specific directory
+    payload = {
+        'event_id': event_id,
+        'roster': santa.to_state(),
+        'history': santa.history,
+        'strategy': strategy,
+        'gifts': gifts,
+        'base_dir': str(event_directory(event_id)),
+        # Profiled requests also profile the job that does the work
+        'profile': 'profile' in g
+    }
+    job_id = job_store.create(event_id, time_limit)
+    if not job_runner.submit(job_id, payload, time_limit):
+        job_store.update(job_id, status='failed', phase='done', error='Too many pending jobs', finished=time.time())
+        return jsonify({'error': 'Too many pending jobs, try again later'}), 503
+    return jsonify({
+        'message': 'Generating pairings',
+        'job_id': job_id,
+        'status': 'queued',
+        'event_id': event_id
+    }), 202
+
+@app.route('/feasibility')
+def check_feasibility():
+    """Dry run: whether the session's roster can be paired at all.
+
+    Infeasible rosters come with a minimal set of participants whose
+    exclusions conflict and the fewer people they may draw between them.
+    The check runs inside the request, so after FEASIBILITY_TIME_LIMIT
+    seconds it gives up and answers "feasible": null; generating still
+    reports any conflict.
+    """
+    santa = get_santa_for_session()
+    if len(santa.participants) < 2:
+        return jsonify({'error': 'Need at least 2 participants'}), 400
+    result = santa.check_feasibility(time_limit=app.config['FEASIBILITY_TIME_LIMIT'])
+    if result is None:
+        return jsonify({'error': 'Invalid exclusions in roster'}), 400
+    if result['feasible'] is False:
+        result['error'] = (f"{', '.join(result['participants'])} can only draw from "
+                           f"{', '.join(result['receivers']) or 'nobody'}")
+    return jsonify(result)
+
+def get_job_for_session(job_id):
+    """Return the job if it belongs to the session's event, else None."""
+    job = job_store.get(job_id)
+    if job is None or job['event_id'] != session.get('event_id'):
+        return None
+    return job
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status and progress of a generation job."""
+    job = get_job_for_session(job_id)
+    if job is None:
+        return jsonify({'error': 'No such job'}), 404
+    end = job['finished'] or time.time()
+    return jsonify({
+        'job_id': job_id,
+        'event_id': job['event_id'],
+        'status': job['status'],
+        'phase': job['phase'],
+        'elapsed': round(end - (job['started'] or end), 3),
+        'time_limit': job['time_limit'],
+        'error': job['error'],
+        'profile_id': job['profile_id']
+    })
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """A summary of a finished generation job; passwords come from /export."""
+    job = get_job_for_session(job_id)
+    if job is None:
+        return jsonify({'error': 'No such job'}), 404
+    if job['status'] in ('queued', 'running'):
+        return jsonify({'error': 'Job has not finished', 'status': job['status']}), 409
+    if job['status'] != 'succeeded':
+        return jsonify({'error': job['error'] or 'Could not generate valid pairings', 'status': job['status']}), 400
+    return jsonify({
+        'message': 'Pairings generated successfully',
+        'participants': job['result']['participants'],
+        'event_id': job['event_id'],
+        'export': url_for('export_passwords')
+    })
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = get_job_for_session(job_id)
+    if job is None:
+        return jsonify({'error': 'No such job'}), 404
+    if not job_store.request_cancel(job_id):
+        return jsonify({'error': f"Job already {job['status']}", 'status': job['status']}), 409
+    return jsonify({'message': 'Cancellation requested', 'job_id': job_id})
+
+# Rows per streamed chunk of /export, and the largest page it serves
+EXPORT_CHUNK_ROWS = 500
+app.config['MAX_EXPORT_PAGE'] = int(os.environ.get('MAX_EXPORT_PAGE', 10000))
+
+def encode_cursor(giver):
+    return base64.urlsafe_b64encode(giver.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+
+def export_chunks(records, fmt, event_id):
+    """Encode assignment records as NDJSON or CSV, a few hundred at a time.
+
+    Each row has the giver's name and password, plus a reveal token when
+    tokens are enabled; receivers are never exported.
+    """
+    secret = app.config['REVEAL_TOKEN_KEY']
+    ttl = app.config['REVEAL_TOKEN_TTL']
+    columns = ['name', 'password', 'token'] if secret else ['name', 'password']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writerow(columns)
+    for count, record in enumerate(records, start=1):
+        row = [record['giver'], record['password']]
+        if secret:
+            row.append(tokens.issue(secret, event_id, record['giver'],
+                                    record.get('receivers', record['receiver']), ttl))
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row))) + '\n')
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@app.route('/export')
+def export_passwords():
+    """Stream the event's passwords for distribution as NDJSON or CSV.
+
+    Without ``limit`` the whole event is streamed straight from the event
+    store. With it, one page of names after ``cursor`` is returned, and
+    the cursor of the next page is in the X-Next-Cursor and Link headers.
+    Every export issues fresh reveal tokens when they are enabled.
+    """
+    event_id = session.get('event_id')
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    limit = request.args.get('limit', type=int)
+    if limit is not None and not 1 <= limit <= app.config['MAX_EXPORT_PAGE']:
+        return jsonify({'error': f"limit must be from 1 to {app.config['MAX_EXPORT_PAGE']}"}), 400
+    after = None
+    if 'cursor' in request.args:
+        try:
+            after = decode_cursor(request.args['cursor'])
+        except (binascii.Error, UnicodeDecodeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    store = find_store(event_directory(event_id)) if event_id else None
+    if store is None:
+        return jsonify({'error': 'No pairings have been generated for this event'}), 404
+    
+    headers = {}
+    if limit is None:
+        records = store.assignments(after)
     else:
-        return jsonify({'error': 'Could not generate valid pairings'}), 400
+        # One row more than the page tells whether another page follows
+        records = list(store.assignments(after, limit + 1))
+        if len(records) > limit:
+            records = records[:limit]
+            cursor = encode_cursor(records[-1]['giver'])
+            headers['X-Next-Cursor'] = cursor
+            headers['Link'] = f'<{url_for("export_passwords", format=fmt, limit=limit, cursor=cursor)}>; rel="next"'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if fmt == 'csv':
+        headers['Content-Disposition'] = f'attachment; filename="passwords-{event_id}.csv"'
+    return Response(export_chunks(records, fmt, event_id), mimetype=mimetype, headers=headers)
+
+def load_saved_pairings(event_id):
+    """Return the saved pairings of an event, or None if it has none."""
+    store = find_store(event_directory(event_id))
+    if store is None:
+        return None
+    return store.read_master_list()['pairings']
+
+@app.route('/participants/add', methods=['POST'])
+def add_participant():
+    """Add a late participant to a generated event without reshuffling it.
+
+    Accepts {"name": ..., "exclusions": [...], "groups": [...]}.
+    """
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    exclusions = data.get('exclusions', [])
+    if not name:
+        return jsonify({'error': 'Name required'}), 400
+    
+    santa = get_santa_for_session()
+    event_id = get_or_create_event_id()
+    pairings = load_saved_pairings(event_id)
+    if pairings is None:
+        return jsonify({'error': 'Generate pairings before adding participants'}), 400
+    
+    changed = santa.add_late_participant(name, exclusions, pairings, data.get('groups'))
+    if changed is None:
+        return jsonify({'error': f'Could not add {name}'}), 400
+    
+    santa.save_changes(changed, base_dir=event_directory(event_id))
+    event_santas.save(event_id, santa)
+    assignment_cache.invalidate_where(lambda key: key[0] == event_id and key[1] in changed)
+    revoke_tokens(event_id, changed)
+    return jsonify({
+        'message': f'{name} added',
+        'password': santa.passwords[name],
+        'changed': sorted(changed),
+        'event_id': event_id
+    })
+
+@app.route('/participants/remove', methods=['POST'])
+def remove_participant():
+    """Remove a participant from a generated event, re-pairing only around them."""
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    if not name:
+        return jsonify({'error': 'Name required'}), 400
+    
+    santa = get_santa_for_session()
+    event_id = get_or_create_event_id()
+    pairings = load_saved_pairings(event_id)
+    if pairings is None:
+        return jsonify({'error': 'Generate pairings before removing participants'}), 400
+    
+    changed = santa.remove_participant(name, pairings)
+    if changed is None:
+        return jsonify({'error': f'Could not remove {name}'}), 400
+    
+    santa.save_changes(changed, removed=[name], base_dir=event_directory(event_id))
+    event_santas.save(event_id, santa)
+    assignment_cache.invalidate_where(lambda key: key[0] == event_id and (key[1] in changed or key[1] == name))
+    revoke_tokens(event_id, [*changed, name])
+    return jsonify({
+        'message': f'{name} removed',
+        'changed': sorted(changed),
+        'event_id': event_id
+    })
+
+def record_solver_run(strategy, stats, success):
+    registry.inc('secret_santa_solver_runs_total',
+                 {'strategy': strategy, 'result': 'success' if success else 'failure'})
+    if 'seconds' in stats:
+        registry.observe('secret_santa_solver_duration_seconds', stats['seconds'], {'strategy': strategy})
+    if 'attempts' in stats:
+        registry.observe('secret_santa_solver_attempts', stats['attempts'], {'strategy': strategy})
+
+def lookup_assignment(event_id, name):
+    """Find a giver's assignment record for an event, or None.
+
+    Cached records are only used while the event's shared version is the
+    one they were read at.
+    """
+    key = (event_id, name)
+    # Read before the record, so a record saved meanwhile is cached as stale
+    version = event_santas.version(event_id)
+    cached = assignment_cache.get(key)
+    assignment = cached[1] if cached is not None and cached[0] == version else None
+    registry.inc('secret_santa_assignment_cache_total', {'result': 'miss' if assignment is None else 'hit'})
+    if assignment is None:
+        with registry.time('secret_santa_storage_duration_seconds', {'operation': 'lookup'}):
+            assignment = load_assignment(event_id, name)
+        if assignment is not None:
+            assignment_cache.set(key, (version, assignment))
+    return assignment
+
+def load_assignment(event_id, name):
+    """Read a giver's assignment record from the event store."""
+    # Check in event-specific store first, then fall back to root for backward compatibility
+    for base_dir in (event_directory(event_id), DEFAULT_ROOT):
+        store = find_store(base_dir)
+        if store is not None:
+            assignment = store.lookup(name)
+            if assignment is not None:
+                return assignment
+    return None
 
 @app.route('/check_assignment', methods=['POST'])
 def check_assignment():
     data = request.get_json()
+    if data.get('token'):
+        return check_token(data['token'])
     name = data.get('name')
     password = data.get('password')
     event_id = data.get('event_id') or session.get('event_id')
@@ -99,27 +661,62 @@ def check_assignment():
     if not event_id:
         return jsonify({'error': 'Event ID required. Please provide event_id or upload participants first.'}), 400
     
-    # Check in event-specific directory first, then fall back to root for backward compatibility
-    assignment_file = Path(f"secret_santa_pairings/{event_id}") / f"{name}.json"
-    if not assignment_file.exists():
-        # Fallback to root directory for backward compatibility
-        assignment_file = Path("secret_santa_pairings") / f"{name}.json"
-    
-    if not assignment_file.exists():
-        return jsonify({'error': 'No assignment found'}), 404
-    
     try:
-        with open(assignment_file, "r") as f:
-            assignment = json.load(f)
+        assignment = lookup_assignment(event_id, name)
+        if assignment is None:
+            return jsonify({'error': 'No assignment found'}), 404
         
         if assignment["password"] != password:
             return jsonify({'error': 'Invalid password'}), 401
         
-        return jsonify({
-            'receiver': assignment['receiver']
-        })
+        note_reveal(event_id)
+        result = {'receiver': assignment['receiver']}
+        if 'receivers' in assignment:
+            result['receivers'] = assignment['receivers']
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def check_token(token):
+    """Reveal an assignment from a token alone: pure CPU, no store lookup.
+
+    The only store access is the hourly write that keeps the event alive.
+    """
+    secret = app.config['REVEAL_TOKEN_KEY']
+    if not secret:
+        return jsonify({'error': 'Reveal tokens are not enabled'}), 400
+    try:
+        claims = tokens.verify(secret, token)
+    except TokenError as e:
+        return jsonify({'error': str(e)}), 401
+    if revocations.revoked(claims):
+        return jsonify({'error': 'Token revoked'}), 401
+    note_reveal(claims['event_id'])
+    receiver = claims['receiver']
+    if isinstance(receiver, list):
+        return jsonify({'name': claims['giver'], 'receiver': receiver[0], 'receivers': receiver})
+    return jsonify({'name': claims['giver'], 'receiver': receiver})
+
+@app.route('/tokens/revoke', methods=['POST'])
+def revoke_event_tokens():
+    """Revoke the session event's reveal tokens issued so far.
+
+    Accepts {"names": [...]} to revoke only those participants' tokens;
+    later exports issue new ones.
+    """
+    event_id = session.get('event_id')
+    if not app.config['REVEAL_TOKEN_KEY']:
+        return jsonify({'error': 'Reveal tokens are not enabled'}), 400
+    if not event_id or event_id not in event_santas:
+        return jsonify({'error': 'No event in this session'}), 404
+    names = (request.get_json(silent=True) or {}).get('names')
+    if names is not None and (not isinstance(names, list) or not all(isinstance(n, str) and n for n in names)):
+        return jsonify({'error': 'names must be a list of participant names'}), 400
+    revoke_tokens(event_id, names)
+    return jsonify({'message': 'Tokens revoked', 'event_id': event_id})
+
+warm_up()
+startup_log.info('app loaded in %.1f ms (%d static assets)', (time.perf_counter() - STARTED) * 1000, len(static_assets))
+
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
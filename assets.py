@@ -0,0 +1,144 @@
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Precompressed siblings, preferred in this order when the client accepts them
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Versioned URLs (?v=<version>) never change, so browsers may keep them a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Unversioned URLs are revalidated with their ETag on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Compressing tiny files costs more in headers than it saves
+MIN_COMPRESS_BYTES = 256
+
+
+class Asset:
+    """One static file held in memory with its compressed variants."""
+
+    def __init__(self, body: bytes, mimetype: str, mtime: float,
+                 variants: Optional[Dict[str, bytes]] = None):
+        self.body = body
+        self.mimetype = mimetype
+        self.mtime = mtime
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = variants if variants is not None else compress(body)
+
+    def select(self, accept_encodings) -> tuple:
+        """Return ``(encoding, body)`` for the best variant the client accepts."""
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and accept_encodings[encoding]:
+                return encoding, self.variants[encoding]
+        return None, self.body
+
+    def etag(self, encoding: Optional[str]) -> str:
+        # Each encoding is a different representation and needs its own tag
+        return self.version if encoding is None else f"{self.version}-{encoding}"
+
+
+def compress(body: bytes) -> Dict[str, bytes]:
+    """Compress ``body`` with every available encoding that makes it smaller."""
+    variants = {}
+    if len(body) < MIN_COMPRESS_BYTES:
+        return variants
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    # mtime=0 keeps the output, and so its ETag, identical across restarts
+    variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def _mimetype(path: Path) -> str:
+    mimetype, _ = mimetypes.guess_type(path.name)
+    if path.suffix == ".md":
+        mimetype = "text/markdown"
+    mimetype = mimetype or "application/octet-stream"
+    if mimetype.startswith("text/") or mimetype in ("application/javascript", "application/json"):
+        mimetype += "; charset=utf-8"
+    return mimetype
+
+
+class AssetCache:
+    """Every file under a static directory, read and compressed once.
+
+    Files are loaded when the cache is built, which happens at import time
+    of the app, so with gunicorn's ``preload_app`` the work is done once in
+    the master and shared by every forked worker. ``.gz`` and ``.br`` files
+    written next to an asset by ``python assets.py`` are used as its
+    variants as long as they are newer than the asset itself.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.assets: Dict[str, Asset] = {}
+        self.load()
+
+    def load(self) -> None:
+        assets = {}
+        if self.directory.is_dir():
+            for path in sorted(self.directory.rglob("*")):
+                if not path.is_file() or path.suffix in (".gz", ".br"):
+                    continue
+                name = path.relative_to(self.directory).as_posix()
+                assets[name] = self._read(path)
+        self.assets = assets
+
+    def _read(self, path: Path) -> Asset:
+        body = path.read_bytes()
+        mtime = path.stat().st_mtime
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            sibling = path.with_name(path.name + suffix)
+            if sibling.exists() and sibling.stat().st_mtime >= mtime:
+                variants[encoding] = sibling.read_bytes()
+        if not variants:
+            variants = compress(body)
+        return Asset(body, _mimetype(path), mtime, variants)
+
+    def get(self, name: str) -> Optional[Asset]:
+        return self.assets.get(name)
+
+    def version(self, name: str) -> str:
+        """Content hash used to build cache-busting URLs."""
+        asset = self.assets.get(name)
+        return asset.version if asset is not None else ""
+
+    def __len__(self) -> int:
+        return len(self.assets)
+
+
+def precompress_directory(directory: Union[str, Path]) -> int:
+    """Write ``.gz`` (and ``.br`` if brotli is installed) next to every asset.
+
+    Returns the number of files written.
+    """
+    written = 0
+    for path in sorted(Path(directory).rglob("*")):
+        if not path.is_file() or path.suffix in (".gz", ".br"):
+            continue
+        for encoding, data in compress(path.read_bytes()).items():
+            suffix = dict(ENCODINGS)[encoding]
+            path.with_name(path.name + suffix).write_bytes(data)
+            written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompress static assets at build time.")
+    parser.add_argument("directory", nargs="?", default=os.path.join(os.path.dirname(__file__), "static"))
+    args = parser.parse_args()
+    print(f"Wrote {precompress_directory(args.directory)} compressed file(s)")
+
+
+if __name__ == "__main__":
+    main()
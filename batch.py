@@ -0,0 +1,260 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from ingest import FORMATS, format_for_filename, parse_roster
+from secret_santa import SecretSanta
+from solvers import STRATEGIES
+from storage import BACKENDS
+
+DEFAULT_OUTPUT = "secret_santa_pairings"
+DEFAULT_TIME_BUDGET = 60.0
+
+# Event IDs become directory names under the output directory
+EVENT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9._-]*$")
+
+STATUSES = ("ok", "infeasible", "invalid", "timeout", "error")
+
+# (event_id, format, path or None, inline roster bytes or None)
+Task = Tuple[str, str, Optional[str], Optional[bytes]]
+
+
+class EventTimeout(Exception):
+    """Raised inside a worker when an event exceeds its time budget."""
+
+
+def collect_rosters(paths: List[str]) -> List[Task]:
+    """Expand files, directories and glob patterns into roster tasks.
+
+    Each file is one event named after the file without its extension;
+    directories contribute every roster file directly inside them.
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                str(p) for p in Path(path).iterdir() if p.is_file() and format_for_filename(p.name)
+            ))
+        elif glob.has_magic(path):
+            files.extend(sorted(p for p in glob.glob(path) if format_for_filename(p)))
+        else:
+            files.append(path)
+    return [(_file_event_id(f), format_for_filename(f) or "json", f, None) for f in files]
+
+
+def _file_event_id(path: str) -> str:
+    # Only the roster extension goes, so office.2024.json and
+    # office.2025.json stay two events
+    name = Path(path).name
+    for extension in FORMATS:
+        if name.lower().endswith(extension):
+            return name[:-len(extension)]
+    return Path(path).stem
+
+
+def read_stdin_events(stream: IO[bytes]) -> Iterator[Task]:
+    """Yield one task per non-empty NDJSON line of ``stream``.
+
+    Each line is a roster document as accepted by ``/upload``, plus an
+    optional ``event_id``; events without one are named after their line.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield _inline_event_id(line, f"event-{line_number}"), "json", None, line
+
+
+def solve_event(task: Task, strategy: str = "auto", output: str = DEFAULT_OUTPUT,
+                backend: Optional[str] = None, time_budget: Optional[float] = DEFAULT_TIME_BUDGET,
+                gifts: int = 1) -> Dict:
+    """Load, solve and save one event; never raises.
+
+    Runs in a pool worker. Loading and solving must finish within
+    ``time_budget`` seconds; messages SecretSanta prints are returned in
+    the result's ``errors`` instead.
+    """
+    event_id, fmt, path, payload = task
+    result = {"event_id": event_id, "source": path or "stdin", "status": "error",
+              "participants": 0, "seconds": 0.0, "errors": []}
+    started = time.perf_counter()
+    messages = io.StringIO()
+    try:
+        with _time_budget(time_budget), contextlib.redirect_stdout(messages):
+            if payload is not None:
+                participants, errors = parse_roster(io.BytesIO(payload), fmt)
+            else:
+                with open(path, "rb") as f:
+                    participants, errors = parse_roster(f, fmt)
+            if not EVENT_ID_PATTERN.match(event_id):
+                errors = errors + [{"row": 0, "message": f"Invalid event id: {event_id}"}]
+            if errors:
+                result["status"] = "invalid"
+                result["errors"] = [f"row {e['row']}: {e['message']}" for e in errors]
+                return result
+
+            santa = SecretSanta()
+            santa.load_participants(participants)
+            result["participants"] = len(participants)
+            pairings = santa.generate_pairings(strategy=strategy, gifts=gifts)
+        if pairings is None:
+            result["status"] = "infeasible"
+        else:
+            santa.save_pairings(pairings, base_dir=os.path.join(output, event_id), backend=backend)
+            result["status"] = "ok"
+    except EventTimeout:
+        result["status"] = "timeout"
+        result["errors"].append(f"Exceeded time budget of {time_budget} seconds")
+    except Exception as e:
+        result["errors"].append(str(e))
+    finally:
+        result["seconds"] = time.perf_counter() - started
+        result["errors"].extend(line for line in messages.getvalue().splitlines() if line.strip())
+    return result
+
+
+def _inline_event_id(payload: bytes, default: str) -> str:
+    try:
+        document = json.loads(payload)
+    except ValueError:
+        return default
+    if isinstance(document, dict) and isinstance(document.get("event_id"), str):
+        return document["event_id"]
+    return default
+
+
+@contextlib.contextmanager
+def _time_budget(seconds: Optional[float]) -> Iterator[None]:
+    # SIGALRM interrupts the pure-Python solvers between bytecodes; it is
+    # only available on Unix and in the main thread of a process
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise EventTimeout()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def run_batch(tasks: List[Task], workers: int = 1, on_result=None, **options) -> List[Dict]:
+    """Solve every task, in parallel when ``workers`` > 1.
+
+    ``options`` are passed to ``solve_event``; ``on_result`` is called
+    with each result as it finishes. Results are returned in task order.
+    """
+    results: List[Optional[Dict]] = [None] * len(tasks)
+    pending = []
+    seen = set()
+    for i, (event_id, _, path, _) in enumerate(tasks):
+        # Two rosters with one event id would overwrite each other's pairings
+        if event_id in seen:
+            results[i] = {"event_id": event_id, "source": path or "stdin", "status": "error",
+                          "participants": 0, "seconds": 0.0, "errors": [f"Duplicate event id: {event_id}"]}
+            if on_result is not None:
+                on_result(results[i])
+        else:
+            pending.append(i)
+        seen.add(event_id)
+
+    if workers <= 1 or len(pending) <= 1:
+        for i in pending:
+            results[i] = solve_event(tasks[i], **options)
+            if on_result is not None:
+                on_result(results[i])
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(solve_event, tasks[i], **options): i for i in pending}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if on_result is not None:
+                on_result(results[futures[future]])
+    return results
+
+
+def summarize(results: List[Dict], elapsed: float) -> Dict:
+    counts = {status: 0 for status in STATUSES}
+    for result in results:
+        counts[result["status"]] += 1
+    times = sorted(result["seconds"] for result in results)
+    return {
+        "events": len(results),
+        **counts,
+        "wall_seconds": elapsed,
+        "median_seconds": times[len(times) // 2] if times else None,
+        "max_seconds": times[-1] if times else None,
+        "results": results
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Generate pairings for many events at once without prompting.",
+        epilog="Use '-' to read one JSON roster per line from stdin."
+    )
+    parser.add_argument("rosters", nargs="*",
+                        help=f"roster files ({', '.join(sorted(FORMATS))}), directories or glob patterns")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="directory receiving one store per event")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="auto")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None)
+    parser.add_argument("--gifts", type=int, default=1, help="gifts each participant gives and receives")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--time-budget", type=float, default=DEFAULT_TIME_BUDGET,
+                        help="seconds allowed to load and solve each event (0 for no limit)")
+    parser.add_argument("--report", help="write the summary report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    paths = [path for path in args.rosters if path != "-"]
+    use_stdin = "-" in args.rosters or not args.rosters
+    if use_stdin and sys.stdin.isatty():
+        # Never wait for someone to type a roster
+        parser.error("no rosters given and stdin is a terminal")
+
+    tasks = collect_rosters(paths)
+    if use_stdin:
+        tasks.extend(read_stdin_events(sys.stdin.buffer))
+    if not tasks:
+        print("No rosters found")
+        return 1
+
+    def report(result):
+        print(f"{result['status']:<10} {result['event_id']:<30} {result['participants']:>8} "
+              f"{result['seconds']:>9.3f}s", flush=True)
+        for error in result["errors"][:5]:
+            print(f"    {error}")
+
+    started = time.perf_counter()
+    results = run_batch(tasks, workers=args.workers, on_result=report, strategy=args.strategy,
+                        output=args.output, backend=args.backend, time_budget=args.time_budget,
+                        gifts=args.gifts)
+    summary = summarize(results, time.perf_counter() - started)
+
+    print("-" * 60)
+    print(", ".join(f"{summary[status]} {status}" for status in STATUSES) + f" of {summary['events']} event(s)")
+    if summary["events"]:
+        print(f"Wall time {summary['wall_seconds']:.2f}s, median {summary['median_seconds']:.3f}s, "
+              f"slowest {summary['max_seconds']:.3f}s per event")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if summary["ok"] == summary["events"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
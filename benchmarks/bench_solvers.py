@@ -0,0 +1,254 @@
+"""Benchmark the pairing strategies on synthetic rosters.
+
+Runs every strategy against rosters of increasing size and several
+exclusion patterns, and writes one JSON record per case so runs from
+different commits can be compared:
+
+    python benchmarks/bench_solvers.py --output bench_results.json
+    python benchmarks/bench_solvers.py --compare bench_results.json
+    python benchmarks/bench_solvers.py --sharded-speedup --workers 4
+
+Each trial runs in a child process with a time budget, so a strategy that
+stalls on a large roster is reported as a timeout instead of hanging the
+suite.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Set
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import solvers
+from constraints import ConstraintModel
+from solvers import STRATEGIES
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+PATTERNS = ["none", "random", "households", "near_infeasible"]
+
+# Average number of exclusions per participant for the "random" pattern
+RANDOM_DEGREE = 4
+HOUSEHOLD_SIZE = 4
+# Cap on pairwise exclusions so the near-infeasible clique stays buildable
+MAX_EXCLUDED_PAIRS = 2_000_000
+
+
+def make_roster(size: int, pattern: str, seed: int = 0) -> Optional[Dict[str, Set[str]]]:
+    """Build a synthetic roster, or None if the pattern is too big at this size."""
+    rng = random.Random(seed)
+    names = [f"P{i}" for i in range(size)]
+    participants: Dict[str, Set[str]] = {name: set() for name in names}
+
+    if pattern == "random":
+        for _ in range(size * RANDOM_DEGREE // 2):
+            a, b = rng.sample(names, 2)
+            participants[a].add(b)
+    elif pattern == "households":
+        for start in range(0, size, HOUSEHOLD_SIZE):
+            household = names[start:start + HOUSEHOLD_SIZE]
+            for name in household:
+                participants[name].update(other for other in household if other != name)
+    elif pattern == "near_infeasible":
+        # One clique holding exactly half the roster: every member must draw
+        # from the other half, which leaves a single way to cover them
+        clique = rng.sample(names, size // 2)
+        if len(clique) ** 2 > MAX_EXCLUDED_PAIRS:
+            return None
+        for name in clique:
+            participants[name].update(other for other in clique if other != name)
+    return participants
+
+
+def _trial(participants: Dict[str, Set[str]], strategy: str, seed: int, measure_memory: bool, options: Dict,
+           queue) -> None:
+    random.seed(seed)
+    model = ConstraintModel.compile(participants)
+    stats: Dict = {}
+    if measure_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    pairings = STRATEGIES[strategy](model, stats=stats, **options)
+    elapsed = time.perf_counter() - started
+    peak = None
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    queue.put({
+        "success": pairings is not None,
+        "seconds": elapsed,
+        "attempts": stats.get("attempts"),
+        "peak_bytes": peak
+    })
+
+
+def run_trial(participants, strategy: str, seed: int, timeout: float, measure_memory: bool = False,
+              options: Optional[Dict] = None) -> Optional[Dict]:
+    """Run one solve in a child process; None means it exceeded ``timeout``.
+
+    ``options`` are passed to the strategy as keyword arguments.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_trial,
+                                      args=(participants, strategy, seed, measure_memory, options or {}, queue))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return None
+    return queue.get() if not queue.empty() else None
+
+
+def run_case(size: int, pattern: str, strategy: str, trials: int, timeout: float) -> Optional[Dict]:
+    participants = make_roster(size, pattern)
+    if participants is None:
+        return None
+
+    times: List[float] = []
+    attempts: List[int] = []
+    successes = 0
+    timeouts = 0
+    for trial in range(trials):
+        result = run_trial(participants, strategy, trial, timeout)
+        if result is None:
+            timeouts += 1
+            # Larger trials would only time out again
+            break
+        times.append(result["seconds"])
+        attempts.append(result["attempts"] or 0)
+        successes += result["success"]
+
+    peak = None
+    if timeouts == 0:
+        # Traced separately: tracemalloc slows the solver down noticeably
+        traced = run_trial(participants, strategy, 0, timeout * 4, measure_memory=True)
+        if traced is not None:
+            peak = traced["peak_bytes"]
+
+    runs = len(times)
+    return {
+        "size": size,
+        "pattern": pattern,
+        "strategy": strategy,
+        "trials": runs + timeouts,
+        "timeouts": timeouts,
+        "success_rate": successes / runs if runs else 0.0,
+        "median_seconds": sorted(times)[runs // 2] if runs else None,
+        "max_seconds": max(times) if runs else None,
+        "mean_attempts": sum(attempts) / runs if runs else None,
+        "peak_bytes": peak
+    }
+
+
+def sharded_speedup(sizes: List[int], patterns: List[str], workers: int, trials: int, timeout: float) -> None:
+    """Print how much faster ``sharded`` on ``workers`` cores is than ``auto``.
+
+    Only the largest rosters are worth sharding; sizes below two blocks
+    of MIN_SHARD_SIZE are skipped since they would just run ``auto``.
+    """
+    print(f"{'pattern':<16} {'size':>7} {'auto s':>10} {'sharded s':>10} {'speedup':>8}")
+    for size in sizes:
+        if size < 2 * solvers.MIN_SHARD_SIZE:
+            continue
+        for pattern in patterns:
+            participants = make_roster(size, pattern)
+            if participants is None:
+                continue
+            medians = []
+            for strategy, options in (("auto", {}), ("sharded", {"shards": workers, "workers": workers})):
+                times = []
+                for trial in range(trials):
+                    result = run_trial(participants, strategy, trial, timeout, options=options)
+                    if result is None:
+                        break
+                    times.append(result["seconds"])
+                medians.append(sorted(times)[len(times) // 2] if times else None)
+            auto, sharded = medians
+            speedup = f"{auto / sharded:.2f}" if auto and sharded else "-"
+            print(f"{pattern:<16} {size:>7} {_fmt(auto):>10} {_fmt(sharded):>10} {speedup:>8}", flush=True)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_file: str, results: List[Dict]) -> None:
+    """Print the median time of each case relative to a previous run."""
+    with open(baseline_file) as f:
+        baseline = {(r["size"], r["pattern"], r["strategy"]): r for r in json.load(f)["results"]}
+    print(f"\n{'case':<40} {'before':>10} {'after':>10} {'ratio':>7}")
+    for result in results:
+        key = (result["size"], result["pattern"], result["strategy"])
+        before = baseline.get(key, {}).get("median_seconds")
+        after = result["median_seconds"]
+        ratio = f"{after / before:.2f}" if before and after else "-"
+        label = f"{key[2]} {key[1]} n={key[0]}"
+        print(f"{label:<40} {_fmt(before):>10} {_fmt(after):>10} {ratio:>7}")
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds:.4f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Secret Santa pairing strategies.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--patterns", nargs="+", choices=PATTERNS, default=PATTERNS)
+    parser.add_argument("--strategies", nargs="+", choices=sorted(STRATEGIES), default=sorted(STRATEGIES))
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds allowed per trial")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--sharded-speedup", action="store_true",
+                        help="only compare sharded on --workers cores against auto")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if args.sharded_speedup:
+        sharded_speedup(args.sizes, args.patterns, args.workers, args.trials, args.timeout)
+        return
+
+    results = []
+    print(f"{'strategy':<10} {'pattern':<16} {'size':>7} {'success':>8} {'median s':>10} {'attempts':>9} {'peak MB':>8}")
+    for size in args.sizes:
+        for pattern in args.patterns:
+            for strategy in args.strategies:
+                result = run_case(size, pattern, strategy, args.trials, args.timeout)
+                if result is None:
+                    continue
+                results.append(result)
+                peak = "-" if result["peak_bytes"] is None else f"{result['peak_bytes'] / 2**20:.1f}"
+                attempts = "-" if result["mean_attempts"] is None else f"{result['mean_attempts']:.1f}"
+                status = "timeout" if result["timeouts"] else f"{result['success_rate']:.0%}"
+                print(f"{strategy:<10} {pattern:<16} {size:>7} {status:>8} "
+                      f"{_fmt(result['median_seconds']):>10} {attempts:>9} {peak:>8}", flush=True)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""Load and soak test the web app under gunicorn on localhost.
+
+Starts the real app with its gunicorn config in a scratch directory (or
+targets a running server with --url) and replays scripted scenarios at
+each requested concurrency:
+
+    upload    many organizers uploading rosters at once
+    generate  organizers uploading and generating together, polling jobs
+    reveal    bursts of /check_assignment with valid and invalid passwords
+
+and reports throughput, p50/p95/p99 latency and error rate per route.
+Only the standard library and localhost are used:
+
+    python benchmarks/load_test.py --workers 4 --threads 4 --concurrency 1 8 32 64
+    python benchmarks/load_test.py --scenarios reveal --duration 1800   # soak
+
+A request counts as an error when its status differs from the expected
+one: 200 for valid passwords, 401 for invalid ones, 202 for /generate.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SCENARIOS = ["upload", "generate", "reveal"]
+HOUSEHOLD_SIZE = 4
+# Seconds to wait for gunicorn to answer after starting it
+STARTUP_TIMEOUT = 60.0
+# Seconds between polls of a generation job
+POLL_INTERVAL = 0.05
+
+
+def make_roster(size: int, seed: int) -> bytes:
+    """A roster of households whose members may not draw each other."""
+    prefix = f"R{seed}-"
+    return json.dumps({"participants": [
+        {"name": f"{prefix}{i}", "groups": [f"{prefix}H{i // HOUSEHOLD_SIZE}"]} for i in range(size)
+    ]}).encode()
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+class Recorder:
+    """Collects (route, ok, seconds) samples from many client threads."""
+
+    def __init__(self):
+        self.samples: List[Tuple[str, bool, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, route: str, ok: bool, seconds: float) -> None:
+        with self._lock:
+            self.samples.append((route, ok, seconds))
+
+    def summary(self, elapsed: float) -> Dict[str, Dict]:
+        routes: Dict[str, List[Tuple[bool, float]]] = {}
+        for route, ok, seconds in self.samples:
+            routes.setdefault(route, []).append((ok, seconds))
+        result = {}
+        for route, samples in sorted(routes.items()):
+            times = sorted(seconds for _, seconds in samples)
+            errors = sum(1 for ok, _ in samples if not ok)
+            result[route] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": errors / len(samples),
+                "throughput": len(samples) / elapsed if elapsed else None,
+                "p50_seconds": percentile(times, 0.50),
+                "p95_seconds": percentile(times, 0.95),
+                "p99_seconds": percentile(times, 0.99)
+            }
+        return result
+
+
+class Client:
+    """One simulated browser: a keep-alive connection and its session cookie."""
+
+    def __init__(self, base_url: str, recorder: Optional[Recorder] = None):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.recorder = recorder
+        self.cookie = None
+        # Raw body of the last response, for ones that are not JSON
+        self.last_body = b""
+        self._connection = None
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None, content_type: str = "application/json",
+                route: Optional[str] = None, expected: int = 200) -> Tuple[int, Optional[Dict]]:
+        """Send one request and record it; status 0 means the connection failed."""
+        headers = {"Content-Type": content_type} if body is not None else {}
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        started = time.perf_counter()
+        try:
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self._connection.request(method, path, body=body, headers=headers)
+            response = self._connection.getresponse()
+            payload = response.read()
+            status = response.status
+            cookie = response.getheader("Set-Cookie")
+            if cookie:
+                self.cookie = cookie.split(";", 1)[0]
+        except (OSError, http.client.HTTPException):
+            self.close()
+            status, payload = 0, b""
+        self.last_body = payload
+        elapsed = time.perf_counter() - started
+        if self.recorder is not None:
+            self.recorder.add(route or path, status == expected, elapsed)
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+    def post_json(self, path: str, document: Dict, **kwargs) -> Tuple[int, Optional[Dict]]:
+        return self.request("POST", path, json.dumps(document).encode(), **kwargs)
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def organize(client: Client, roster: bytes, recorder: Optional[Recorder] = None) -> Optional[Dict]:
+    """Upload a roster and generate its pairings; return the job summary."""
+    status, data = client.request("POST", "/upload", roster, route="/upload")
+    if status != 200:
+        return None
+    started = time.perf_counter()
+    status, data = client.post_json("/generate", {}, route="/generate", expected=202)
+    if status != 202:
+        return None
+    job_id = data["job_id"]
+    while True:
+        status, job = client.request("GET", f"/jobs/{job_id}", route="/jobs/<job_id>")
+        if status != 200 or job["status"] not in ("queued", "running"):
+            break
+        time.sleep(POLL_INTERVAL)
+    status, result = client.request("GET", f"/jobs/{job_id}/result", route="/jobs/<job_id>/result")
+    if recorder is not None:
+        # End to end, from submitting the job to its summary
+        recorder.add("generation (end to end)", status == 200, time.perf_counter() - started)
+    return result if status == 200 else None
+
+
+def run_clients(concurrency: int, work: Callable[[int], None]) -> float:
+    """Run ``work(client_index)`` in ``concurrency`` threads; return the wall time."""
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def upload_scenario(base_url: str, concurrency: int, args, recorder: Recorder) -> float:
+    counter = iter(range(args.organizers))
+    lock = threading.Lock()
+
+    def work(index):
+        client = Client(base_url, recorder)
+        while True:
+            with lock:
+                seed = next(counter, None)
+            if seed is None:
+                break
+            client.request("POST", "/upload", make_roster(args.roster_size, seed), route="/upload")
+        client.close()
+
+    return run_clients(concurrency, work)
+
+
+def generate_scenario(base_url: str, concurrency: int, args, recorder: Recorder) -> float:
+    counter = iter(range(args.organizers))
+    lock = threading.Lock()
+
+    def work(index):
+        while True:
+            with lock:
+                seed = next(counter, None)
+            if seed is None:
+                break
+            # A new session per organizer, so every upload is its own event
+            client = Client(base_url, recorder)
+            organize(client, make_roster(args.roster_size, seed), recorder)
+            client.close()
+
+    return run_clients(concurrency, work)
+
+
+def prepare_reveal(base_url: str, args) -> List[Tuple[str, str, str]]:
+    """Create events to reveal; returns (event_id, name, password) triples."""
+    credentials = []
+    for seed in range(args.events):
+        client = Client(base_url)
+        result = organize(client, make_roster(args.roster_size, seed))
+        if result is None:
+            raise RuntimeError("Could not generate pairings for the reveal scenario")
+        client.request("GET", "/export")
+        rows = [json.loads(line) for line in client.last_body.decode().splitlines()]
+        credentials.extend((result["event_id"], row["name"], row["password"]) for row in rows)
+        client.close()
+    return credentials
+
+
+def reveal_scenario(base_url: str, concurrency: int, args, recorder: Recorder,
+                    credentials: List[Tuple[str, str, str]]) -> float:
+    deadline = time.perf_counter() + args.duration
+
+    def work(index):
+        rng = random.Random(args.seed * 1000 + index)
+        client = Client(base_url, recorder)
+        while time.perf_counter() < deadline:
+            event_id, name, password = rng.choice(credentials)
+            if rng.random() < args.invalid_ratio:
+                client.post_json("/check_assignment", {"event_id": event_id, "name": name, "password": "wrong"},
+                                 route="/check_assignment (invalid)", expected=401)
+            else:
+                client.post_json("/check_assignment", {"event_id": event_id, "name": name, "password": password},
+                                 route="/check_assignment")
+        client.close()
+
+    return run_clients(concurrency, work)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, threads: int, directory: str) -> Tuple[subprocess.Popen, str]:
+    """Start gunicorn on a free localhost port with all state in ``directory``."""
+    port = free_port()
+    env = dict(
+        os.environ,
+        SECRET_KEY="load-test",
+        SECRET_SANTA_METRICS_DIR=os.path.join(directory, "metrics"),
+        SECRET_SANTA_SWEEP_INTERVAL="0",
+    )
+    for name in ("SECRET_SANTA_STATE", "SECRET_SANTA_JOBS", "SECRET_SANTA_PROFILE_DIR", "SECRET_SANTA_ARCHIVE_DIR"):
+        env.pop(name, None)
+    log = open(os.path.join(directory, "gunicorn.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(REPO, "gunicorn_config.py"),
+         "--workers", str(workers), "--threads", str(threads), "--bind", f"127.0.0.1:{port}",
+         "--pythonpath", REPO, "app:app"],
+        cwd=directory, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited; see {log.name}")
+        status, _ = Client(base_url).request("GET", "/")
+        if status == 200:
+            return process, base_url
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Secret Santa web app.")
+    parser.add_argument("--url", help="test a running server instead of starting gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=2, help="gunicorn threads per worker")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="simultaneous clients; each scenario runs once per level")
+    parser.add_argument("--roster-size", type=int, default=50, help="participants per uploaded roster")
+    parser.add_argument("--organizers", type=int, default=50, help="uploads or generations per level")
+    parser.add_argument("--events", type=int, default=20, help="events whose participants the reveal checks")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of reveal traffic per level")
+    parser.add_argument("--invalid-ratio", type=float, default=0.2,
+                        help="share of reveal requests with a wrong password")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="load_results.json")
+    args = parser.parse_args()
+
+    directory = None
+    process = None
+    base_url = args.url
+    if base_url is None:
+        directory = tempfile.mkdtemp(prefix="secret-santa-load-")
+        process, base_url = start_server(args.workers, args.threads, directory)
+        print(f"gunicorn: {args.workers} worker(s) x {args.threads} thread(s) at {base_url}")
+
+    results = []
+    try:
+        credentials = prepare_reveal(base_url, args) if "reveal" in args.scenarios else []
+        print(f"\n{'scenario':<9} {'clients':>7} {'route':<32} {'requests':>9} {'req/s':>8} "
+              f"{'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                recorder = Recorder()
+                if scenario == "upload":
+                    elapsed = upload_scenario(base_url, concurrency, args, recorder)
+                elif scenario == "generate":
+                    elapsed = generate_scenario(base_url, concurrency, args, recorder)
+                else:
+                    elapsed = reveal_scenario(base_url, concurrency, args, recorder, credentials)
+                routes = recorder.summary(elapsed)
+                results.append({"scenario": scenario, "concurrency": concurrency,
+                                "wall_seconds": elapsed, "routes": routes})
+                for route, stats in routes.items():
+                    print(f"{scenario:<9} {concurrency:>7} {route:<32} {stats['requests']:>9} "
+                          f"{stats['throughput']:>8.1f} {stats['error_rate']:>7.1%} {_ms(stats['p50_seconds']):>8} "
+                          f"{_ms(stats['p95_seconds']):>8} {_ms(stats['p99_seconds']):>8}", flush=True)
+    finally:
+        if process is not None:
+            stop_server(process)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "url": args.url,
+        "workers": None if args.url else args.workers,
+        "threads": None if args.url else args.threads,
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} result(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,4 +6,7 @@ set -o errexit
 pip install -r requirements.txt
 
 # Create necessary directories
-mkdir -p secret_santa_pairings 
\ No newline at end of file
+mkdir -p secret_santa_pairings 
+
+# Precompress static assets so workers don't compress them at startup
+python assets.py static
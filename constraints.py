@@ -0,0 +1,147 @@
+import copy
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+_NO_EXCLUSIONS: FrozenSet[int] = frozenset()
+
+
+class ConstraintModel:
+    """Compiled, integer-indexed view of a roster's exclusions.
+
+    Names are interned to ints once and every exclusion is stored in both
+    directions, so a giver/receiver check is a single int lookup instead of
+    two string-keyed set lookups. Exclusions are kept as sparse int sets
+    rather than a dense n x n matrix: at 100k participants a matrix costs
+    over a gigabyte, while most participants exclude nobody and share one
+    empty set.
+
+    Exclusion groups (households, teams) are not expanded into pairs. Each
+    participant holds the ids of the groups they belong to, and two people
+    sharing any group may not draw each other, so a group of 50 costs 50
+    small sets instead of 2,450 pairs.
+    """
+
+    def __init__(self, names: List[str], blocked: List[FrozenSet[int]],
+                 groups: Optional[List[FrozenSet[int]]] = None, group_sizes: Optional[List[int]] = None,
+                 group_ids: Optional[Dict[str, int]] = None):
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self.blocked = blocked
+        self.groups = groups if groups is not None else [_NO_EXCLUSIONS] * len(names)
+        self.group_sizes = group_sizes or []
+        # Group name -> id, for adding participants later
+        self.group_ids = group_ids or {}
+
+    @classmethod
+    def compile(cls, participants: Dict[str, Set[str]],
+                groups: Optional[Dict[str, Set[str]]] = None) -> "ConstraintModel":
+        """Build the model from a validated name -> exclusions mapping.
+
+        ``groups`` maps participant names to the exclusion groups they
+        belong to; participants missing from it belong to none.
+        """
+        names = list(participants.keys())
+        index = {name: i for i, name in enumerate(names)}
+        pending: Dict[int, Set[int]] = {}
+        for name, exclusions in participants.items():
+            i = index[name]
+            for other in exclusions:
+                j = index[other]
+                if i == j:
+                    continue
+                pending.setdefault(i, set()).add(j)
+                pending.setdefault(j, set()).add(i)
+
+        blocked = [_NO_EXCLUSIONS] * len(names)
+        for i, others in pending.items():
+            blocked[i] = frozenset(others)
+
+        member_of = [_NO_EXCLUSIONS] * len(names)
+        group_ids: Dict[str, int] = {}
+        group_sizes: List[int] = []
+        for name, names_groups in (groups or {}).items():
+            if name not in index or not names_groups:
+                continue
+            ids = set()
+            for group in names_groups:
+                if group not in group_ids:
+                    group_ids[group] = len(group_sizes)
+                    group_sizes.append(0)
+                ids.add(group_ids[group])
+                group_sizes[group_ids[group]] += 1
+            member_of[index[name]] = frozenset(ids)
+        return cls(names, blocked, member_of, group_sizes, group_ids)
+
+    def copy(self) -> "ConstraintModel":
+        """An independent model to change with add and remove.
+
+        Only the per-person lists are copied; the frozensets they hold are
+        shared, as add and remove replace them rather than change them.
+        """
+        model = copy.copy(self)
+        model.names = list(self.names)
+        model.index = dict(self.index)
+        model.blocked = list(self.blocked)
+        model.groups = list(self.groups)
+        model.group_sizes = list(self.group_sizes)
+        model.group_ids = dict(self.group_ids)
+        return model
+
+    def add(self, name: str, exclusions: Iterable[str] = (), groups: Iterable[str] = ()) -> None:
+        """Add a participant in place, in time proportional to their exclusions."""
+        i = len(self.names)
+        self.names.append(name)
+        self.index[name] = i
+        others = {self.index[other] for other in exclusions if other != name}
+        self.blocked.append(frozenset(others) if others else _NO_EXCLUSIONS)
+        for j in others:
+            self.blocked[j] = self.blocked[j] | {i}
+        ids = set()
+        for group in groups:
+            if group not in self.group_ids:
+                self.group_ids[group] = len(self.group_sizes)
+                self.group_sizes.append(0)
+            ids.add(self.group_ids[group])
+        for group in ids:
+            self.group_sizes[group] += 1
+        self.groups.append(frozenset(ids) if ids else _NO_EXCLUSIONS)
+
+    def remove(self, name: str) -> None:
+        """Drop a participant in place, in time proportional to their exclusions.
+
+        The last participant takes over the freed index, so indices of
+        everyone else are unchanged.
+        """
+        i = self.index.pop(name)
+        for j in self.blocked[i]:
+            self.blocked[j] = self.blocked[j] - {i} or _NO_EXCLUSIONS
+        for group in self.groups[i]:
+            self.group_sizes[group] -= 1
+        last = len(self.names) - 1
+        if i != last:
+            moved = self.names[last]
+            self.names[i] = moved
+            self.index[moved] = i
+            self.blocked[i] = self.blocked[last]
+            self.groups[i] = self.groups[last]
+            for j in self.blocked[i]:
+                self.blocked[j] = (self.blocked[j] - {last}) | {i}
+        self.names.pop()
+        self.blocked.pop()
+        self.groups.pop()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def allowed(self, giver: int, receiver: int) -> bool:
+        """Whether ``giver`` may draw ``receiver``."""
+        return (giver != receiver and receiver not in self.blocked[giver]
+                and self.groups[giver].isdisjoint(self.groups[receiver]))
+
+    def exclusion_count(self) -> int:
+        """Number of excluded (unordered) pairs.
+
+        Pairs excluded both explicitly and by a shared group, or by several
+        groups, are counted more than once.
+        """
+        explicit = sum(len(others) for others in self.blocked) // 2
+        return explicit + sum(size * (size - 1) // 2 for size in self.group_sizes)
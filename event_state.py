@@ -0,0 +1,248 @@
+import json
+import os
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from cache import LRUCache
+from secret_santa import SecretSanta
+
+# SQLite file shared by every worker on the host
+DEFAULT_PATH = os.environ.get("SECRET_SANTA_STATE", "secret_santa_pairings/events.db")
+# Seconds an event is kept after its last change; 0 keeps events forever
+DEFAULT_TTL = float(os.environ.get("SECRET_SANTA_EVENT_TTL", 30 * 24 * 3600))
+# Decoded rosters each worker keeps in memory
+DEFAULT_MAX_LOADED = int(os.environ.get("SECRET_SANTA_MAX_LOADED_EVENTS", 256))
+
+
+class EventStateStore:
+    """Loaded rosters shared across gunicorn workers through SQLite.
+
+    Each event is stored as zlib-compressed compact JSON with a version
+    number. Workers keep the last roster they decoded and only re-read the
+    blob when the version changed, so a lookup is usually one indexed read
+    of an integer. At most ``max_loaded`` decoded rosters are kept, least
+    recently used first out; ``on_evict(event_id)`` is called for each.
+
+    Every event has a time-to-live counted from its last save or
+    ``touch``, after which ``expired`` reports it for the retention
+    sweeper to remove.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_PATH, ttl: float = DEFAULT_TTL,
+                 max_loaded: int = DEFAULT_MAX_LOADED, on_evict: Optional[Callable[[str], None]] = None):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._local = LRUCache(maxsize=max_loaded, on_evict=on_evict)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS events ("
+                    "event_id TEXT PRIMARY KEY, version INTEGER NOT NULL, roster BLOB NOT NULL, "
+                    "participants INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL DEFAULT 0, "
+                    "ttl REAL NOT NULL DEFAULT 0"
+                    ") WITHOUT ROWID"
+                )
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(events)")]
+                if "participants" not in columns:
+                    conn.execute("ALTER TABLE events ADD COLUMN participants INTEGER NOT NULL DEFAULT 0")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS revocations ("
+                    "event_id TEXT NOT NULL, giver TEXT NOT NULL, revoked_before REAL NOT NULL, "
+                    "PRIMARY KEY (event_id, giver)"
+                    ") WITHOUT ROWID"
+                )
+                if "updated" not in columns:
+                    # Events from before retention count as saved now
+                    conn.execute(f"ALTER TABLE events ADD COLUMN updated REAL NOT NULL DEFAULT {time.time()}")
+                    conn.execute(f"ALTER TABLE events ADD COLUMN ttl REAL NOT NULL DEFAULT {float(self.ttl)}")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short busy timeout lets concurrent workers queue for the write lock
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def encode(santa: SecretSanta) -> bytes:
+        return zlib.compress(json.dumps(santa.to_state(), separators=(",", ":")).encode())
+
+    @staticmethod
+    def decode(blob: bytes) -> SecretSanta:
+        return SecretSanta.from_state(json.loads(zlib.decompress(blob)))
+
+    def save(self, event_id: str, santa: SecretSanta, ttl: Optional[float] = None) -> None:
+        """Publish the event's roster to all workers.
+
+        ``ttl`` sets the event's time-to-live in seconds (0 for none); by
+        default new events get the store's TTL and saved ones keep theirs.
+        """
+        blob = self.encode(santa)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO events (event_id, version, roster, participants, updated, ttl) "
+                    "VALUES (?, 1, ?, ?, ?, ?) "
+                    "ON CONFLICT(event_id) DO UPDATE SET version = version + 1, roster = excluded.roster, "
+                    "participants = excluded.participants, updated = excluded.updated, "
+                    "ttl = COALESCE(?, ttl)",
+                    (event_id, blob, len(santa.participants), time.time(),
+                     self.ttl if ttl is None else ttl, ttl)
+                )
+                version = conn.execute(
+                    "SELECT version FROM events WHERE event_id = ?", (event_id,)
+                ).fetchone()[0]
+        finally:
+            conn.close()
+        self._local.set(event_id, (version, santa))
+
+    def touch(self, event_id: str) -> bool:
+        """Restart the event's time-to-live without changing it; False if it is gone."""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute("UPDATE events SET updated = ? WHERE event_id = ?", (time.time(), event_id))
+        finally:
+            conn.close()
+        return cursor.rowcount > 0
+
+    def bump(self, event_id: str) -> bool:
+        """Mark the event changed, e.g. after its pairings were saved; False if it is gone.
+
+        Like ``save`` this restarts its time-to-live and moves every
+        worker's ``version`` on, without rewriting the roster.
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute("UPDATE events SET version = version + 1, updated = ? WHERE event_id = ?",
+                                      (time.time(), event_id))
+        finally:
+            conn.close()
+        return cursor.rowcount > 0
+
+    def version(self, event_id: str) -> Optional[int]:
+        """The event's current version, or None if no worker has saved it."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT version FROM events WHERE event_id = ?", (event_id,)).fetchone()
+        finally:
+            conn.close()
+        return None if row is None else row[0]
+
+    def load(self, event_id: str) -> Optional[SecretSanta]:
+        """Return the event's roster, or None if no worker has saved it."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT version FROM events WHERE event_id = ?", (event_id,)).fetchone()
+            if row is None:
+                self._local.invalidate(event_id)
+                return None
+            cached = self._local.get(event_id)
+            if cached is not None and cached[0] == row[0]:
+                return cached[1]
+            row = conn.execute(
+                "SELECT version, roster FROM events WHERE event_id = ?", (event_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        santa = self.decode(row[1])
+        self._local.set(event_id, (row[0], santa))
+        return santa
+
+    def delete(self, event_id: str) -> bool:
+        """Forget the event; False if it was already gone."""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute("DELETE FROM events WHERE event_id = ?", (event_id,))
+        finally:
+            conn.close()
+        self._local.invalidate(event_id)
+        return cursor.rowcount > 0
+
+    def expired(self, now: Optional[float] = None) -> List[str]:
+        """IDs of the events whose time-to-live has passed."""
+        if now is None:
+            now = time.time()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT event_id FROM events WHERE ttl > 0 AND updated + ttl < ?", (now,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [row[0] for row in rows]
+
+    def revoke(self, event_id: str, givers: Optional[Iterable[str]] = None) -> None:
+        """Revoke the reveal tokens issued so far for some givers, or the whole event."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO revocations (event_id, giver, revoked_before) VALUES (?, ?, ?)",
+                    ((event_id, giver, now) for giver in ([""] if givers is None else givers))
+                )
+        finally:
+            conn.close()
+
+    def revocations(self) -> Dict[Tuple[str, str], float]:
+        """Every revocation as ``{(event_id, giver): revoked_before}``; giver "" is the whole event."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT event_id, giver, revoked_before FROM revocations").fetchall()
+        finally:
+            conn.close()
+        return {(event_id, giver): revoked_before for event_id, giver, revoked_before in rows}
+
+    def prune_revocations(self, before: float) -> int:
+        """Drop revocations made before ``before``, once every token they cover has expired."""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute("DELETE FROM revocations WHERE revoked_before < ?", (before,))
+        finally:
+            conn.close()
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM events")
+                conn.execute("DELETE FROM revocations")
+        finally:
+            conn.close()
+        self._local.clear()
+
+    def __contains__(self, event_id: str) -> bool:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM events WHERE event_id = ?", (event_id,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def totals(self) -> Tuple[int, int]:
+        """Return the number of events and of participants across them."""
+        conn = self._connect()
+        try:
+            events, participants = conn.execute("SELECT COUNT(*), SUM(participants) FROM events").fetchone()
+        finally:
+            conn.close()
+        return events, participants or 0
+
+    def __len__(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        finally:
+            conn.close()
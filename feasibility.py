@@ -0,0 +1,38 @@
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+from secret_santa import SecretSanta
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Check whether a roster's exclusions leave any valid pairing, without generating one."
+    )
+    parser.add_argument("roster", help="roster file (JSON, NDJSON or CSV)")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args(argv)
+
+    santa = SecretSanta()
+    if not santa.load_from_file(args.roster):
+        return 2
+    result = santa.check_feasibility()
+    if result is None:
+        return 2
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif result["feasible"]:
+        print(f"Feasible: valid pairings exist for all {len(santa.participants)} participants")
+    else:
+        print(f"Infeasible: these {len(result['participants'])} participants can only draw from "
+              f"{len(result['receivers'])} people between them")
+        print(f"  Participants: {', '.join(result['participants'])}")
+        print(f"  Can draw: {', '.join(result['receivers']) or 'nobody'}")
+        print("Remove an exclusion between them and someone else, or add participants they may draw.")
+    return 0 if result["feasible"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
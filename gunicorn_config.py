@@ -1,3 +1,27 @@
+import os
+import time
+
 bind = "0.0.0.0:10000"
-workers = 2
-timeout = 120 
\ No newline at end of file
+# Event state is shared through SQLite, so workers need no sticky sessions
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+timeout = 120
+# Load the app once before forking so every worker shares the session key
+preload_app = True
+
+
+def on_starting(server):
+    # Drop metric snapshots left by workers of a previous run
+    from metrics import registry
+    registry.reset_directory()
+    server.startup_started = time.perf_counter()
+
+
+def when_ready(server):
+    # With preload_app the app, templates and static assets are loaded by now
+    server.log.info("Startup: ready to serve in %.1f ms", (time.perf_counter() - server.startup_started) * 1000)
+
+
+def post_fork(server, worker):
+    server.log.info("Startup: worker %s forked %.1f ms after start",
+                    worker.pid, (time.perf_counter() - server.startup_started) * 1000)
@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple, Union
+
+from constraints import ConstraintModel
+from storage import find_store
+
+# Penalty for repeating a pairing from one, two and three events ago
+DEFAULT_PENALTIES = (100, 10, 1)
+
+
+def load_master_list(filename: str) -> Dict[str, Union[str, List[str]]]:
+    """Read the giver -> receiver pairings of a saved event.
+
+    Givers of multi-gift events map to a list of receivers.
+
+    ``filename`` is either an event directory written by ``save_pairings``
+    or a master_list.json file.
+    """
+    if Path(filename).is_dir():
+        store = find_store(filename)
+        if store is None:
+            raise ValueError(f"{filename} has no saved pairings")
+        return store.read_master_list()['pairings']
+    with open(filename, 'r') as f:
+        data = json.load(f)
+    if 'pairings' not in data:
+        raise ValueError(f"{filename} has no 'pairings' key")
+    return data['pairings']
+
+
+def pair_costs(model: ConstraintModel, history: List[Dict[str, Union[str, List[str]]]],
+               penalties: Sequence[int] = DEFAULT_PENALTIES) -> Dict[Tuple[int, int], int]:
+    """Penalise (giver, receiver) pairs that already happened.
+
+    ``history`` is ordered most recent first; the nth entry is charged
+    ``penalties[n]`` and anything older than the penalty list is ignored.
+    Participants who are no longer on the roster are skipped.
+    """
+    costs: Dict[Tuple[int, int], int] = {}
+    for pairings, penalty in zip(history, penalties):
+        for giver, receivers in pairings.items():
+            if isinstance(receivers, str):
+                receivers = [receivers]
+            for receiver in receivers:
+                if giver not in model.index or receiver not in model.index:
+                    continue
+                key = (model.index[giver], model.index[receiver])
+                costs[key] = costs.get(key, 0) + penalty
+    return costs
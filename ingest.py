@@ -0,0 +1,259 @@
+import codecs
+import csv
+import hashlib
+import json
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+# Roster formats by file extension
+FORMATS = {
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".csv": "csv",
+}
+
+# Roster formats by request Content-Type, for uploads sent as the raw body
+CONTENT_TYPES = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_PARTICIPANTS = 200000
+DEFAULT_MAX_ERRORS = 100
+
+# Separator between names in the CSV exclusions and groups columns
+CSV_EXCLUSION_SEPARATOR = ";"
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class RosterTooLarge(Exception):
+    """Raised when a roster stream exceeds the configured byte limit."""
+
+
+def format_for_filename(filename: str) -> Optional[str]:
+    """Return the roster format for a filename, or None if unsupported."""
+    for extension, fmt in FORMATS.items():
+        if filename.lower().endswith(extension):
+            return fmt
+    return None
+
+
+def parse_roster(stream: IO[bytes], fmt: str = "json",
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_participants: int = DEFAULT_MAX_PARTICIPANTS,
+                 max_errors: int = DEFAULT_MAX_ERRORS,
+                 digest: Optional["hashlib._Hash"] = None) -> Tuple[List[Tuple[str, List[str], List[str]]], List[Dict]]:
+    """Parse and validate a roster straight from a binary stream.
+
+    Returns ``(participants, errors)`` where participants is a list of
+    ``(name, exclusions, groups)`` and each error is a dict with the 1-based ``row``
+    (0 for problems with the document as a whole) and a ``message``.
+    Parsing stops early once ``max_errors`` errors were found or a limit
+    is exceeded. NDJSON and CSV are read row by row; JSON documents are
+    read whole, as the standard library has no incremental JSON parser.
+
+    ``digest``, a hashlib object, is fed every byte read; it covers the
+    whole roster whenever no errors are returned.
+    """
+    if fmt not in ("json", "ndjson", "csv"):
+        return [], [_error(0, f"Unsupported roster format: {fmt}")]
+
+    participants: List[Tuple[str, List[str], List[str]]] = []
+    errors: List[Dict] = []
+    seen = set()
+    limited = _LimitedReader(stream, max_bytes, digest)
+    # Top-level {"groups": {group: [members]}} of a JSON document
+    document: Dict = {}
+
+    try:
+        for row, record in _records(limited, fmt, document):
+            if isinstance(record, str):
+                errors.append(_error(row, record))
+            else:
+                participant, message = _validate(record, seen)
+                if message is not None:
+                    errors.append(_error(row, message))
+                else:
+                    participants.append(participant)
+                    seen.add(participant[0])
+            if len(participants) > max_participants:
+                errors.append(_error(row, f"Roster exceeds {max_participants} participants"))
+                return [], errors
+            if len(errors) >= max_errors:
+                return [], errors
+    except RosterTooLarge:
+        errors.append(_error(0, f"Roster exceeds {max_bytes} bytes"))
+        return [], errors
+    except (UnicodeDecodeError, csv.Error) as e:
+        errors.append(_error(0, f"Could not read roster: {str(e)}"))
+        return [], errors
+
+    if document.get('groups') is not None:
+        message = _apply_groups(document['groups'], participants, seen)
+        if message is not None:
+            errors.append(_error(0, message))
+
+    # Exclusions can only be checked once every name is known
+    for row, (name, exclusions, _) in enumerate(participants, start=1):
+        unknown = [other for other in exclusions if other not in seen]
+        if unknown:
+            errors.append(_error(row, f"{name} has invalid exclusions: {', '.join(unknown)}"))
+            if len(errors) >= max_errors:
+                break
+
+    if errors:
+        return [], errors
+    return participants, errors
+
+
+def roster_digest(stream: IO[bytes], max_bytes: int = DEFAULT_MAX_BYTES) -> Optional[str]:
+    """Hash a roster's raw bytes up front, e.g. to skip parsing a repeat.
+
+    Returns the SHA-256 hex digest with the stream rewound for
+    parse_roster, or None for streams that cannot seek back, such as a
+    request body; parse_roster's ``digest`` hashes those as it reads
+    them. Raises RosterTooLarge past ``max_bytes``.
+    """
+    # Not every stream implements seekable(), so try a no-op seek instead
+    try:
+        start = stream.tell()
+        stream.seek(start)
+    except (AttributeError, OSError, ValueError):
+        return None
+    digest = hashlib.sha256()
+    for _ in _LimitedReader(stream, max_bytes, digest).chunks():
+        pass
+    stream.seek(start)
+    return digest.hexdigest()
+
+
+def _error(row: int, message: str) -> Dict:
+    return {"row": row, "message": message}
+
+
+def _apply_groups(groups, participants: List[Tuple[str, List[str], List[str]]], seen) -> Optional[str]:
+    """Add top-level group memberships to each member's groups."""
+    if not isinstance(groups, dict):
+        return "'groups' must map group names to lists of members"
+    member_of: Dict[str, List[str]] = {}
+    for group, members in groups.items():
+        if not isinstance(members, list) or not all(isinstance(member, str) for member in members):
+            return f"Members of group {group} must be a list of names"
+        unknown = [member for member in members if member not in seen]
+        if unknown:
+            return f"Group {group} has unknown members: {', '.join(unknown)}"
+        for member in members:
+            member_of.setdefault(member, []).append(group)
+    for i, (name, exclusions, participant_groups) in enumerate(participants):
+        if name in member_of:
+            participants[i] = (name, exclusions, participant_groups + member_of[name])
+    return None
+
+
+def _validate(record, seen) -> Tuple[Optional[Tuple[str, List[str], List[str]]], Optional[str]]:
+    if not isinstance(record, dict):
+        return None, "Participant must be an object"
+    if 'name' not in record:
+        return None, "Invalid participant format. Missing 'name' key."
+    name = record['name']
+    if not isinstance(name, str) or not name.strip():
+        return None, "Participant name must be a non-empty string"
+    if name in seen:
+        return None, f"Duplicate participant: {name}"
+    exclusions = record.get('exclusions', [])
+    if not isinstance(exclusions, list) or not all(isinstance(other, str) for other in exclusions):
+        return None, f"Exclusions for {name} must be a list of names"
+    groups = record.get('groups', [])
+    if not isinstance(groups, list) or not all(isinstance(group, str) for group in groups):
+        return None, f"Groups for {name} must be a list of group names"
+    return (name, exclusions, groups), None
+
+
+def _records(reader: "_LimitedReader", fmt: str, document: Dict) -> Iterator[Tuple[int, object]]:
+    """Yield ``(row, record)`` pairs; a str record is a row-level error.
+
+    Top-level keys of a JSON document other than participants are stored
+    in ``document``.
+    """
+    if fmt == "json":
+        try:
+            data = json.loads(reader.read_all())
+        except json.JSONDecodeError as e:
+            yield 0, f"Invalid JSON: {str(e)}"
+            return
+        if not isinstance(data, dict) or 'participants' not in data:
+            yield 0, "Invalid file format. Missing 'participants' key."
+            return
+        if not isinstance(data['participants'], list):
+            yield 0, "'participants' must be a list"
+            return
+        document['groups'] = data.get('groups')
+        yield from enumerate(data['participants'], start=1)
+
+    elif fmt == "ndjson":
+        for row, line in enumerate(reader.lines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row, f"Invalid JSON: {str(e)}"
+
+    else:
+        rows = csv.DictReader(reader.lines())
+        if rows.fieldnames is None or 'name' not in rows.fieldnames:
+            yield 0, "CSV roster needs a 'name' column"
+            return
+        for row, record in enumerate(rows, start=1):
+            yield row, {
+                "name": (record['name'] or "").strip(),
+                "exclusions": _split(record.get('exclusions')),
+                "groups": _split(record.get('groups'))
+            }
+
+
+def _split(cell: Optional[str]) -> List[str]:
+    return [value.strip() for value in (cell or "").split(CSV_EXCLUSION_SEPARATOR) if value.strip()]
+
+
+class _LimitedReader:
+    """Reads a binary stream in chunks, enforcing a total byte limit.
+
+    Every chunk read is also fed to ``digest``, if given.
+    """
+
+    def __init__(self, stream: IO[bytes], max_bytes: int, digest: Optional["hashlib._Hash"] = None):
+        self.stream = stream
+        self.remaining = max_bytes
+        self.digest = digest
+
+    def chunks(self) -> Iterator[bytes]:
+        while True:
+            chunk = self.stream.read(_CHUNK_SIZE)
+            if not chunk:
+                return
+            self.remaining -= len(chunk)
+            if self.remaining < 0:
+                raise RosterTooLarge()
+            if self.digest is not None:
+                self.digest.update(chunk)
+            yield chunk
+
+    def read_all(self) -> bytes:
+        return b"".join(self.chunks())
+
+    def lines(self) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        pending = ""
+        for chunk in self.chunks():
+            pending += decoder.decode(chunk)
+            *complete, pending = pending.split("\n")
+            for line in complete:
+                yield line + "\n"
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending
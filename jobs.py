@@ -0,0 +1,333 @@
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from profiling import Profile
+from secret_santa import SecretSanta
+
+# SQLite file shared by every worker on the host, so any worker can answer a poll
+DEFAULT_PATH = os.environ.get("SECRET_SANTA_JOBS", "secret_santa_pairings/jobs.db")
+DEFAULT_TIME_LIMIT = 60.0
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUED = 100
+
+# Runners refresh the heartbeat of their queued and running jobs this often;
+# a job whose runner went away (worker restart, crash) is reported as lost
+# once it is this stale
+HEARTBEAT_INTERVAL = 1.0
+STALE_AFTER = 30.0
+
+FINISHED = ("succeeded", "failed", "cancelled", "timed_out", "lost")
+
+# Solver processes start from a small, preloaded fork server rather than
+# forking the threaded web worker
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _context = multiprocessing.get_context("forkserver")
+    _context.set_forkserver_preload(["jobs"])
+else:
+    _context = multiprocessing.get_context("spawn")
+
+
+class JobStore:
+    """Status, progress and results of generation jobs, shared through SQLite."""
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    "job_id TEXT PRIMARY KEY, event_id TEXT NOT NULL, owner TEXT, status TEXT NOT NULL, "
+                    "phase TEXT, time_limit REAL NOT NULL, created REAL NOT NULL, started REAL, "
+                    "finished REAL, heartbeat REAL NOT NULL, cancel_requested INTEGER NOT NULL DEFAULT 0, "
+                    "result TEXT, error TEXT, profile_id TEXT"
+                    ") WITHOUT ROWID"
+                )
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+                if "profile_id" not in columns:
+                    conn.execute("ALTER TABLE jobs ADD COLUMN profile_id TEXT")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create(self, event_id: str, time_limit: float) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, event_id, status, phase, time_limit, created, heartbeat) "
+                    "VALUES (?, ?, 'queued', 'queued', ?, ?, ?)",
+                    (job_id, event_id, time_limit, now, now)
+                )
+        finally:
+            conn.close()
+        return job_id
+
+    def update(self, job_id: str, **fields) -> None:
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    def touch(self, owner: str) -> None:
+        """Refresh the heartbeat of every unfinished job of one runner."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                    (time.time(), owner)
+                )
+        finally:
+            conn.close()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return the job as a dict, or None if there is no such job."""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        if job["status"] not in FINISHED and time.time() - job["heartbeat"] > STALE_AFTER:
+            job["status"] = "lost"
+            job["error"] = "The worker running this job stopped"
+            self.update(job_id, status="lost", error=job["error"], finished=time.time())
+        return job
+
+    def request_cancel(self, job_id: str) -> bool:
+        """Ask the job's runner to stop it; False if it already finished.
+
+        Queued jobs are cancelled right away; running ones once their runner
+        notices, within a fraction of a second.
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1, "
+                    "status = CASE status WHEN 'queued' THEN 'cancelled' ELSE status END, "
+                    "phase = CASE status WHEN 'queued' THEN 'done' ELSE phase END, "
+                    "finished = CASE status WHEN 'queued' THEN ? ELSE finished END "
+                    "WHERE job_id = ? AND status IN ('queued', 'running')",
+                    (time.time(), job_id)
+                )
+        finally:
+            conn.close()
+        return cursor.rowcount > 0
+
+    def cancel_requested(self, job_id: str) -> bool:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return bool(row and row[0])
+
+    def delete_event(self, event_id: str) -> int:
+        """Drop the finished jobs of an event; returns how many there were."""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    f"DELETE FROM jobs WHERE event_id = ? AND status IN ({', '.join('?' * len(FINISHED))})",
+                    (event_id, *FINISHED)
+                )
+        finally:
+            conn.close()
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM jobs")
+        finally:
+            conn.close()
+
+
+def run_generation(payload: Dict, conn, store_path: str, job_id: str) -> None:
+    """Solve and save one event; runs in a child process.
+
+    Sends ``{"success", "participants", "stats", "errors"}`` back over
+    ``conn``; passwords stay in the event store.
+    A job with ``payload["profile"]`` is profiled as a whole; its profile
+    is saved even when the job is cancelled or times out.
+    """
+    store = JobStore(store_path)
+    # Terminating the job unwinds through profile.stop() and shuts down
+    # the process pool of the sharded strategy
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    profile = None
+    if payload.get("profile"):
+        profile = Profile(f"job-{job_id}")
+        store.update(job_id, profile_id=profile.id)
+        profile.start()
+    try:
+        _generate(payload, conn, store, job_id, profile)
+    finally:
+        if profile is not None:
+            profile.stop()
+
+
+def _generate(payload: Dict, conn, store: JobStore, job_id: str, profile: Optional[Profile]) -> None:
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        santa = SecretSanta.from_state(payload["roster"])
+        santa.history = payload.get("history", [])
+        if profile is not None:
+            santa.profile = False
+        store.update(job_id, phase="solving")
+        pairings = santa.generate_pairings(strategy=payload["strategy"], gifts=payload.get("gifts", 1))
+        if pairings:
+            store.update(job_id, phase="saving")
+            started = time.perf_counter()
+            santa.save_pairings(pairings, base_dir=payload["base_dir"])
+            santa.last_stats["save_seconds"] = time.perf_counter() - started
+    conn.send({
+        "success": bool(pairings),
+        "participants": len(santa.passwords) if pairings else 0,
+        "stats": santa.last_stats,
+        "errors": [line for line in messages.getvalue().splitlines() if line.strip()]
+    })
+    conn.close()
+
+
+class JobRunner:
+    """Bounded pool running generation jobs in killable child processes.
+
+    Each web worker runs at most ``workers`` solver processes and queues up
+    to ``max_queued`` more. A job is terminated when it exceeds its time
+    limit or when any worker asks for it to be cancelled through the
+    store. ``on_finish(job_id, payload, outcome)`` is called in the runner
+    thread after every job, before the job is reported finished, so anyone
+    who sees it finished also sees its effects; ``outcome`` is what the
+    child sent, or None.
+    """
+
+    def __init__(self, store: JobStore, workers: int = DEFAULT_WORKERS,
+                 max_queued: int = DEFAULT_MAX_QUEUED, target: Callable = run_generation,
+                 on_finish: Optional[Callable] = None):
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.target = target
+        self.on_finish = on_finish
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _start(self) -> None:
+        # Threads do not survive gunicorn's fork, so each worker starts its own
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.owner = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+            self._queue: "queue.Queue" = queue.Queue()
+            for _ in range(self.workers):
+                threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, job_id: str, payload: Dict, time_limit: float) -> bool:
+        """Queue a job created in the store; False if the queue is full."""
+        self._start()
+        if self._queue.qsize() >= self.max_queued:
+            return False
+        self.store.update(job_id, owner=self.owner)
+        self._queue.put((job_id, payload, time_limit))
+        return True
+
+    def _work(self) -> None:
+        while True:
+            job_id, payload, time_limit = self._queue.get()
+            outcome, fields = None, {}
+            try:
+                outcome, fields = self._run(job_id, payload, time_limit)
+            except Exception as e:
+                fields = {"status": "failed", "error": str(e)}
+            try:
+                if self.on_finish is not None:
+                    self.on_finish(job_id, payload, outcome)
+            finally:
+                self.store.update(job_id, phase="done", finished=time.time(), **fields)
+
+    def _run(self, job_id: str, payload: Dict, time_limit: float) -> Tuple[Optional[Dict], Dict]:
+        """Run the job's process; returns its outcome and the job's final fields."""
+        if self.store.cancel_requested(job_id):
+            return None, {"status": "cancelled"}
+
+        receiver, sender = _context.Pipe(duplex=False)
+        # Not daemonic, so the sharded strategy may start its own pool
+        process = _context.Process(target=self.target, args=(payload, sender, str(self.store.path), job_id))
+        started = time.time()
+        self.store.update(job_id, status="running", phase="starting", started=started, heartbeat=started)
+        process.start()
+        sender.close()
+
+        outcome = None
+        status, error = "failed", "The solver process exited unexpectedly"
+        last_heartbeat = started
+        while True:
+            if receiver.poll(0.25):
+                try:
+                    outcome = receiver.recv()
+                except EOFError:
+                    pass
+                break
+            if not process.is_alive():
+                break
+            now = time.time()
+            if now - started > time_limit:
+                status, error = "timed_out", f"Exceeded the time limit of {time_limit:g} seconds"
+                break
+            if self.store.cancel_requested(job_id):
+                status, error = "cancelled", None
+                break
+            if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+                # Also keeps the jobs waiting behind this one alive
+                self.store.touch(self.owner)
+                last_heartbeat = now
+
+        if process.is_alive() and outcome is None:
+            process.terminate()
+            # A profiled job saves its profile before exiting
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+        process.join()
+        receiver.close()
+
+        if outcome is not None:
+            if outcome["success"]:
+                status, error = "succeeded", None
+            else:
+                status = "failed"
+                error = outcome["errors"][-1] if outcome["errors"] else "Could not generate valid pairings"
+        result = {"participants": outcome["participants"], "stats": outcome["stats"]} if outcome else None
+        return outcome, {"status": status, "error": error, "result": result}
@@ -0,0 +1,185 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# Each worker writes its own snapshot here; scrapes sum every snapshot
+DEFAULT_DIRECTORY = os.environ.get(
+    "SECRET_SANTA_METRICS_DIR", os.path.join(tempfile.gettempdir(), "secret_santa_metrics")
+)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+ATTEMPT_BUCKETS = (1, 2, 5, 10, 50, 100, 250, 500, 1000)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "secret_santa_requests_total": ("counter", "HTTP requests by route and status.", None),
+    "secret_santa_request_failures_total": ("counter", "Failed HTTP requests by route and error type.", None),
+    "secret_santa_request_duration_seconds": ("histogram", "HTTP request latency by route.", DEFAULT_BUCKETS),
+    "secret_santa_solver_runs_total": ("counter", "Pairing runs by strategy and result.", None),
+    "secret_santa_solver_duration_seconds": ("histogram", "Time spent generating pairings.", DEFAULT_BUCKETS),
+    "secret_santa_solver_attempts": ("histogram", "Attempts used per pairing run.", ATTEMPT_BUCKETS),
+    "secret_santa_storage_duration_seconds": ("histogram", "Event store reads and writes.", DEFAULT_BUCKETS),
+    "secret_santa_assignment_cache_total": ("counter", "Assignment cache lookups by result.", None),
+    "secret_santa_roster_cache_total": ("counter", "Parsed roster cache lookups by result.", None),
+    "secret_santa_event_evictions_total": ("counter", "Events dropped from memory or expired, by reason.", None),
+    "secret_santa_events": ("gauge", "Events with a loaded roster.", None),
+    "secret_santa_participants": ("gauge", "Participants across loaded rosters.", None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in (labels or {}).items()))
+
+
+class Registry:
+    """Process-local counters and histograms, aggregated across workers.
+
+    Updates only touch memory. The process writes a snapshot of its values
+    to ``directory`` at most every ``flush_interval`` seconds (and whenever
+    it serves a scrape), and ``render`` sums the snapshots of every worker,
+    so the output is correct whichever worker answers the scrape.
+    """
+
+    def __init__(self, directory: Union[str, Path] = DEFAULT_DIRECTORY, flush_interval: float = 1.0):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        # [count per bucket..., +Inf count, sum]
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._last_flush = 0.0
+
+    def _check_fork(self) -> None:
+        # A forked worker must not re-report what its parent recorded
+        if os.getpid() != self._pid:
+            self._reset()
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + value
+        self.flush()
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        buckets = METRICS[name][2]
+        key = (name, _labels(labels))
+        with self._lock:
+            self._check_fork()
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0.0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+        self.flush()
+
+    @contextmanager
+    def time(self, name: str, labels: Optional[Dict[str, str]] = None) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, labels)
+
+    def flush(self, force: bool = False) -> None:
+        """Write this process's snapshot if the flush interval has passed."""
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        with self._lock:
+            self._check_fork()
+            self._last_flush = now
+            snapshot = {
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, list(labels), series] for (name, labels), series in self._histograms.items()]
+            }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self._pid}.json"
+        temp_path = self.directory / f"{self._pid}.json.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, path)
+
+    def reset_directory(self) -> None:
+        """Remove snapshots left by earlier runs; call before workers start."""
+        if self.directory.exists():
+            for path in self.directory.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+    def collect(self) -> Tuple[Dict, Dict]:
+        """Sum the snapshots of every worker."""
+        self.flush(force=True)
+        counters: Dict[Tuple[str, Labels], float] = {}
+        histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        for path in self.directory.glob("*.json"):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, series in snapshot["histograms"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                total = histograms.setdefault(key, [0.0] * len(series))
+                for i, value in enumerate(series):
+                    total[i] += value
+        return counters, histograms
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            elif kind == "histogram":
+                for (metric, labels), series in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(buckets, series):
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {_format_value(count)}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {_format_value(series[-2])}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(series[-1])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(series[-2])}")
+            elif gauges and name in gauges:
+                lines.append(f"{name} {_format_value(gauges[name])}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = ",".join(
+        '{}="{}"'.format(key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + escaped + "}"
+
+
+def _format_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = Registry()
@@ -0,0 +1,133 @@
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import solvers
+
+# SECRET_SANTA_PROFILE=1 profiles every request and generate_pairings run;
+# with PROFILE_TOKEN set, single requests carrying it in the X-Profile
+# header are profiled. Neither set means profiling is never even checked.
+ENABLED = os.environ.get("SECRET_SANTA_PROFILE", "") not in ("", "0")
+TOKEN = os.environ.get("PROFILE_TOKEN", "")
+HEADER = "X-Profile"
+
+DEFAULT_DIRECTORY = os.environ.get("SECRET_SANTA_PROFILE_DIR", "secret_santa_pairings/profiles")
+# Oldest profiles are deleted beyond this many
+MAX_PROFILES = 100
+# Solver trace events kept per profile; later ones are only counted
+MAX_EVENTS = 10000
+# Functions listed in the text summary
+TOP_FUNCTIONS = 40
+
+PROFILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def available() -> bool:
+    """Whether any request can be profiled in this process."""
+    return ENABLED or bool(TOKEN)
+
+
+def requested(header_value: Optional[str]) -> bool:
+    """Whether a request with this X-Profile header should be profiled."""
+    return ENABLED or authorized(header_value)
+
+
+def authorized(header_value: Optional[str]) -> bool:
+    """Whether this X-Profile header carries PROFILE_TOKEN.
+
+    Saved profiles name participants, so reading them always takes the
+    token, even when SECRET_SANTA_PROFILE profiles every request.
+    """
+    return bool(TOKEN and header_value) and hmac.compare_digest(header_value, TOKEN)
+
+
+class Profile:
+    """cProfile capture plus solver trace events for one request or run.
+
+    While active it installs itself as the solvers' trace hook for the
+    calling thread, so dead ends, repairs and restarts are recorded with
+    the giver involved. On ``stop`` the raw stats are written to ``<id>.prof`` (readable with
+    ``pstats`` or snakeviz) and a JSON report with the summary and the
+    trace events to ``<id>.json``.
+    """
+
+    def __init__(self, name: str, directory: Optional[Union[str, Path]] = None):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "run"
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_name}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.directory = Path(directory or DEFAULT_DIRECTORY)
+        self.events: List[Dict] = []
+        self.dropped = 0
+        self._profiler = cProfile.Profile()
+        self._started = 0.0
+        self._previous_trace = None
+
+    def event(self, kind: str, **fields) -> None:
+        if len(self.events) >= MAX_EVENTS:
+            self.dropped += 1
+            return
+        self.events.append({"t": round(time.perf_counter() - self._started, 6), "event": kind, **fields})
+
+    def start(self) -> "Profile":
+        self._started = time.perf_counter()
+        self._previous_trace = solvers.set_trace(self.event)
+        try:
+            self._profiler.enable()
+        except ValueError:
+            # Another profiler is already running; keep the trace events
+            self._profiler = None
+        return self
+
+    def stop(self) -> str:
+        """Stop profiling, save the results and return the profile id."""
+        if self._profiler is not None:
+            self._profiler.disable()
+        solvers.set_trace(self._previous_trace)
+        elapsed = time.perf_counter() - self._started
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        summary = io.StringIO()
+        if self._profiler is not None:
+            self._profiler.dump_stats(str(self.directory / f"{self.id}.prof"))
+            pstats.Stats(self._profiler, stream=summary).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        report = {
+            "id": self.id,
+            "name": self.name,
+            "seconds": elapsed,
+            "summary": summary.getvalue(),
+            "events": self.events,
+            "dropped_events": self.dropped
+        }
+        with open(self.directory / f"{self.id}.json", "w") as f:
+            json.dump(report, f)
+        _prune(self.directory)
+        return self.id
+
+    def __enter__(self) -> "Profile":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def _prune(directory: Path) -> None:
+    reports = sorted(directory.glob("*.json"), key=lambda path: path.stat().st_mtime)
+    for report in reports[:-MAX_PROFILES]:
+        report.unlink(missing_ok=True)
+        report.with_suffix(".prof").unlink(missing_ok=True)
+
+
+def profile_path(profile_id: str, suffix: str, directory: Optional[Union[str, Path]] = None) -> Optional[Path]:
+    """Return the file of a saved profile, or None if there is none."""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = Path(directory or DEFAULT_DIRECTORY) / f"{profile_id}{suffix}"
+    return path if path.exists() else None
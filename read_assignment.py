@@ -1,41 +1,39 @@
-import json
-from pathlib import Path
+from storage import find_store
 import getpass
 
 def read_assignment():
     # Get participant name
     name = input("Enter your name: ").strip()
     
-    # Check if assignment file exists
-    assignment_file = Path("secret_santa_pairings") / f"{name}.json"
-    if not assignment_file.exists():
+    # Look up the assignment in the event store
+    store = find_store("secret_santa_pairings")
+    assignment = None
+    try:
+        if store is not None:
+            assignment = store.lookup(name)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return
+    
+    if assignment is None:
         print(f"Error: No assignment found for {name}")
         return
     
     # Get password
     password = getpass.getpass("Enter your password: ")
     
-    try:
-        # Read the assignment file
-        with open(assignment_file, "r") as f:
-            assignment = json.load(f)
-        
-        # Verify password
-        if assignment["password"] != password:
-            print("Error: Invalid password")
-            return
-        
-        # Display assignment
-        print("\nYour Secret Santa Assignment:")
-        print("-" * 30)
-        print(f"You are giving to: {assignment['receiver']}")
-        
-    except json.JSONDecodeError:
-        print("Error: Invalid assignment file")
-    except Exception as e:
-        print(f"Error: {str(e)}")
+    # Verify password
+    if assignment["password"] != password:
+        print("Error: Invalid password")
+        return
+    
+    # Display assignment
+    print("\nYour Secret Santa Assignment:")
+    print("-" * 30)
+    receivers = assignment.get('receivers', [assignment['receiver']])
+    print(f"You are giving to: {', '.join(receivers)}")
 
 if __name__ == "__main__":
     print("Secret Santa Assignment Reader")
     print("=" * 30)
-    read_assignment() 
\ No newline at end of file
+    read_assignment()
@@ -0,0 +1,107 @@
+import argparse
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from event_state import EventStateStore
+from jobs import JobStore
+from storage import DEFAULT_ROOT, event_directory
+from tokens import DEFAULT_TTL as TOKEN_TTL
+
+# Seconds between sweeps in each worker; 0 disables the background sweeper
+DEFAULT_INTERVAL = float(os.environ.get("SECRET_SANTA_SWEEP_INTERVAL", 3600))
+# Expired events are packed into <event_id>.tar.gz here instead of deleted
+DEFAULT_ARCHIVE = os.environ.get("SECRET_SANTA_ARCHIVE_DIR") or None
+
+log = logging.getLogger("secret_santa.retention")
+
+
+class Sweeper:
+    """Removes events whose time-to-live has passed.
+
+    An expired event loses its roster, its pairings directory and its
+    finished jobs, and its reveal tokens are revoked. With ``archive``
+    set, the pairings are first packed into ``<archive>/<event_id>.tar.gz``.
+    Every worker may sweep: only the one whose delete of the roster
+    succeeds removes the rest of the event. ``on_evict(event_id)`` is
+    called for each removed event.
+    """
+
+    def __init__(self, state: EventStateStore, jobs: Optional[JobStore] = None,
+                 root: Union[str, Path] = DEFAULT_ROOT, interval: float = DEFAULT_INTERVAL,
+                 archive: Optional[Union[str, Path]] = DEFAULT_ARCHIVE,
+                 on_evict: Optional[Callable[[str], None]] = None, token_ttl: float = TOKEN_TTL):
+        self.state = state
+        self.jobs = jobs
+        self.root = Path(root)
+        self.interval = interval
+        self.archive = Path(archive) if archive else None
+        self.on_evict = on_evict
+        self.token_ttl = token_ttl
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Remove every expired event now; return how many were removed."""
+        if now is None:
+            now = time.time()
+        removed = 0
+        for event_id in self.state.expired(now):
+            if not self.state.delete(event_id):
+                # Another worker got to it first
+                continue
+            self.state.revoke(event_id)
+            directory = event_directory(event_id, self.root)
+            if directory.is_dir():
+                if self.archive is not None:
+                    self.archive.mkdir(parents=True, exist_ok=True)
+                    shutil.make_archive(str(self.archive / event_id), "gztar", root_dir=directory)
+                shutil.rmtree(directory, ignore_errors=True)
+            if self.jobs is not None:
+                self.jobs.delete_event(event_id)
+            removed += 1
+            if self.on_evict is not None:
+                self.on_evict(event_id)
+        # Tokens issued before these revocations have all expired by now
+        self.state.prune_revocations(now - self.token_ttl)
+        return removed
+
+    def start(self) -> None:
+        """Sweep every ``interval`` seconds in a background thread."""
+        # Threads do not survive gunicorn's fork, so each worker starts its own
+        if not self.interval or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception:
+                log.exception("Retention sweep failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove Secret Santa events whose time-to-live has passed.")
+    parser.add_argument("root", nargs="?", default=DEFAULT_ROOT,
+                        help="pairings directory containing the event directories")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE,
+                        help="pack expired events into this directory instead of only deleting them")
+    args = parser.parse_args()
+
+    sweeper = Sweeper(EventStateStore(), JobStore(), root=args.root, archive=args.archive,
+                      on_evict=lambda event_id: print(f"Removed {event_id}"))
+    print(f"Removed {sweeper.sweep()} expired event(s)")
+
+
+if __name__ == "__main__":
+    main()
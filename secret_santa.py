@@ -1,55 +1,119 @@
 import random
 import os
 import json
-from typing import Dict, List, Set, Optional
+import time
+from typing import Dict, List, Set, Optional, Tuple, Union
 from collections import defaultdict
-from pathlib import Path
+from constraints import ConstraintModel
+from history import load_master_list, pair_costs
+from ingest import format_for_filename, parse_roster
+from solvers import STRATEGIES, hall_violator, multi_gift_pairings, splice_in, splice_out
+from storage import find_store, open_store
+from profiling import ENABLED as PROFILE_RUNS, Profile
 
 class SecretSanta:
     def __init__(self):
         self.participants: Dict[str, Set[str]] = {}
         self.passwords: Dict[str, str] = {}
+        self._model: Optional[ConstraintModel] = None
+        # Whether _model is also held elsewhere and must be copied before editing
+        self._model_shared = False
+        # Previous events' pairings, most recent first
+        self.history: List[Dict[str, str]] = []
+        # Solver counters from the last generate_pairings call
+        self.last_stats: Dict = {}
+        # Exclusion groups per participant; members of a group never draw each other
+        self.groups: Dict[str, Set[str]] = {}
+        # Profile generate_pairings runs (see profiling.py); the profile id
+        # is reported in last_stats
+        self.profile = PROFILE_RUNS
         
-    def add_participant(self, name: str, exclusions: Optional[List[str]] = None) -> None:
-        """Add a participant with their exclusion list."""
+    def add_participant(self, name: str, exclusions: Optional[List[str]] = None,
+                        groups: Optional[List[str]] = None) -> None:
+        """Add a participant with their exclusion list and exclusion groups."""
         if exclusions is None:
             exclusions = []
         self.participants[name] = set(exclusions)
+        if groups:
+            self.groups[name] = set(groups)
+        else:
+            self.groups.pop(name, None)
+        self._model = None
         # Generate a random password for the participant
-        self.passwords[name] = ''.join(random.choices('0123456789', k=6))
+        self.passwords[name] = _new_password()
+        
+    def to_state(self) -> Dict:
+        """Return a compact, JSON-serializable snapshot of the roster."""
+        return {
+            "participants": [[name, sorted(exclusions)] for name, exclusions in self.participants.items()],
+            "groups": {name: sorted(groups) for name, groups in self.groups.items()},
+            "passwords": self.passwords
+        }
+    
+    @classmethod
+    def from_state(cls, state: Dict) -> "SecretSanta":
+        """Rebuild a SecretSanta from ``to_state()`` output."""
+        santa = cls()
+        santa.participants = {name: set(exclusions) for name, exclusions in state["participants"]}
+        santa.groups = {name: set(groups) for name, groups in state.get("groups", {}).items()}
+        santa.passwords = dict(state["passwords"])
+        return santa
+        
+    def load_participants(self, participants: List[Tuple[str, List[str], List[str]]],
+                          model: Optional[ConstraintModel] = None) -> None:
+        """Replace the roster with ``(name, exclusions, groups)`` entries.
+
+        ``model`` is the already compiled model of this same roster, e.g.
+        from an earlier upload of it, and is used instead of compiling it
+        again. Passwords are always new.
+        """
+        # Clear existing participants before loading new ones
+        self.participants.clear()
+        self.passwords.clear()
+        self.groups.clear()
+        # add_participant's work, without resetting the model every time
+        for name, exclusions, groups in participants:
+            self.participants[name] = set(exclusions)
+            if groups:
+                self.groups[name] = set(groups)
+            else:
+                self.groups.pop(name, None)
+            self.passwords[name] = _new_password()
+        self._model = model
+        self._model_shared = model is not None
         
     def load_from_file(self, filename: str) -> bool:
-        """Load participants and exclusions from a JSON file."""
+        """Load participants and exclusions from a JSON, NDJSON or CSV file."""
         try:
-            with open(filename, 'r') as f:
-                data = json.load(f)
-            
-            if 'participants' not in data:
-                print("Error: Invalid file format. Missing 'participants' key.")
-                return False
-            
-            # Clear existing participants before loading new ones
-            self.participants.clear()
-            self.passwords.clear()
-                
-            for participant in data['participants']:
-                if 'name' not in participant:
-                    print("Error: Invalid participant format. Missing 'name' key.")
-                    return False
-                    
-                name = participant['name']
-                exclusions = participant.get('exclusions', [])
-                self.add_participant(name, exclusions)
-            
-            return True
-            
-        except json.JSONDecodeError:
-            print("Error: Invalid JSON file")
-            return False
+            with open(filename, 'rb') as f:
+                participants, errors = parse_roster(f, format_for_filename(filename) or "json")
         except Exception as e:
             print(f"Error loading file: {str(e)}")
             return False
         
+        if errors:
+            for error in errors:
+                print(f"Error (row {error['row']}): {error['message']}")
+            return False
+        
+        self.load_participants(participants)
+        return True
+        
+    def load_history(self, filenames: List[str]) -> bool:
+        """Load previous events' master lists, most recent first."""
+        history = []
+        for filename in filenames:
+            try:
+                history.append(load_master_list(filename))
+            except json.JSONDecodeError:
+                print(f"Error: Invalid JSON in history file {filename}")
+                return False
+            except Exception as e:
+                print(f"Error loading history file: {str(e)}")
+                return False
+        self.history = history
+        return True
+        
     def validate_exclusions(self) -> bool:
         """Validate that all exclusions are valid participants."""
         all_names = set(self.participants.keys())
@@ -60,77 +124,225 @@ class SecretSanta:
                 return False
         return True
     
-    def generate_pairings(self) -> Optional[Dict[str, str]]:
-        """Generate valid Secret Santa pairings."""
-        if not self.validate_exclusions():
+    def compile_model(self) -> Optional[ConstraintModel]:
+        """Return the compiled constraint model, building it once per roster."""
+        if self._model is None:
+            if not self.validate_exclusions():
+                return None
+            self._model = ConstraintModel.compile(self.participants, self.groups)
+            self._model_shared = False
+        return self._model
+
+    def shared_model(self) -> Optional[ConstraintModel]:
+        """compile_model() for keeping beyond this roster, e.g. in a cache.
+
+        Late changes copy a shared model before editing it.
+        """
+        model = self.compile_model()
+        self._model_shared = model is not None
+        return model
+
+    def _own_model(self) -> Optional[ConstraintModel]:
+        model = self.compile_model()
+        if model is not None and self._model_shared:
+            model = self._model = model.copy()
+            self._model_shared = False
+        return model
+    
+    def check_feasibility(self, time_limit: Optional[float] = None) -> Optional[Dict]:
+        """Decide whether the roster can be paired, without generating pairings.
+
+        Returns ``{"feasible": True}``, or ``{"feasible": False}`` with
+        ``participants``, a minimal set of givers whose exclusions conflict,
+        and ``receivers``, the fewer names those givers may draw between
+        them. With ``time_limit`` in seconds, a check that takes longer is
+        abandoned and reported as ``{"feasible": None}``. Returns None if
+        the roster itself is invalid.
+        """
+        model = self.compile_model()
+        if model is None:
+            return None
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        try:
+            conflict = hall_violator(model, deadline)
+        except TimeoutError:
+            return {"feasible": None}
+        if conflict is None:
+            return {"feasible": True}
+        givers, receivers = conflict
+        return {"feasible": False, "participants": givers, "receivers": receivers}
+    
+    def generate_pairings(self, strategy: str = "auto", gifts: int = 1) -> Optional[Dict[str, Union[str, List[str]]]]:
+        """Generate valid Secret Santa pairings.
+
+        ``strategy`` picks the solver from ``solvers.STRATEGIES``: "shuffle"
+        retries random greedy assignments, "matching" solves the exclusion
+        graph directly and reports infeasible rosters without retrying,
+        "derangement" samples a random derangement in linear time and repairs
+        exclusions, "cycle" puts everyone in one big circle, "uniform"
+        samples valid assignments close to uniformly with a Markov chain,
+        "sharded" solves blocks of very large rosters on every core, and
+        "weighted" also avoids repeating pairings from
+        ``self.history``. "auto" picks
+        the derangement fast path for sparse exclusions and matching
+        otherwise.
+
+        With ``gifts`` > 1 everyone gives to and receives from that many
+        different people, and each giver maps to a list of receivers. Only
+        the "auto" and "matching" strategies support this.
+        """
+        if strategy not in STRATEGIES:
+            print(f"Error: Unknown pairing strategy '{strategy}'")
+            return None
+
+        model = self.compile_model()
+        if model is None:
             return None
             
-        names = list(self.participants.keys())
-        if len(names) < 2:
+        if len(model) < 2:
             print("Error: Need at least 2 participants")
             return None
+        
+        if gifts > 1 and strategy not in ("auto", "matching"):
+            print(f"Error: The '{strategy}' strategy gives a single gift per participant")
+            return None
+        if gifts < 1 or gifts >= len(model):
+            print(f"Error: Gifts per participant must be between 1 and {len(model) - 1}")
+            return None
             
-        # Try to generate valid pairings
-        max_attempts = 1000
-        for _ in range(max_attempts):
-            # Create a copy of names and shuffle
-            available = names.copy()
-            random.shuffle(available)
-            
-            # Try to create valid pairings
-            pairings = {}
-            valid = True
-            
-            for giver in names:
-                # Find a valid receiver
-                valid_receiver = None
-                for receiver in available:
-                    if (receiver != giver and 
-                        receiver not in self.participants[giver] and
-                        giver not in self.participants[receiver]):
-                        valid_receiver = receiver
-                        break
-                
-                if valid_receiver is None:
-                    valid = False
-                    break
-                    
-                pairings[giver] = valid_receiver
-                available.remove(valid_receiver)
-            
-            if valid:
-                return pairings
-                
-        print("Error: Could not generate valid pairings after multiple attempts")
-        return None
-
-    def save_pairings(self, pairings: Dict[str, str], base_dir: Optional[str] = None) -> None:
-        """Save pairings to individual files for each participant."""
-        # Create a directory for the pairings
+        self.last_stats = {}
+        if self.profile:
+            with Profile(f"generate-{strategy}") as profile:
+                pairings = self._solve(model, strategy, gifts)
+                profile.event("result", success=pairings is not None, **self.last_stats)
+            self.last_stats['profile_id'] = profile.id
+        else:
+            pairings = self._solve(model, strategy, gifts)
+        if pairings is None:
+            if strategy == "shuffle":
+                print("Error: Could not generate valid pairings after multiple attempts")
+            elif strategy == "cycle":
+                print("Error: Could not arrange all participants in a single circle")
+            elif gifts > 1:
+                print(f"Error: Could not find {gifts} different receivers for everyone")
+            else:
+                print("Error: No valid pairings exist for these exclusions")
+        return pairings
+
+    def _solve(self, model: ConstraintModel, strategy: str, gifts: int) -> Optional[Dict]:
+        started = time.perf_counter()
+        if gifts > 1:
+            pairings = multi_gift_pairings(model, gifts, stats=self.last_stats)
+        elif strategy == "weighted":
+            pairings = STRATEGIES[strategy](model, pair_costs(model, self.history), stats=self.last_stats)
+        else:
+            pairings = STRATEGIES[strategy](model, stats=self.last_stats)
+        self.last_stats['seconds'] = time.perf_counter() - started
+        return pairings
+
+    def remove_participant(self, name: str, pairings: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """Drop a participant after pairings were generated.
+
+        ``pairings`` is repaired in place with as few changed assignments as
+        possible. Returns the givers whose receiver changed, or None (leaving
+        everything untouched) if the remaining roster cannot be paired.
+        """
+        if name not in self.participants:
+            print(f"Error: {name} is not a participant")
+            return None
+        if _has_multiple_gifts(pairings):
+            print("Error: Participants cannot be removed from multi-gift events")
+            return None
+        if len(self.participants) <= 2:
+            print("Error: Need at least 2 participants")
+            return None
+        model = self._own_model()
+        if model is None:
+            return None
+        
+        # Drop the row in place; only people sharing an exclusion with
+        # name hold it in their exclusion sets
+        neighbours = [model.names[j] for j in model.blocked[model.index[name]]]
+        model.remove(name)
+        changed = splice_out(model, pairings, name)
+        if changed is None:
+            print(f"Error: No valid pairings exist without {name}")
+            model.add(name, neighbours, self.groups.get(name, ()))
+            return None
+        
+        del self.participants[name]
+        for other in neighbours:
+            self.participants[other].discard(name)
+        self.groups.pop(name, None)
+        self.passwords.pop(name, None)
+        pairings.pop(name, None)
+        pairings.update(changed)
+        return changed
+    
+    def add_late_participant(self, name: str, exclusions: Optional[List[str]],
+                             pairings: Dict[str, str], groups: Optional[List[str]] = None) -> Optional[Dict[str, str]]:
+        """Add a participant after pairings were generated.
+
+        The newcomer is spliced into an existing pair, so usually only one
+        other giver's receiver changes. Returns the givers whose receiver is
+        new or changed, or None (leaving everything untouched) on failure.
+        """
+        if name in self.participants:
+            print(f"Error: {name} is already a participant")
+            return None
+        if _has_multiple_gifts(pairings):
+            print("Error: Participants cannot be added to multi-gift events")
+            return None
+        invalid = set(exclusions or []) - set(self.participants) - {name}
+        if invalid:
+            print(f"Error: {name} has invalid exclusions: {invalid}")
+            return None
+        model = self._own_model()
+        if model is None:
+            return None
+        
+        # Add the row in place rather than recompiling the roster
+        model.add(name, exclusions or [], groups or [])
+        changed = splice_in(model, pairings, name)
+        if changed is None:
+            print(f"Error: No valid pairings exist with {name}")
+            model.remove(name)
+            return None
+        
+        self.participants[name] = set(exclusions or [])
+        if groups:
+            self.groups[name] = set(groups)
+        self.passwords[name] = _new_password()
+        pairings.update(changed)
+        return changed
+    
+    def save_changes(self, changed: Dict[str, str], removed: Optional[List[str]] = None,
+                     base_dir: Optional[str] = None) -> None:
+        """Rewrite only the changed and removed assignments of saved pairings."""
         if base_dir is None:
             base_dir = "secret_santa_pairings"
-        pairings_dir = Path(base_dir)
-        pairings_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Save each participant's assignment
-        for giver, receiver in pairings.items():
-            assignment = {
-                "giver": giver,
-                "receiver": receiver,
-                "password": self.passwords[giver]
-            }
-            
-            # Save to a file named after the giver
-            with open(pairings_dir / f"{giver}.json", "w") as f:
-                json.dump(assignment, f, indent=2)
-        
-        # Save the master list (encrypted) for verification
-        master_list = {
-            "pairings": pairings,
-            "passwords": self.passwords
-        }
-        with open(pairings_dir / "master_list.json", "w") as f:
-            json.dump(master_list, f, indent=2)
+        store = find_store(base_dir)
+        if store is None:
+            raise ValueError(f"No saved pairings in {base_dir}")
+        store.update(changed, self.passwords, removed or [])
+
+    def save_pairings(self, pairings: Dict[str, Union[str, List[str]]], base_dir: Optional[str] = None,
+                      backend: Optional[str] = None) -> None:
+        """Save pairings to the event store in ``base_dir``.
+
+        ``backend`` is a key of ``storage.BACKENDS``; by default each event is
+        a single SQLite file, "json" keeps the one-file-per-participant layout.
+        """
+        if base_dir is None:
+            base_dir = "secret_santa_pairings"
+        open_store(base_dir, backend).write(pairings, self.passwords)
+
+def _new_password() -> str:
+    # Six random digits
+    return f"{random.randrange(1000000):06d}"
+
+def _has_multiple_gifts(pairings: Dict) -> bool:
+    return any(isinstance(receiver, list) for receiver in pairings.values())
 
 def main():
     santa = SecretSanta()
@@ -139,7 +351,7 @@ def main():
     use_file = input("Do you want to load participants from a file? (y/n): ").lower().strip() == 'y'
     
     if use_file:
-        filename = input("Enter the path to the JSON file: ").strip()
+        filename = input("Enter the path to the JSON, NDJSON or CSV file: ").strip()
         if not santa.load_from_file(filename):
             print("Failed to load participants from file. Exiting.")
             return
@@ -166,9 +378,18 @@ def main():
             
             santa.add_participant(name, exclusions)
     
+    # Optionally avoid repeating previous years' pairings
+    strategy = "auto"
+    history_input = input("Enter previous event directories or master_list.json files to avoid repeats (comma-separated, most recent first, or press Enter to skip): ").strip()
+    if history_input:
+        if not santa.load_history([h.strip() for h in history_input.split(",")]):
+            print("Failed to load history. Exiting.")
+            return
+        strategy = "weighted"
+    
     # Generate and display pairings
     print("\nGenerating Secret Santa pairings...")
-    pairings = santa.generate_pairings()
+    pairings = santa.generate_pairings(strategy=strategy)
     
     if pairings:
         # Save pairings to individual files
@@ -177,8 +398,8 @@ def main():
         print("\nSecret Santa pairings have been generated!")
         print("\nEach participant has been assigned a unique password.")
         print("To view your assignment:")
-        print("1. Go to the 'secret_santa_pairings' directory")
-        print("2. Open the file with your name")
+        print("1. Run 'python read_assignment.py'")
+        print("2. Enter your name")
         print("3. Use your password to verify your identity")
         
         # Display passwords to the organizer
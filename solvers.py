@@ -0,0 +1,1073 @@
+import bisect
+import heapq
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from constraints import ConstraintModel
+
+# Set while any thread has a trace hook (see set_trace); called as
+# _trace(event, **fields) at dead ends and repairs, never in inner loops
+_trace: Optional[Callable[..., None]] = None
+_hooks = threading.local()
+_hooked_threads = 0
+_hooks_lock = threading.Lock()
+
+# Default mixing budget of the uniform sampler, in proposals per n ln n
+MIXING_FACTOR = 2.0
+
+# Smallest block the sharded strategy solves on its own
+MIN_SHARD_SIZE = 1000
+
+# Largest conflicting set hall_violator shrinks to a minimal one; the
+# shrinking is quadratic in its size
+MINIMIZE_LIMIT = 1000
+
+# Random pairs splice_in and splice_out try before a full repair
+SPLICE_ATTEMPTS = 64
+
+
+def set_trace(hook: Optional[Callable[..., None]]) -> Optional[Callable[..., None]]:
+    """Install the calling thread's trace hook, or remove it with None.
+
+    Runs in other threads are not traced by it. Returns the hook it
+    replaces.
+    """
+    global _trace, _hooked_threads
+    previous = getattr(_hooks, "hook", None)
+    _hooks.hook = hook
+    with _hooks_lock:
+        _hooked_threads += (hook is not None) - (previous is not None)
+        _trace = _dispatch if _hooked_threads else None
+    return previous
+
+
+def _dispatch(kind: str, **fields) -> None:
+    hook = getattr(_hooks, "hook", None)
+    if hook is not None:
+        hook(kind, **fields)
+
+
+def shuffle_pairings(model: ConstraintModel, max_attempts: int = 1000,
+                     stats: Optional[Dict] = None) -> Optional[Dict[str, str]]:
+    """Shuffle receivers and greedily assign them, retrying on dead ends.
+
+    Every solver accepts an optional ``stats`` dict that it fills with
+    counters such as ``attempts``, for benchmarks and monitoring.
+    """
+    if stats is None:
+        stats = {}
+    givers = list(range(len(model)))
+
+    for attempt in range(1, max_attempts + 1):
+        stats['attempts'] = attempt
+        # Create a copy of givers and shuffle
+        available = givers.copy()
+        random.shuffle(available)
+
+        # Try to create valid pairings
+        pairings = {}
+        valid = True
+
+        for giver in givers:
+            # Find a valid receiver
+            valid_receiver = None
+            for receiver in available:
+                if model.allowed(giver, receiver):
+                    valid_receiver = receiver
+                    break
+
+            if valid_receiver is None:
+                if _trace is not None:
+                    _trace("dead_end", attempt=attempt, giver=model.names[giver], assigned=len(pairings))
+                valid = False
+                break
+
+            pairings[model.names[giver]] = model.names[valid_receiver]
+            available.remove(valid_receiver)
+
+        if valid:
+            return pairings
+
+    return None
+
+
+def matching_pairings(model: ConstraintModel, stats: Optional[Dict] = None) -> Optional[Dict[str, str]]:
+    """Find pairings as a perfect matching between givers and receivers.
+
+    Starts from a random permutation (one that already keeps groups apart,
+    when there are groups) and repairs the givers whose receiver is
+    excluded with augmenting paths. Each search walks the complement of the
+    exclusion graph, skipping the giver's own large groups wholesale, so it
+    costs O(n + exclusions) and a failed search proves that no valid
+    assignment exists.
+    """
+    receiver_of = _perfect_matching(model, stats=stats)
+    if receiver_of is None:
+        return None
+    return _to_names(model, receiver_of)
+
+
+def derangement_pairings(model: ConstraintModel, stats: Optional[Dict] = None) -> Optional[Dict[str, str]]:
+    """Sample a uniformly random derangement, then repair any exclusions.
+
+    Without exclusions this is a single O(n) pass with no retries. Pairs
+    that break an exclusion are re-covered with augmenting paths, which
+    only touches a few other pairs when exclusions are sparse.
+    """
+    if stats is None:
+        stats = {}
+    stats['attempts'] = 1
+    receiver_of = _complete(model, random_derangement(len(model)), stats=stats)
+    if receiver_of is None:
+        return None
+    return _to_names(model, receiver_of)
+
+
+def cycle_pairings(model: ConstraintModel, max_swaps: Optional[int] = None,
+                   stats: Optional[Dict] = None) -> Optional[Dict[str, str]]:
+    """Arrange everyone in one big circle with Sattolo's algorithm.
+
+    Pairs that break an exclusion are repaired by swapping positions in the
+    circle, which keeps it a single cycle. Finding a valid circle is hard in
+    general, so this gives up after ``max_swaps`` tries (default 20n) and
+    returns None even if some other circle exists.
+    """
+    if stats is None:
+        stats = {}
+    size = len(model)
+    if max_swaps is None:
+        max_swaps = 20 * size
+    receiver_of = random_cycle(size)
+    stats['attempts'] = 1
+    stats['repairs'] = 0
+
+    # Walk the cycle into an ordering: order[k] gives to order[k + 1]
+    order = [0] * size
+    giver = 0
+    for k in range(size):
+        order[k] = giver
+        giver = receiver_of[giver]
+
+    def valid_at(k: int) -> bool:
+        return model.allowed(order[k % size], order[(k + 1) % size])
+
+    bad = [k for k in range(size) if not valid_at(k)]
+    swaps = 0
+    while bad:
+        k = bad.pop()
+        if valid_at(k):
+            continue
+        # Move the receiver at k + 1 elsewhere and bring in someone who fits
+        while True:
+            swaps += 1
+            if swaps > max_swaps:
+                if _trace is not None:
+                    _trace("gave_up", giver=model.names[order[k % size]], swaps=swaps - 1)
+                return None
+            m = random.randrange(size)
+            a, b = (k + 1) % size, m
+            if a == b:
+                continue
+            touched = {(a - 1) % size, a, (b - 1) % size, b}
+            order[a], order[b] = order[b], order[a]
+            if all(valid_at(t) for t in touched):
+                stats['repairs'] += 1
+                if _trace is not None:
+                    _trace("repair", giver=model.names[order[k % size]], swaps=swaps)
+                break
+            order[a], order[b] = order[b], order[a]
+
+    return {model.names[order[k]]: model.names[order[(k + 1) % size]] for k in range(size)}
+
+
+def uniform_pairings(model: ConstraintModel, steps: Optional[int] = None,
+                     stats: Optional[Dict] = None) -> Optional[Dict[str, str]]:
+    """Sample a close-to-uniform valid assignment with a Markov chain.
+
+    Starts from any valid assignment (found by matching) and proposes
+    random moves: swapping the receivers of two givers, or rotating those
+    of three. A move is kept only if every pair it touches is allowed,
+    which is O(1) per proposal. The proposals are symmetric, so the chain
+    converges to the uniform distribution over valid assignments instead
+    of favouring whoever is assigned first, as ``shuffle`` does.
+    ``steps`` is the mixing budget in proposals, MIXING_FACTOR * n ln n
+    by default.
+    """
+    if stats is None:
+        stats = {}
+    receiver_of = _perfect_matching(model, stats=stats)
+    if receiver_of is None:
+        return None
+    size = len(model)
+    if steps is None:
+        steps = int(MIXING_FACTOR * size * math.log(size)) + 1
+    accepted = _mix(model, receiver_of, steps)
+
+    stats['steps'] = steps
+    stats['accepted'] = accepted
+    if _trace is not None:
+        _trace("mixed", steps=steps, accepted=accepted)
+    return _to_names(model, receiver_of)
+
+
+def _mix(model: ConstraintModel, receiver_of: List[int], steps: int) -> int:
+    """Run ``steps`` swap/rotate proposals on a valid assignment in place.
+
+    Returns how many were accepted; the assignment stays valid throughout.
+    """
+    size = len(model)
+    allowed = model.allowed
+    rand = random.random
+    accepted = 0
+    for _ in range(steps):
+        a = int(rand() * size)
+        b = int(rand() * size)
+        if a == b:
+            continue
+        if rand() < 0.5:
+            # Swap: a gets b's receiver and b gets a's
+            ra, rb = receiver_of[a], receiver_of[b]
+            if allowed(a, rb) and allowed(b, ra):
+                receiver_of[a], receiver_of[b] = rb, ra
+                accepted += 1
+        else:
+            # Rotate: a gets b's receiver, b gets c's and c gets a's.
+            # Ordered triples are drawn uniformly, so each rotation is as
+            # likely to be proposed as its inverse
+            c = int(rand() * size)
+            if c == a or c == b:
+                continue
+            ra, rb, rc = receiver_of[a], receiver_of[b], receiver_of[c]
+            if allowed(a, rb) and allowed(b, rc) and allowed(c, ra):
+                receiver_of[a], receiver_of[b], receiver_of[c] = rb, rc, ra
+                accepted += 1
+    return accepted
+
+
+def sharded_pairings(model: ConstraintModel, shards: Optional[int] = None, workers: Optional[int] = None,
+                     stats: Optional[Dict] = None) -> Optional[Dict[str, str]]:
+    """Solve blocks of the roster in parallel and stitch them together.
+
+    Block ``k`` of ``shards`` (default: one per worker) holds every
+    ``shards``-th giver from ``k``, so households listed together are
+    spread over blocks and the parent never sorts or copies the roster.
+    Each block is solved on its own in a pool of ``workers`` processes
+    (default: every core), which inherit the model and respect only the
+    exclusions inside their block. The block results form one valid
+    assignment; only givers of blocks that could not be solved alone are
+    re-covered across shards by the augmenting-path repair, which still
+    proves infeasible rosters infeasible. A final pass of n / shards
+    receiver swaps between givers of different blocks keeps anyone from
+    being confined to their own shard. Rosters too small for two blocks
+    of MIN_SHARD_SIZE use ``auto``.
+    """
+    if stats is None:
+        stats = {}
+    size = len(model)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    shards = min(shards or workers, size // MIN_SHARD_SIZE)
+    if shards < 2:
+        stats['shards'] = 1
+        return auto_pairings(model, stats=stats)
+
+    # Daemonic processes, such as multiprocessing pool workers, cannot
+    # start a pool of their own
+    if workers > 1 and not multiprocessing.current_process().daemon:
+        tasks = [(shard, shards, random.getrandbits(64)) for shard in range(shards)]
+        with multiprocessing.Pool(min(workers, shards), initializer=_set_shard_model, initargs=(model,)) as pool:
+            solved = pool.starmap(_solve_shard, tasks)
+    else:
+        solved = [_solve_block(model, shard, shards) for shard in range(shards)]
+
+    receiver_of = [-1] * size
+    failed = []
+    for shard, receivers in enumerate(solved):
+        if receivers is None:
+            failed.append(shard)
+            if _trace is not None:
+                _trace("shard_failed", size=len(range(shard, size, shards)))
+            continue
+        receiver_of[shard::shards] = receivers
+    stats['attempts'] = 1
+    stats['shards'] = shards
+    stats['failed_shards'] = len(failed)
+    stats['repairs'] = 0
+
+    if failed:
+        giver_of = [-1] * size
+        for giver, receiver in enumerate(receiver_of):
+            if receiver != -1:
+                giver_of[receiver] = giver
+        pools = _receiver_pools(model)
+        for shard in failed:
+            for giver in range(shard, size, shards):
+                stats['repairs'] += 1
+                if not _augment(model, {}, giver, receiver_of, giver_of, pools):
+                    return None
+    stats['accepted'] = _swap_across(model, receiver_of, shards, size // shards)
+    return _to_names(model, receiver_of)
+
+
+def _swap_across(model: ConstraintModel, receiver_of: List[int], shards: int, steps: int) -> int:
+    """Propose ``steps`` receiver swaps between givers of different blocks.
+
+    Returns how many were accepted; the assignment stays valid throughout.
+    """
+    size = len(model)
+    allowed = model.allowed
+    rand = random.random
+    accepted = 0
+    for _ in range(steps):
+        a = int(rand() * size)
+        b = int(rand() * size)
+        if (a - b) % shards == 0:
+            continue
+        ra, rb = receiver_of[a], receiver_of[b]
+        if allowed(a, rb) and allowed(b, ra):
+            receiver_of[a], receiver_of[b] = rb, ra
+            accepted += 1
+    return accepted
+
+
+# The roster being sharded, handed to each pool worker once as it starts
+_shard_model: Optional[ConstraintModel] = None
+
+
+def _set_shard_model(model: ConstraintModel) -> None:
+    global _shard_model
+    _shard_model = model
+
+
+def _solve_shard(shard: int, shards: int, seed: int) -> Optional[List[int]]:
+    # Forked workers would otherwise all draw the same random numbers
+    random.seed(seed)
+    return _solve_block(_shard_model, shard, shards)
+
+
+def _solve_block(model: ConstraintModel, shard: int, shards: int) -> Optional[List[int]]:
+    """Assign the givers ``shard, shard + shards, ...`` among themselves.
+
+    Returns their receivers as roster indices, or None if the block has
+    no valid assignment on its own.
+    """
+    givers = range(shard, len(model), shards)
+    blocked = [frozenset((j - shard) // shards for j in model.blocked[giver] if j % shards == shard)
+               for giver in givers]
+    block = ConstraintModel([model.names[giver] for giver in givers], blocked,
+                            [model.groups[giver] for giver in givers], model.group_sizes)
+    local = _complete(block, random_derangement(len(block)))
+    if local is None:
+        return None
+    return [shard + shards * receiver for receiver in local]
+
+
+def auto_pairings(model: ConstraintModel, stats: Optional[Dict] = None) -> Optional[Dict[str, str]]:
+    """Use the derangement fast path for sparse exclusions, matching otherwise."""
+    if model.exclusion_count() <= len(model):
+        return derangement_pairings(model, stats=stats)
+    return matching_pairings(model, stats=stats)
+
+
+def random_derangement(size: int) -> List[int]:
+    """Return a uniformly random permutation with no fixed points.
+
+    Martinez, Panholzer and Prodinger's algorithm: expected O(n) time with
+    no rejection of whole permutations.
+    """
+    values = list(range(size))
+    if size < 2:
+        return values
+    # ratio[u] = D(u-1) / D(u) for derangement numbers D, built without
+    # the huge integers themselves
+    ratio = [0.0] * (size + 1)
+    for u in range(3, size + 1):
+        ratio[u] = 1.0 / ((u - 1) * (1.0 + ratio[u - 1]))
+
+    marked = [False] * size
+    remaining = size
+    i = size - 1
+    while remaining >= 2:
+        if not marked[i]:
+            while True:
+                j = random.randrange(i)
+                if not marked[j]:
+                    break
+            values[i], values[j] = values[j], values[i]
+            # Probability that j closes a 2-cycle: (u-1) D(u-2) / D(u)
+            if remaining == 2:
+                closes = 1.0
+            else:
+                closes = (remaining - 1) * ratio[remaining] * ratio[remaining - 1]
+            if random.random() < closes:
+                marked[j] = True
+                remaining -= 1
+            remaining -= 1
+        i -= 1
+    return values
+
+
+def random_cycle(size: int) -> List[int]:
+    """Return a uniformly random single-cycle permutation (Sattolo)."""
+    values = list(range(size))
+    for i in range(size - 1, 0, -1):
+        j = random.randrange(i)
+        values[i], values[j] = values[j], values[i]
+    return values
+
+
+def weighted_pairings(model: ConstraintModel, costs: Optional[Dict[Tuple[int, int], int]] = None,
+                      stats: Optional[Dict] = None) -> Optional[Dict[str, str]]:
+    """Find a minimum-cost assignment given per-pair penalties.
+
+    ``costs`` maps (giver, receiver) indices to a penalty; every other allowed
+    pair costs nothing. Penalised pairs are usually a sparse set (a few past
+    years of pairings), so the zero-cost matching is tried first and is optimal
+    whenever it exists. Only rosters too tight to avoid every penalised pair
+    fall back to an exact min-cost matching, which only pays for the
+    givers the free matching could not cover.
+    """
+    if stats is None:
+        stats = {}
+    if not costs:
+        return matching_pairings(model, stats)
+
+    avoid: Dict[int, Set[int]] = {}
+    for giver, receiver in costs:
+        avoid.setdefault(giver, set()).add(receiver)
+    receiver_of = _perfect_matching(model, avoid, stats)
+    if receiver_of is None:
+        if _trace is not None:
+            _trace("fallback", solver="min_cost")
+        stats['attempts'] += 1
+        receiver_of = _min_cost_matching(model, costs)
+    if receiver_of is None:
+        return None
+    return _to_names(model, receiver_of)
+
+
+def multi_gift_pairings(model: ConstraintModel, gifts: int, max_attempts: int = 10,
+                        stats: Optional[Dict] = None) -> Optional[Dict[str, List[str]]]:
+    """Give everyone ``gifts`` distinct receivers, each receiving ``gifts`` times.
+
+    Builds the assignment as ``gifts`` edge-disjoint perfect matchings: each
+    round is an ordinary matching that also avoids every pair used by an
+    earlier round, so a round costs about as much as a single-gift solve.
+    Matching round by round is greedy, and an early round can use up pairs
+    a later one needs, so a failed round restarts the whole assignment up
+    to ``max_attempts`` times. None is certain only when the first round
+    fails; otherwise it means no assignment was found.
+    """
+    if stats is None:
+        stats = {}
+    size = len(model)
+    if gifts < 1 or gifts >= size:
+        return None
+
+    for attempt in range(1, max_attempts + 1):
+        used: Dict[int, Set[int]] = {}
+        rounds: List[List[int]] = []
+        for _ in range(gifts):
+            receiver_of = _perfect_matching(model, used)
+            if receiver_of is None:
+                break
+            rounds.append(receiver_of)
+            for giver, receiver in enumerate(receiver_of):
+                used.setdefault(giver, set()).add(receiver)
+        stats['attempts'] = attempt
+        if _trace is not None and len(rounds) < gifts:
+            _trace("restart", attempt=attempt, failed_round=len(rounds) + 1)
+        if len(rounds) == gifts:
+            return {
+                model.names[giver]: [model.names[receiver_of[giver]] for receiver_of in rounds]
+                for giver in range(size)
+            }
+        if not rounds:
+            # Not even one valid assignment exists
+            return None
+    return None
+
+
+def repair_pairings(model: ConstraintModel, pairings: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """Complete a partial assignment while changing as few pairs as possible.
+
+    ``pairings`` may miss givers or hold pairs that are no longer valid, such
+    as ones pointing at a removed participant. Valid pairs are kept unless a
+    shortest augmenting path has to move them: a removed giver is spliced
+    out by linking their giver to their receiver, and a new participant is
+    spliced into an existing pair. Returns only the givers whose receiver
+    is new or changed, or None if the roster has no valid assignment.
+    """
+    start = [-1] * len(model)
+    for giver, receiver in pairings.items():
+        i = model.index.get(giver)
+        j = model.index.get(receiver)
+        if i is not None and j is not None:
+            start[i] = j
+
+    receiver_of = _complete(model, start)
+    if receiver_of is None:
+        return None
+
+    changed = {}
+    for giver, receiver in enumerate(receiver_of):
+        name = model.names[giver]
+        if pairings.get(name) != model.names[receiver]:
+            changed[name] = model.names[receiver]
+    return changed
+
+
+def splice_in(model: ConstraintModel, pairings: Dict[str, str], name: str) -> Optional[Dict[str, str]]:
+    """Pair ``name``, just added to ``model``, by cutting into one saved pair.
+
+    Random pairs a -> b are tried for one where a may draw ``name`` and
+    ``name`` may draw b, so the usual case does not grow with the roster.
+    Falls back to repair_pairings. Returns like repair_pairings.
+    """
+    new = model.index[name]
+    size = len(model)
+    for _ in range(SPLICE_ATTEMPTS):
+        giver = random.randrange(size)
+        receiver = model.index.get(pairings.get(model.names[giver]))
+        if giver != new and receiver is not None and model.allowed(giver, new) and model.allowed(new, receiver):
+            return {model.names[giver]: name, name: model.names[receiver]}
+    return repair_pairings(model, pairings)
+
+
+def splice_out(model: ConstraintModel, pairings: Dict[str, str], name: str) -> Optional[Dict[str, str]]:
+    """Close the gap ``name``, just removed from ``model``, leaves in ``pairings``.
+
+    Their giver takes over their receiver when allowed, else swaps receivers
+    with a random pair a -> b (giver -> b, a -> receiver). Falls back to
+    repair_pairings on the remaining pairs. Returns like repair_pairings.
+    """
+    # Saved pairings have no reverse index, so finding the giver is a scan
+    giver_name = next((giver for giver, receiver in pairings.items() if receiver == name), None)
+    giver = model.index.get(giver_name)
+    receiver = model.index.get(pairings.get(name))
+    if giver is not None and receiver is not None:
+        if model.allowed(giver, receiver):
+            return {giver_name: model.names[receiver]}
+        size = len(model)
+        for _ in range(SPLICE_ATTEMPTS):
+            other = random.randrange(size)
+            drawn = model.index.get(pairings.get(model.names[other]))
+            if other != giver and drawn is not None and model.allowed(giver, drawn) and model.allowed(other, receiver):
+                return {giver_name: model.names[drawn], model.names[other]: model.names[receiver]}
+    remaining = {giver: receiver for giver, receiver in pairings.items() if giver != name}
+    return repair_pairings(model, remaining)
+
+
+def _to_names(model: ConstraintModel, receiver_of: List[int]) -> Dict[str, str]:
+    return {model.names[giver]: model.names[receiver] for giver, receiver in enumerate(receiver_of)}
+
+
+def _perfect_matching(model: ConstraintModel, avoid: Optional[Dict[int, Set[int]]] = None,
+                      stats: Optional[Dict] = None) -> Optional[List[int]]:
+    """Return receiver indices per giver, or None if no perfect matching exists.
+
+    ``avoid`` adds one-directional blocks on top of the model's exclusions.
+    """
+    if avoid is None:
+        avoid = {}
+    if stats is None:
+        stats = {}
+    stats['attempts'] = 1
+    if model.group_sizes:
+        start = _group_start(model)
+    else:
+        start = list(range(len(model)))
+        random.shuffle(start)
+    return _complete(model, start, avoid, stats)
+
+
+def _group_start(model: ConstraintModel) -> List[int]:
+    """A random assignment in which nobody draws from their own group.
+
+    A random start breaks about n / (number of groups) group pairs, each
+    costing an augmenting path. Here everyone is lined up group by group,
+    in random order, and draws the person ``shift`` places further on; a
+    shift of at least the largest group never lands in the giver's own
+    group. Only people in several groups, and explicit exclusions, can
+    still need repairs.
+    """
+    size = len(model)
+    lineup: Dict[int, List[int]] = {}
+    for person in range(size):
+        groups = model.groups[person]
+        # People outside any group each get a line of their own
+        key = max(groups, key=lambda group: model.group_sizes[group]) if groups else -1 - person
+        lineup.setdefault(key, []).append(person)
+    lines = list(lineup.values())
+    random.shuffle(lines)
+    order = []
+    for line in lines:
+        random.shuffle(line)
+        order.extend(line)
+    largest = max(len(line) for line in lines)
+    shift = random.randint(largest, size - largest) if 2 * largest <= size else largest
+    start = [-1] * size
+    for position, giver in enumerate(order):
+        start[giver] = order[(position + shift) % size]
+    return start
+
+
+def _complete(model: ConstraintModel, start: List[int], avoid: Optional[Dict[int, Set[int]]] = None,
+              stats: Optional[Dict] = None) -> Optional[List[int]]:
+    """Turn a partial or invalid assignment into a valid one.
+
+    ``start`` holds a receiver index per giver, -1 for none. Valid pairs are
+    kept, the rest are dropped and re-covered with augmenting paths. Returns
+    None if no valid assignment exists.
+    """
+    if avoid is None:
+        avoid = {}
+    if stats is None:
+        stats = {}
+    receiver_of, _, stuck = _match(model, start, avoid, stats)
+    if stuck != -1:
+        return None
+    return receiver_of
+
+
+def _match(model: ConstraintModel, start: List[int], avoid: Dict[int, Set[int]],
+           stats: Dict, deadline: Optional[float] = None) -> Tuple[List[int], List[int], int]:
+    """Do the work of _complete, stopping at the first giver left uncovered.
+
+    Returns the matching both ways and that giver, or -1 if everyone is
+    covered. Raises TimeoutError once ``time.monotonic()`` passes
+    ``deadline``, checked between repairs.
+    """
+    stats['repairs'] = 0
+    size = len(model)
+    receiver_of = [-1] * size
+    giver_of = [-1] * size
+    unmatched = []
+
+    for giver, receiver in enumerate(start):
+        if (receiver != -1 and giver_of[receiver] == -1 and model.allowed(giver, receiver)
+                and receiver not in avoid.get(giver, ())):
+            receiver_of[giver] = receiver
+            giver_of[receiver] = giver
+        else:
+            unmatched.append(giver)
+
+    pools = _receiver_pools(model) if unmatched else None
+    for giver in unmatched:
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError("Matching did not finish in time")
+        stats['repairs'] += 1
+        if not _augment(model, avoid, giver, receiver_of, giver_of, pools):
+            return receiver_of, giver_of, giver
+
+    return receiver_of, giver_of, -1
+
+
+def hall_violator(model: ConstraintModel,
+                  deadline: Optional[float] = None) -> Optional[Tuple[List[str], List[str]]]:
+    """Explain why a roster has no valid assignment, or return None if it has one.
+
+    Finding the assignment takes one maximum matching. When some giver
+    cannot be covered, the givers reachable from them along alternating
+    paths can only draw from receivers already taken by the rest of that
+    set: more givers than receivers, which by Hall's theorem no
+    assignment can satisfy. A group holding more than half the roster is
+    the usual culprit and is caught first, without any matching. The set
+    is then shrunk until dropping any giver would resolve the conflict,
+    unless it is larger than MINIMIZE_LIMIT. Returns the givers and every
+    receiver they may draw.
+
+    Raises TimeoutError once ``time.monotonic()`` passes ``deadline``.
+    """
+    size = len(model)
+    conflict = _oversized_group(model)
+    if conflict is not None:
+        givers, receivers = conflict
+    else:
+        if model.group_sizes:
+            start = _group_start(model)
+        else:
+            start = random_derangement(size) if size > 1 else [-1] * size
+        _, giver_of, stuck = _match(model, start, {}, {}, deadline)
+        if stuck == -1:
+            return None
+
+        # Alternating BFS: every receiver ``stuck`` reaches is matched, and
+        # its giver reaches no receiver the set cannot already draw
+        givers = [stuck]
+        receivers = []
+        unreached = list(range(size))
+        for giver in givers:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("Conflict search did not finish in time")
+            remaining = []
+            for receiver in unreached:
+                if model.allowed(giver, receiver):
+                    receivers.append(receiver)
+                    givers.append(giver_of[receiver])
+                else:
+                    remaining.append(receiver)
+            unreached = remaining
+
+    if len(givers) <= MINIMIZE_LIMIT:
+        givers, receivers = _minimize_violator(model, givers, receivers, deadline)
+    return [model.names[g] for g in givers], [model.names[r] for r in receivers]
+
+
+def _oversized_group(model: ConstraintModel) -> Optional[Tuple[List[int], List[int]]]:
+    size = len(model)
+    for group, members in enumerate(model.group_sizes):
+        if 2 * members <= size:
+            continue
+        # One member more than there are outsiders already cannot be covered
+        givers = [i for i in range(size) if group in model.groups[i]][:size - members + 1]
+        receivers = [r for r in range(size)
+                     if group not in model.groups[r] and any(model.allowed(g, r) for g in givers)]
+        return givers, receivers
+    return None
+
+
+def _minimize_violator(model: ConstraintModel, givers: List[int], receivers: List[int],
+                       deadline: Optional[float] = None) -> Tuple[List[int], List[int]]:
+    can_draw = {giver: [r for r in receivers if model.allowed(giver, r)] for giver in givers}
+    drawn_by = dict.fromkeys(receivers, 0)
+    for options in can_draw.values():
+        for receiver in options:
+            drawn_by[receiver] += 1
+    members = list(givers)
+    covered = len(receivers)
+    removed = True
+    while removed:
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError("Conflict search did not finish in time")
+        removed = False
+        for giver in list(members):
+            # Receivers only this giver may draw disappear along with them
+            only = sum(1 for receiver in can_draw[giver] if drawn_by[receiver] == 1)
+            if len(members) - 1 > covered - only:
+                members.remove(giver)
+                covered -= only
+                for receiver in can_draw[giver]:
+                    drawn_by[receiver] -= 1
+                removed = True
+    return sorted(members), sorted(r for r in receivers if drawn_by[r])
+
+
+def _large_groups(model: ConstraintModel) -> List[int]:
+    """Each person's largest group of at least sqrt(n) members, or -1."""
+    large = max(2, math.isqrt(len(model)))
+    team = [-1] * len(model)
+    for person, groups in enumerate(model.groups):
+        for group in groups:
+            if model.group_sizes[group] >= large and (team[person] == -1
+                                                      or model.group_sizes[group] > model.group_sizes[team[person]]):
+                team[person] = group
+    return team
+
+
+def _receiver_pools(model: ConstraintModel) -> List[Tuple[int, List[int]]]:
+    """Every receiver in random order, split by large group.
+
+    Givers skip the pools of their own large groups instead of checking
+    each member there; one set of pools serves every augmenting path of a
+    matching, so a repair no longer starts by shuffling the roster.
+    """
+    pools: Dict[int, List[int]] = {}
+    for receiver, group in enumerate(_large_groups(model)):
+        pools.setdefault(group, []).append(receiver)
+    for pool in pools.values():
+        random.shuffle(pool)
+    return list(pools.items())
+
+
+def _augment(model: ConstraintModel, avoid: Dict[int, Set[int]], root: int, receiver_of: List[int], giver_of: List[int],
+             pools: Optional[List[Tuple[int, List[int]]]] = None) -> bool:
+    """Extend the matching to cover ``root`` along an alternating path.
+
+    ``pools`` comes from _receiver_pools and is left unchanged; it is
+    built here if not given.
+    """
+    if pools is None:
+        pools = _receiver_pools(model)
+    unvisited = [(team, pool[:]) for team, pool in pools]
+    groups = model.groups
+    reached_from: Dict[int, int] = {}
+    queue = deque([root])
+
+    while queue:
+        giver = queue.popleft()
+        blocked = model.blocked[giver]
+        avoided = avoid.get(giver, ())
+        member_of = model.groups[giver]
+        for index, (team, pool) in enumerate(unvisited):
+            if team in member_of:
+                continue
+            remaining = []
+            for receiver in pool:
+                if (receiver == giver or receiver in blocked or receiver in avoided
+                        or (member_of and not member_of.isdisjoint(groups[receiver]))):
+                    remaining.append(receiver)
+                    continue
+                reached_from[receiver] = giver
+                if giver_of[receiver] == -1:
+                    # Flip the path back to the root
+                    length = 0
+                    while True:
+                        giver = reached_from[receiver]
+                        previous = receiver_of[giver]
+                        receiver_of[giver] = receiver
+                        giver_of[receiver] = giver
+                        length += 1
+                        if previous == -1:
+                            if _trace is not None:
+                                _trace("augment", giver=model.names[root], reassigned=length - 1)
+                            return True
+                        receiver = previous
+                queue.append(giver_of[receiver])
+            unvisited[index] = (team, remaining)
+
+    if _trace is not None:
+        # Every receiver ``root`` can reach is taken by givers with no alternative
+        _trace("infeasible", giver=model.names[root], reached=len(reached_from))
+    return False
+
+
+def _min_cost_matching(model: ConstraintModel, costs: Dict[Tuple[int, int], int]) -> Optional[List[int]]:
+    """Solve the assignment problem exactly; excluded pairs are never used.
+
+    Starts from a maximum matching of free pairs, then works in phases
+    (primal-dual successive shortest paths): a Dijkstra search from every
+    giver still uncovered finds the cost of the cheapest augmenting path
+    and raises the potentials, and a depth-first search takes as many
+    disjoint paths of zero reduced cost as it can. Penalties take few
+    distinct values, so there are few phases.
+
+    Free pairs are never enumerated. Receivers are kept in classes of
+    equal potential (and large group), and a giver reaches a whole class
+    at once, so a phase costs about the number of receivers plus the
+    penalised pairs it touches rather than n^2. People excluded from most
+    of the roster have their few free pairs listed like penalised ones.
+    """
+    size = len(model)
+    avoid: Dict[int, Set[int]] = {}
+    # Pairs priced one by one: (receiver, cost) per giver
+    edges: Dict[int, List[Tuple[int, int]]] = {}
+    for (giver, receiver), cost in costs.items():
+        if model.allowed(giver, receiver):
+            edges.setdefault(giver, []).append((receiver, cost))
+        avoid.setdefault(giver, set()).add(receiver)
+    loners = [person for person in range(size) if len(model.blocked[person]) > size // 2]
+    alone = set(loners)
+    for loner in loners:
+        for other in range(size):
+            if model.allowed(other, loner) and loner not in avoid.get(other, ()):
+                edges.setdefault(other, []).append((loner, 0))
+            if other not in alone and model.allowed(loner, other) and other not in avoid.get(loner, ()):
+                edges.setdefault(loner, []).append((other, 0))
+    # Receivers of one large group share classes, so that the group's own
+    # members do not rescan them
+    team = _large_groups(model)
+
+    receiver_of = [-1] * size
+    giver_of = [-1] * size
+    unmatched = []
+    if model.group_sizes:
+        start = _group_start(model)
+    else:
+        start = list(range(size))
+        random.shuffle(start)
+    for giver, receiver in enumerate(start):
+        if giver_of[receiver] == -1 and model.allowed(giver, receiver) and receiver not in avoid.get(giver, ()):
+            receiver_of[giver] = receiver
+            giver_of[receiver] = giver
+        else:
+            unmatched.append(giver)
+    # A giver with no free augmenting path now never gets one later
+    pools = _receiver_pools(model)
+    uncovered = [giver for giver in unmatched if not _augment(model, avoid, giver, receiver_of, giver_of, pools)]
+
+    giver_potential = [0] * size
+    receiver_potential = [0] * size
+    while uncovered:
+        classes: Dict[Tuple[int, int], List[int]] = {}
+        for receiver in range(size):
+            if receiver not in alone:
+                classes.setdefault((receiver_potential[receiver], team[receiver]), []).append(receiver)
+        total = _price(model, uncovered, classes, edges, alone, avoid, giver_of, giver_potential, receiver_potential)
+        if total is None:
+            return None
+        # Every cheapest augmenting path now uses only pairs of zero reduced
+        # cost; take as many disjoint ones as a depth-first search finds
+        tiers: Dict[int, Dict[int, List[int]]] = {}
+        for receiver in range(size):
+            if receiver not in alone:
+                tiers.setdefault(receiver_potential[receiver], {}).setdefault(team[receiver], []).append(receiver)
+        visited: Set[int] = set()
+        uncovered = [root for root in uncovered
+                     if not _augment_tight(model, root, tiers, edges, alone, avoid, receiver_of, giver_of,
+                                           giver_potential, receiver_potential, visited)]
+    return receiver_of
+
+
+def _price(model: ConstraintModel, roots: List[int], classes: Dict[Tuple[int, int], List[int]],
+           edges: Dict[int, List[Tuple[int, int]]], alone: Set[int], avoid: Dict[int, Set[int]],
+           giver_of: List[int], giver_potential: List[int], receiver_potential: List[int]) -> Optional[int]:
+    """Dijkstra from every uncovered giver on reduced costs, then raise the potentials.
+
+    Returns the distance to the nearest unmatched receiver, or None if
+    none can be reached. ``classes`` is used up.
+    """
+    size = len(model)
+    # Highest potential first: a giver reaches these classes in order of
+    # distance, so it only queues the next one once it got there
+    keys = sorted(classes, key=lambda key: -key[0])
+    negated = [-key[0] for key in keys]
+    giver_dist: Dict[int, int] = {}
+    receiver_dist: Dict[int, int] = {}
+    # (distance, tiebreak, giver, receiver, position in keys); a giver is
+    # settled when both are None
+    heap = [(0, i, root, None, None) for i, root in enumerate(roots)]
+    counter = len(heap)
+    total = None
+    while heap and total is None:
+        dist, _, giver, receiver, position = heapq.heappop(heap)
+        if receiver is None and position is None:
+            if giver in giver_dist:
+                continue
+            giver_dist[giver] = dist
+            level = dist + giver_potential[giver]
+            # Loners draw from so few people that all their pairs are listed
+            if giver not in alone:
+                position = _next_class(keys, bisect.bisect_left(negated, -giver_potential[giver]),
+                                       model.groups[giver])
+                if position is not None:
+                    heapq.heappush(heap, (level - keys[position][0], counter, giver, None, position))
+                    counter += 1
+            for receiver, cost in edges.get(giver, ()):
+                if receiver not in receiver_dist:
+                    heapq.heappush(heap, (level + cost - receiver_potential[receiver], counter, giver, receiver, None))
+                    counter += 1
+            continue
+        if position is not None:
+            # Free pairs from ``giver`` into a class of receivers
+            key = keys[position]
+            blocked = avoid.get(giver, ())
+            reached = []
+            kept = []
+            for candidate in classes[key]:
+                if candidate in receiver_dist:
+                    continue
+                if model.allowed(giver, candidate) and candidate not in blocked:
+                    reached.append(candidate)
+                else:
+                    kept.append(candidate)
+            classes[key] = kept
+            following = _next_class(keys, position + 1, model.groups[giver])
+            if following is not None:
+                level = giver_dist[giver] + giver_potential[giver]
+                heapq.heappush(heap, (level - keys[following][0], counter, giver, None, following))
+                counter += 1
+        elif receiver in receiver_dist:
+            continue
+        else:
+            reached = [receiver]
+        for receiver in reached:
+            receiver_dist[receiver] = dist
+            if giver_of[receiver] == -1:
+                total = dist
+                break
+            heapq.heappush(heap, (dist, counter, giver_of[receiver], None, None))
+            counter += 1
+
+    if total is None:
+        return None
+    for giver in range(size):
+        giver_potential[giver] += min(giver_dist.get(giver, total), total)
+    for receiver in range(size):
+        receiver_potential[receiver] += min(receiver_dist.get(receiver, total), total)
+    return total
+
+
+def _augment_tight(model: ConstraintModel, root: int, tiers: Dict[int, Dict[int, List[int]]],
+                   edges: Dict[int, List[Tuple[int, int]]], alone: Set[int], avoid: Dict[int, Set[int]],
+                   receiver_of: List[int], giver_of: List[int], giver_potential: List[int],
+                   receiver_potential: List[int], visited: Set[int]) -> bool:
+    """Cover ``root`` along pairs of zero reduced cost, avoiding ``visited`` receivers.
+
+    ``tiers`` holds the receivers outside ``alone`` by potential and large
+    group; receivers are taken out of it as they are visited.
+    """
+
+    def tight(giver):
+        potential = giver_potential[giver]
+        for receiver, cost in edges.get(giver, ()):
+            if receiver not in visited and cost + potential == receiver_potential[receiver]:
+                yield receiver
+        if giver in alone:
+            return
+        blocked = avoid.get(giver, ())
+        member_of = model.groups[giver]
+        for group, receivers in tiers.get(potential, {}).items():
+            if group in member_of:
+                continue
+            # Receivers this giver may not draw go back for the next one
+            skipped = []
+            while receivers:
+                receiver = receivers.pop()
+                if receiver in visited:
+                    continue
+                if model.allowed(giver, receiver) and receiver not in blocked:
+                    receivers.extend(skipped)
+                    skipped = []
+                    yield receiver
+                else:
+                    skipped.append(receiver)
+            receivers.extend(skipped)
+
+    stack = [(root, tight(root))]
+    path: List[int] = []
+    while stack:
+        giver, candidates = stack[-1]
+        receiver = next(candidates, None)
+        if receiver is None:
+            stack.pop()
+            if path:
+                path.pop()
+            continue
+        if receiver in visited:
+            continue
+        visited.add(receiver)
+        path.append(receiver)
+        if giver_of[receiver] == -1:
+            # Flip the path back to the root
+            for (giver, _), receiver in zip(stack, path):
+                receiver_of[giver] = receiver
+                giver_of[receiver] = giver
+            return True
+        stack.append((giver_of[receiver], tight(giver_of[receiver])))
+    return False
+
+
+def _next_class(keys: List[Tuple[int, int]], position: int, member_of) -> Optional[int]:
+    # Skip the classes of large groups the giver belongs to
+    while position < len(keys) and keys[position][1] in member_of:
+        position += 1
+    return position if position < len(keys) else None
+
+
+STRATEGIES = {
+    "auto": auto_pairings,
+    "shuffle": shuffle_pairings,
+    "matching": matching_pairings,
+    "weighted": weighted_pairings,
+    "derangement": derangement_pairings,
+    "cycle": cycle_pairings,
+    "uniform": uniform_pairings,
+    "sharded": sharded_pairings,
+}
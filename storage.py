@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+# Backend used when none is requested explicitly
+DEFAULT_BACKEND = os.environ.get("SECRET_SANTA_STORAGE", "sqlite")
+
+# Root holding one directory per event
+DEFAULT_ROOT = "secret_santa_pairings"
+
+# Event directories are fanned out over subdirectories named after this
+# many leading characters of the event id, 256 of them for UUIDs
+SHARD_WIDTH = 2
+
+# giver -> receiver, or giver -> list of receivers in multi-gift events
+Pairings = Dict[str, Union[str, List[str]]]
+
+
+def _assignment(giver: str, receiver: Union[str, List[str]], password: str) -> Dict:
+    """Build a giver's assignment record.
+
+    Multi-gift records list every receiver under ``receivers`` and keep the
+    first one under ``receiver`` for readers that expect a single name.
+    """
+    if isinstance(receiver, list):
+        return {"giver": giver, "receiver": receiver[0], "receivers": receiver, "password": password}
+    return {"giver": giver, "receiver": receiver, "password": password}
+
+
+class DirectoryStore:
+    """Legacy layout: one JSON file per giver plus master_list.json."""
+
+    def __init__(self, base_dir: Union[str, Path]):
+        self.base_dir = Path(base_dir)
+
+    def exists(self) -> bool:
+        return (self.base_dir / "master_list.json").exists()
+
+    def write(self, pairings: Pairings, passwords: Dict[str, str]) -> None:
+        """Save each participant's assignment and the master list."""
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+
+        # Save each participant's assignment
+        for giver, receiver in pairings.items():
+            assignment = _assignment(giver, receiver, passwords[giver])
+
+            # Save to a file named after the giver
+            with open(self.base_dir / f"{giver}.json", "w") as f:
+                json.dump(assignment, f, indent=2)
+
+        # Save the master list (encrypted) for verification
+        master_list = {
+            "pairings": pairings,
+            "passwords": passwords
+        }
+        with open(self.base_dir / "master_list.json", "w") as f:
+            json.dump(master_list, f, indent=2)
+
+    def update(self, changed: Pairings, passwords: Dict[str, str], removed: Iterable[str] = ()) -> None:
+        """Rewrite only the changed givers' files and drop removed ones.
+
+        The master list still has to be rewritten as a whole.
+        """
+        master_list = self.read_master_list()
+        for giver in removed:
+            (self.base_dir / f"{giver}.json").unlink(missing_ok=True)
+            master_list["pairings"].pop(giver, None)
+            master_list["passwords"].pop(giver, None)
+        for giver, receiver in changed.items():
+            assignment = _assignment(giver, receiver, passwords[giver])
+            with open(self.base_dir / f"{giver}.json", "w") as f:
+                json.dump(assignment, f, indent=2)
+            master_list["pairings"][giver] = receiver
+            master_list["passwords"][giver] = passwords[giver]
+        with open(self.base_dir / "master_list.json", "w") as f:
+            json.dump(master_list, f, indent=2)
+
+    def lookup(self, name: str) -> Optional[Dict]:
+        """Return the giver's assignment record, or None if there is none."""
+        assignment_file = self.base_dir / f"{name}.json"
+        if not assignment_file.exists():
+            return None
+        with open(assignment_file, "r") as f:
+            return json.load(f)
+
+    def read_master_list(self) -> Dict[str, Dict]:
+        with open(self.base_dir / "master_list.json", "r") as f:
+            return json.load(f)
+
+    def assignments(self, after: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Yield assignment records in giver order, starting after ``after``.
+
+        The legacy layout has to read the whole master list first.
+        """
+        master_list = self.read_master_list()
+        givers = sorted(giver for giver in master_list["passwords"] if after is None or giver > after)
+        for giver in givers[:limit]:
+            yield _assignment(giver, master_list["pairings"][giver], master_list["passwords"][giver])
+
+
+class SQLiteStore:
+    """One SQLite file per event, indexed by giver.
+
+    A whole event is written in a single transaction, and a lookup is one
+    primary-key read instead of a file open and JSON parse. Multi-gift
+    events also keep each giver's receivers as a JSON list in the
+    ``receivers`` column, which files written before it existed lack.
+    """
+
+    filename = "pairings.db"
+
+    def __init__(self, base_dir: Union[str, Path]):
+        self.base_dir = Path(base_dir)
+        self.path = self.base_dir / self.filename
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        return sqlite3.connect(self.path)
+
+    def _create_table(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS assignments ("
+            "giver TEXT PRIMARY KEY, receiver TEXT NOT NULL, password TEXT NOT NULL, receivers TEXT"
+            ") WITHOUT ROWID"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(assignments)")}
+        if "receivers" not in columns:
+            conn.execute("ALTER TABLE assignments ADD COLUMN receivers TEXT")
+
+    @staticmethod
+    def _rows(pairings: Pairings, passwords: Dict[str, str]):
+        for giver, receiver in pairings.items():
+            if isinstance(receiver, list):
+                yield giver, receiver[0], passwords[giver], json.dumps(receiver)
+            else:
+                yield giver, receiver, passwords[giver], None
+
+    def write(self, pairings: Pairings, passwords: Dict[str, str]) -> None:
+        """Replace the event's assignments atomically."""
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                self._create_table(conn)
+                conn.execute("DELETE FROM assignments")
+                conn.executemany(
+                    "INSERT INTO assignments (giver, receiver, password, receivers) VALUES (?, ?, ?, ?)",
+                    self._rows(pairings, passwords)
+                )
+        finally:
+            conn.close()
+
+    def update(self, changed: Pairings, passwords: Dict[str, str], removed: Iterable[str] = ()) -> None:
+        """Upsert the changed givers and delete removed ones in one transaction."""
+        conn = self._connect()
+        try:
+            with conn:
+                self._create_table(conn)
+                conn.executemany("DELETE FROM assignments WHERE giver = ?", ((giver,) for giver in removed))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO assignments (giver, receiver, password, receivers) VALUES (?, ?, ?, ?)",
+                    self._rows(changed, passwords)
+                )
+        finally:
+            conn.close()
+
+    def lookup(self, name: str) -> Optional[Dict]:
+        """Return the giver's assignment record, or None if there is none."""
+        if not self.path.exists():
+            return None
+        conn = self._connect(readonly=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM assignments WHERE giver = ?", (name,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return _assignment(name, self._receiver(row), row["password"])
+
+    def read_master_list(self) -> Dict[str, Dict]:
+        conn = self._connect(readonly=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute("SELECT * FROM assignments").fetchall()
+        finally:
+            conn.close()
+        return {
+            "pairings": {row["giver"]: self._receiver(row) for row in rows},
+            "passwords": {row["giver"]: row["password"] for row in rows}
+        }
+
+    def assignments(self, after: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Yield assignment records in giver order, starting after ``after``.
+
+        Rows are read from the primary key as they are consumed, so even a
+        whole large event is never held in memory at once.
+        """
+        conn = self._connect(readonly=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(
+                "SELECT * FROM assignments WHERE giver > ? ORDER BY giver LIMIT ?",
+                ("" if after is None else after, -1 if limit is None else limit)
+            )
+            for row in cursor:
+                yield _assignment(row["giver"], self._receiver(row), row["password"])
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _receiver(row: sqlite3.Row) -> Union[str, List[str]]:
+        if "receivers" in row.keys() and row["receivers"] is not None:
+            return json.loads(row["receivers"])
+        return row["receiver"]
+
+
+BACKENDS = {
+    "json": DirectoryStore,
+    "sqlite": SQLiteStore,
+}
+
+
+def event_directory(event_id: str, root: Union[str, Path] = DEFAULT_ROOT) -> Path:
+    """Return the directory holding an event's store.
+
+    Events live in ``root/<shard>/<event_id>`` so a single directory never
+    holds every event. Events saved before sharding keep being read and
+    updated in ``root/<event_id>``.
+    """
+    root = Path(root)
+    legacy = root / event_id
+    if legacy.is_dir():
+        return legacy
+    return root / (event_id[:SHARD_WIDTH].lower() or "_") / event_id
+
+
+def event_directories(root: Union[str, Path] = DEFAULT_ROOT) -> List[Path]:
+    """Every event directory under ``root``, sharded or not."""
+    directories = []
+    for path in sorted(p for p in Path(root).iterdir() if p.is_dir()):
+        if len(path.name) <= SHARD_WIDTH:
+            directories.extend(sorted(p for p in path.iterdir() if p.is_dir()))
+        else:
+            directories.append(path)
+    return directories
+
+
+def open_store(base_dir: Union[str, Path], backend: Optional[str] = None):
+    """Return a store for writing an event with the given backend."""
+    if backend is None:
+        backend = DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return BACKENDS[backend](base_dir)
+
+
+def find_store(base_dir: Union[str, Path]):
+    """Return the store holding an existing event, or None.
+
+    SQLite files are preferred; directories written before the SQLite
+    backend existed are still read through DirectoryStore.
+    """
+    for backend in ("sqlite", "json"):
+        store = BACKENDS[backend](base_dir)
+        if store.exists():
+            return store
+    return None
+
+
+def migrate_directory(base_dir: Union[str, Path], remove_json: bool = False) -> bool:
+    """Copy a legacy JSON event directory into a SQLite store.
+
+    Returns False if there is no legacy event to migrate.
+    """
+    legacy = DirectoryStore(base_dir)
+    if not legacy.exists():
+        return False
+    master_list = legacy.read_master_list()
+    SQLiteStore(base_dir).write(master_list["pairings"], master_list["passwords"])
+    if remove_json:
+        for giver in master_list["pairings"]:
+            (legacy.base_dir / f"{giver}.json").unlink(missing_ok=True)
+        (legacy.base_dir / "master_list.json").unlink()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate JSON pairing directories to SQLite event stores.")
+    parser.add_argument("root", nargs="?", default=DEFAULT_ROOT,
+                        help="pairings directory containing one subdirectory per event")
+    parser.add_argument("--remove-json", action="store_true",
+                        help="delete the JSON files once an event is migrated")
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    candidates = [root] + event_directories(root)
+    migrated = 0
+    for event_dir in candidates:
+        if migrate_directory(event_dir, remove_json=args.remove_json):
+            print(f"Migrated {event_dir}")
+            migrated += 1
+    print(f"Migrated {migrated} event(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
 import pytest
 from pathlib import Path
+import gzip
+import io
+import re
 import json
-from app import app, event_santas
+import time
+from ingest import DEFAULT_MAX_BYTES
+import app as app_module
+from cache import LRUCache
+from app import app, event_santas, assignment_cache, job_store, recently_revealed, roster_cache
 
 @pytest.fixture
 def client():
@@ -9,6 +16,10 @@ def client():
     app.config['SECRET_KEY'] = 'test-secret-key-for-sessions'
     # Clear event_santas dictionary before each test
     event_santas.clear()
+    assignment_cache.clear()
+    roster_cache.clear()
+    recently_revealed.clear()
+    job_store.clear()
     with app.test_client() as client:
         # Enable session support in test client
         with client.session_transaction() as sess:
@@ -17,6 +28,24 @@ def client():
     # Clear after test as well
     event_santas.clear()
 
+def generate(client, **kwargs):
+    """POST /generate and wait for its job; returns the job's result response."""
+    response = client.post('/generate', **kwargs)
+    if response.status_code != 202:
+        return response
+    job_id = response.get_json()['job_id']
+    deadline = time.time() + 30
+    while client.get(f'/jobs/{job_id}').get_json()['status'] in ('queued', 'running'):
+        assert time.time() < deadline
+        time.sleep(0.01)
+    return client.get(f'/jobs/{job_id}/result')
+
+def exported_passwords(client):
+    """The event's passwords, read back through /export."""
+    response = client.get('/export')
+    assert response.status_code == 200
+    return {row['name']: row['password'] for row in map(json.loads, response.data.decode().splitlines())}
+
 @pytest.fixture
 def sample_participants_file(tmp_path):
     participants = {
@@ -95,16 +124,17 @@ def test_generate_pairings_success(client, sample_participants_file):
     assert upload_data['message'] == 'Participants loaded successfully'
     
     # Then generate pairings
-    response = client.post('/generate')
+    response = generate(client)
     assert response.status_code == 200
     data = json.loads(response.data)
     assert 'message' in data
-    assert 'passwords' in data
+    assert 'passwords' not in data  # Only a summary; passwords come from /export
     assert 'event_id' in data  # Verify event_id is returned
-    assert len(data['passwords']) == 4
+    assert data['participants'] == 4
+    assert len(exported_passwords(client)) == 4
 
 def test_generate_pairings_no_participants(client):
-    response = client.post('/generate')
+    response = generate(client)
     assert response.status_code == 400
     data = json.loads(response.data)
     assert 'error' in data
@@ -116,9 +146,8 @@ def test_check_assignment_success(client, sample_participants_file):
             'file': (f, 'participants.json')
         })
     
-    response = client.post('/generate')
-    data = json.loads(response.data)
-    password = data['passwords']['Alice']
+    generate(client)
+    password = exported_passwords(client)['Alice']
     
     # Then check assignment
     response = client.post('/check_assignment', json={
@@ -137,7 +166,7 @@ def test_check_assignment_invalid_password(client, sample_participants_file):
             'file': (f, 'participants.json')
         })
     
-    client.post('/generate')
+    generate(client)
     
     # Then check assignment with invalid password
     response = client.post('/check_assignment', json={
@@ -156,4 +185,439 @@ def test_check_assignment_missing_name(client):
     
     assert response.status_code == 400
     data = json.loads(response.data)
-    assert data['error'] == 'Name and password required' 
\ No newline at end of file
+    assert data['error'] == 'Name and password required' 
+
+def test_generate_pairings_matching_strategy(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={
+            'file': (f, 'participants.json')
+        })
+    
+    response = generate(client, json={'strategy': 'matching'})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['participants'] == 4
+
+def test_generate_pairings_unknown_strategy(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={
+            'file': (f, 'participants.json')
+        })
+    
+    response = generate(client, json={'strategy': 'bogus'})
+    assert response.status_code == 400
+
+def test_generate_pairings_with_history(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={
+            'file': (f, 'participants.json')
+        })
+    
+    first = json.loads(generate(client).data)
+    response = generate(client, json={'history': [first['event_id']]})
+    assert response.status_code == 200
+
+def test_generate_pairings_unknown_history(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={
+            'file': (f, 'participants.json')
+        })
+    
+    response = generate(client, json={'history': ['no-such-event']})
+    assert response.status_code == 400
+
+def test_check_assignment_cached_until_regenerate(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={
+            'file': (f, 'participants.json')
+        })
+    
+    generate(client)
+    password = exported_passwords(client)['Alice']
+    hits = assignment_cache.hits
+    for _ in range(2):
+        response = client.post('/check_assignment', json={
+            'name': 'Alice',
+            'password': password
+        })
+        assert response.status_code == 200
+    assert assignment_cache.hits == hits + 1
+    
+    # Regenerating drops the cached record so the new password applies
+    generate(client)
+    new_password = exported_passwords(client)['Alice']
+    response = client.post('/check_assignment', json={
+        'name': 'Alice',
+        'password': new_password
+    })
+    assert response.status_code == 200
+
+def test_check_assignment_sees_regenerate_by_another_worker(client, monkeypatch):
+    roster = {"participants": [{"name": f"P{i:02d}"} for i in range(20)]}
+    event_id = client.post('/upload', data={
+        'file': (io.BytesIO(json.dumps(roster).encode()), 'participants.json')
+    }).get_json()['event_id']
+    generate(client)
+    passwords = exported_passwords(client)
+
+    def reveal_all():
+        return {name: client.post('/check_assignment', json={'name': name, 'password': password}).get_json()['receiver']
+                for name, password in passwords.items()}
+
+    first = reveal_all()
+    # Another worker, with a cache of its own, regenerates the event
+    this_worker = app_module.assignment_cache
+    monkeypatch.setattr(app_module, 'assignment_cache', LRUCache())
+    generate(client)
+    monkeypatch.setattr(app_module, 'assignment_cache', this_worker)
+
+    stored = {name: app_module.load_assignment(event_id, name)['receiver'] for name in passwords}
+    assert stored != first
+    assert reveal_all() == stored
+
+def test_generate_sees_upload_from_another_worker(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={
+            'file': (f, 'participants.json')
+        })
+    
+    # Drop this process's decoded copy, as if /generate landed on another worker
+    event_santas._local.clear()
+    response = generate(client)
+    assert response.status_code == 200
+    assert json.loads(response.data)['participants'] == 4
+
+def test_upload_csv_file(client):
+    csv_roster = io.BytesIO(b"name,exclusions\nAlice,Bob\nBob,Alice\nCharlie,\nDiana,\n")
+    response = client.post('/upload', data={
+        'file': (csv_roster, 'participants.csv')
+    })
+    assert response.status_code == 200
+    
+    response = generate(client)
+    assert response.status_code == 200
+    assert json.loads(response.data)['participants'] == 4
+
+def test_upload_ndjson_body(client):
+    body = '{"name": "Alice"}\n{"name": "Bob"}\n'
+    response = client.post('/upload', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+
+def test_upload_reports_row_errors(client):
+    body = '{"name": "Alice", "exclusions": ["Zoe"]}\n{"name": "Bob"}\n'
+    response = client.post('/upload', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 400
+    data = json.loads(response.data)
+    assert data['errors'] == [{'row': 1, 'message': 'Alice has invalid exclusions: Zoe'}]
+
+def test_feasibility_reports_conflict(client):
+    body = '{"name": "Alice"}\n{"name": "Bob", "exclusions": ["Alice"]}\n{"name": "Charlie", "exclusions": ["Alice"]}\n'
+    client.post('/upload', data=body, content_type='application/x-ndjson')
+    data = json.loads(client.get('/feasibility').data)
+    assert data['feasible'] is False
+    assert data['participants'] == ['Alice']
+    assert data['receivers'] == []
+    assert data['error'] == 'Alice can only draw from nobody'
+    
+    body = '{"name": "Alice"}\n{"name": "Bob"}\n'
+    client.post('/upload', data=body, content_type='application/x-ndjson')
+    assert json.loads(client.get('/feasibility').data) == {'feasible': True}
+
+def test_feasibility_gives_up_after_time_limit(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'FEASIBILITY_TIME_LIMIT', 0)
+    body = '{"name": "Alice"}\n{"name": "Bob", "exclusions": ["Alice"]}\n{"name": "Charlie", "exclusions": ["Alice"]}\n'
+    client.post('/upload', data=body, content_type='application/x-ndjson')
+    assert json.loads(client.get('/feasibility').data) == {'feasible': None}
+
+def test_feasibility_needs_participants(client):
+    assert client.get('/feasibility').status_code == 400
+
+def test_repeat_upload_reuses_parsed_roster(client):
+    body = '{"name": "Alice", "exclusions": ["Bob"]}\n{"name": "Bob"}\n{"name": "Charlie"}\n{"name": "Diana"}\n'
+    hits, misses = roster_cache.hits, roster_cache.misses
+    client.post('/upload', data=body, content_type='application/x-ndjson')
+    event_id = json.loads(client.post('/upload', data={
+        'file': (io.BytesIO(body.encode()), 'roster.ndjson')
+    }).data)['event_id']
+    assert (roster_cache.hits - hits, roster_cache.misses - misses) == (1, 1)
+    
+    with client.session_transaction() as sess:
+        sess.clear()
+    other_event = json.loads(client.post('/upload', data=body, content_type='application/x-ndjson').data)['event_id']
+    assert roster_cache.hits - hits == 2
+    assert 'secret_santa_roster_cache_total{result="hit"}' in client.get('/metrics').data.decode()
+    first, second = event_santas.load(event_id), event_santas.load(other_event)
+    assert first.participants == second.participants
+    assert first.compile_model() is second.compile_model()
+    assert first.passwords != second.passwords
+    
+    response = generate(client)
+    assert response.status_code == 200
+
+def test_upload_too_large(client):
+    app.config['MAX_ROSTER_BYTES'] = 10
+    try:
+        response = client.post('/upload', data='{"name": "Alice"}\n', content_type='application/x-ndjson')
+    finally:
+        app.config['MAX_ROSTER_BYTES'] = DEFAULT_MAX_BYTES
+    assert response.status_code == 400
+    assert json.loads(response.data)['errors'] == [{'row': 0, 'message': 'Roster exceeds 10 bytes'}]
+
+def test_upload_unsupported_extension(client):
+    response = client.post('/upload', data={
+        'file': (io.BytesIO(b"Alice"), 'participants.txt')
+    })
+    assert response.status_code == 400
+
+def test_metrics_endpoint(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={
+            'file': (f, 'participants.json')
+        })
+    generate(client)
+    client.post('/check_assignment', json={'name': 'Alice', 'password': 'invalid'})
+    
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.data.decode()
+    assert 'secret_santa_request_duration_seconds_bucket{route="/generate",le="+Inf"}' in text
+    assert 'secret_santa_solver_runs_total{result="success",strategy="auto"}' in text
+    assert 'secret_santa_request_failures_total{error="unauthorized",route="/check_assignment"}' in text
+    assert 'secret_santa_events 1' in text
+    assert 'secret_santa_participants 4' in text
+
+def test_add_and_remove_participant_after_generate(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={
+            'file': (f, 'participants.json')
+        })
+    generate(client)
+    passwords = exported_passwords(client)
+    
+    response = client.post('/participants/add', json={'name': 'Eve', 'exclusions': ['Alice']})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert 'Eve' in data['changed']
+    
+    response = client.post('/check_assignment', json={'name': 'Eve', 'password': data['password']})
+    assert response.status_code == 200
+    assert json.loads(response.data)['receiver'] != 'Alice'
+    
+    response = client.post('/participants/remove', json={'name': 'Charlie'})
+    assert response.status_code == 200
+    response = client.post('/check_assignment', json={'name': 'Charlie', 'password': passwords['Charlie']})
+    assert response.status_code == 404
+    
+    # Everyone else keeps their password and no one draws Charlie
+    for name in ['Alice', 'Bob', 'Diana']:
+        response = client.post('/check_assignment', json={'name': name, 'password': passwords[name]})
+        assert response.status_code == 200
+        assert json.loads(response.data)['receiver'] != 'Charlie'
+
+def test_add_participant_before_generate(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={
+            'file': (f, 'participants.json')
+        })
+    response = client.post('/participants/add', json={'name': 'Eve'})
+    assert response.status_code == 400
+
+def test_index_page_is_cacheable(client):
+    response = client.get('/')
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert response.headers['Last-Modified']
+    etag = response.headers['ETag']
+    
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_static_asset_validators_and_compression(client):
+    response = client.get('/static/README.md', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert gzip.decompress(response.data) == Path('static/README.md').read_bytes()
+    
+    response = client.get('/static/README.md', headers={'If-None-Match': response.headers['ETag'], 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 304
+
+def test_versioned_static_asset_is_immutable(client):
+    index = client.get('/').data.decode()
+    version = re.search(r"/static/README\.md\?v=(\w+)", index).group(1)
+    response = client.get(f'/static/README.md?v={version}')
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert 'immutable' in response.headers['Cache-Control']
+
+def test_missing_static_asset(client):
+    assert client.get('/static/missing.js').status_code == 404
+
+def test_generate_multiple_gifts(client, tmp_path):
+    roster = {"participants": [{"name": f"P{i}"} for i in range(6)]}
+    client.post('/upload', data={'file': (io.BytesIO(json.dumps(roster).encode()), 'participants.json')})
+    
+    response = generate(client, json={'gifts': 2})
+    assert response.status_code == 200
+    password = exported_passwords(client)['P0']
+    
+    data = client.post('/check_assignment', json={'name': 'P0', 'password': password}).get_json()
+    assert len(set(data['receivers'])) == 2
+    assert 'P0' not in data['receivers']
+    assert data['receiver'] == data['receivers'][0]
+    
+    response = client.post('/participants/add', json={'name': 'Late'})
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("options", [{'gifts': 0}, {'gifts': 6}, {'gifts': '2'}, {'gifts': 2, 'strategy': 'cycle'}])
+def test_generate_invalid_gifts(client, sample_participants_file, options):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={'file': (f, 'participants.json')})
+    assert generate(client, json=options).status_code == 400
+
+def test_generate_returns_job(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={'file': (f, 'participants.json')})
+    
+    response = client.post('/generate', json={'time_limit': 1000})
+    assert response.status_code == 202
+    data = response.get_json()
+    job_id = data['job_id']
+    assert data['status'] == 'queued'
+    
+    status = client.get(f'/jobs/{job_id}').get_json()
+    assert status['status'] in ('queued', 'running', 'succeeded')
+    assert status['time_limit'] == app.config['JOB_TIME_LIMIT']
+    
+    # Jobs are private to the event's session
+    with app.test_client() as other:
+        assert other.get(f'/jobs/{job_id}').status_code == 404
+        assert other.get(f'/jobs/{job_id}/result').status_code == 404
+    assert client.get('/jobs/no-such-job').status_code == 404
+
+def test_cancel_finished_job(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={'file': (f, 'participants.json')})
+    job_id = client.post('/generate').get_json()['job_id']
+    while client.get(f'/jobs/{job_id}').get_json()['status'] in ('queued', 'running'):
+        time.sleep(0.01)
+    response = client.post(f'/jobs/{job_id}/cancel')
+    assert response.status_code == 409
+    assert response.get_json()['status'] == 'succeeded'
+
+def test_generate_invalid_time_limit(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={'file': (f, 'participants.json')})
+    assert client.post('/generate', json={'time_limit': 0}).status_code == 400
+
+def test_upload_with_ttl(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        response = client.post('/upload?ttl_days=1', data={'file': (f, 'participants.json')})
+    assert response.status_code == 200
+    event_id = response.get_json()['event_id']
+    assert event_santas.expired(time.time() + 2 * 24 * 3600) == [event_id]
+    for ttl_days in ('0', 'soon', '10000'):
+        with open(sample_participants_file, 'rb') as f:
+            response = client.post(f'/upload?ttl_days={ttl_days}', data={'file': (f, 'participants.json')})
+        assert response.status_code == 400
+
+def test_generation_and_reveals_keep_event_alive(client, sample_participants_file):
+    with open(sample_participants_file, 'rb') as f:
+        event_id = client.post('/upload?ttl_days=1', data={'file': (f, 'participants.json')}).get_json()['event_id']
+
+    def backdate():
+        conn = event_santas._connect()
+        with conn:
+            conn.execute("UPDATE events SET updated = ?", (time.time() - 2 * 24 * 3600,))
+        conn.close()
+        return event_santas.expired()
+
+    assert backdate() == [event_id]
+    generate(client)
+    assert event_santas.expired() == []
+
+    assert backdate() == [event_id]
+    password = exported_passwords(client)['Alice']
+    assert client.post('/check_assignment', json={'name': 'Alice', 'password': password}).status_code == 200
+    assert event_santas.expired() == []
+    # Further reveals within the hour skip the write
+    backdate()
+    client.post('/check_assignment', json={'name': 'Alice', 'password': password})
+    assert event_santas.expired() == [event_id]
+
+def test_export_pages_and_formats(client):
+    roster = {"participants": [{"name": f"P{i:02d}"} for i in range(25)]}
+    client.post('/upload', data={'file': (io.BytesIO(json.dumps(roster).encode()), 'participants.json')})
+    assert client.get('/export').status_code == 404
+    generate(client)
+    everyone = exported_passwords(client)
+    assert sorted(everyone) == [f"P{i:02d}" for i in range(25)]
+    
+    # Follow the cursors page by page
+    pages, url = [], '/export?limit=10'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append([json.loads(line)['name'] for line in response.data.decode().splitlines()])
+        url = re.match(r'<(.*)>; rel="next"', response.headers['Link']).group(1) if 'Link' in response.headers else None
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sum(pages, []) == sorted(everyone)
+    
+    response = client.get('/export?format=csv&limit=2')
+    assert response.mimetype == 'text/csv'
+    assert response.data.decode().splitlines() == ['name,password', f"P00,{everyone['P00']}", f"P01,{everyone['P01']}"]
+    assert 'X-Next-Cursor' in response.headers
+    
+    assert client.get('/export?format=xml').status_code == 400
+    assert client.get('/export?limit=0').status_code == 400
+    with app.test_client() as other:
+        assert other.get('/export').status_code == 404
+
+def test_reveal_tokens(client, sample_participants_file, monkeypatch):
+    monkeypatch.setitem(app.config, 'REVEAL_TOKEN_KEY', 'test-token-key')
+    assert client.post('/check_assignment', json={'token': 'garbage'}).status_code == 401
+    with open(sample_participants_file, 'rb') as f:
+        client.post('/upload', data={'file': (f, 'participants.json')})
+    generate(client)
+    rows = {row['name']: row for row in map(json.loads, client.get('/export').data.decode().splitlines())}
+    assert set(rows['Alice']) == {'name', 'password', 'token'}
+    
+    # Any client can reveal with the token alone, no session or password
+    with app.test_client() as other:
+        data = other.post('/check_assignment', json={'token': rows['Alice']['token']}).get_json()
+    expected = client.post('/check_assignment', json={'name': 'Alice', 'password': rows['Alice']['password']})
+    assert data == {'name': 'Alice', 'receiver': expected.get_json()['receiver']}
+    
+    response = client.post('/tokens/revoke', json={'names': ['Alice']})
+    assert response.status_code == 200
+    assert client.post('/check_assignment', json={'token': rows['Alice']['token']}).status_code == 401
+    assert client.post('/check_assignment', json={'token': rows['Bob']['token']}).status_code == 200
+    
+    # Regenerating revokes every earlier token; the new export works
+    generate(client)
+    assert client.post('/check_assignment', json={'token': rows['Bob']['token']}).get_json()['error'] == 'Token revoked'
+    fresh = {row['name']: row['token'] for row in map(json.loads, client.get('/export').data.decode().splitlines())}
+    assert client.post('/check_assignment', json={'token': fresh['Alice']}).status_code == 200
+
+def test_reveal_tokens_disabled(client):
+    assert client.post('/check_assignment', json={'token': 'anything'}).status_code == 400
+    assert client.post('/tokens/revoke').status_code == 400
+
+def test_profiles_need_token_even_when_profiling_everything(monkeypatch, tmp_path):
+    import profiling
+    monkeypatch.setattr(profiling, 'ENABLED', True)
+    monkeypatch.setattr(profiling, 'TOKEN', '')
+    monkeypatch.setattr(profiling, 'DEFAULT_DIRECTORY', str(tmp_path))
+    profile_id = profiling.Profile('run').start().stop()
+    # The routes are only registered when profiling is configured at import
+    for view in (app_module.get_profile, app_module.download_profile):
+        with app.test_request_context(f'/profiles/{profile_id}'):
+            assert view(profile_id)[1] == 404
+    
+    monkeypatch.setattr(profiling, 'TOKEN', 'profile-token')
+    with app.test_request_context(f'/profiles/{profile_id}', headers={'X-Profile': 'wrong'}):
+        assert app_module.get_profile(profile_id)[1] == 404
+    with app.test_request_context(f'/profiles/{profile_id}', headers={'X-Profile': 'profile-token'}):
+        assert app_module.get_profile(profile_id).status_code == 200
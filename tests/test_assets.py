@@ -0,0 +1,45 @@
+import gzip
+import os
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+from assets import AssetCache, compress, precompress_directory
+
+def accept(header):
+    return parse_accept_header(header, Accept)
+
+def test_loads_and_compresses_assets(tmp_path):
+    (tmp_path / "help.md").write_text("# Help\n" + "Secret Santa " * 100)
+    (tmp_path / "tiny.txt").write_text("hi")
+    cache = AssetCache(tmp_path)
+    assert len(cache) == 2
+    asset = cache.get("help.md")
+    assert asset.mimetype == "text/markdown; charset=utf-8"
+    assert gzip.decompress(asset.variants["gzip"]) == asset.body
+    # Too small to be worth compressing
+    assert cache.get("tiny.txt").variants == {}
+
+def test_select_prefers_accepted_encoding(tmp_path):
+    (tmp_path / "help.md").write_text("Secret Santa " * 100)
+    asset = AssetCache(tmp_path).get("help.md")
+    encoding, body = asset.select(accept("gzip, deflate"))
+    assert encoding == "gzip"
+    assert body == asset.variants["gzip"]
+    assert asset.select(accept("identity")) == (None, asset.body)
+    assert asset.etag("gzip") != asset.etag(None)
+
+def test_compression_is_deterministic():
+    body = b"Secret Santa " * 100
+    assert compress(body) == compress(body)
+
+def test_uses_precompressed_siblings(tmp_path):
+    path = tmp_path / "help.md"
+    path.write_text("Secret Santa " * 100)
+    assert precompress_directory(tmp_path) >= 1
+    marker = gzip.compress(b"prebuilt", mtime=0)
+    (tmp_path / "help.md.gz").write_bytes(marker)
+    cache = AssetCache(tmp_path)
+    assert cache.get("help.md.gz") is None
+    assert cache.get("help.md").variants["gzip"] == marker
+    # A sibling older than the asset is stale and ignored
+    os.utime(tmp_path / "help.md.gz", (0, 0))
+    assert AssetCache(tmp_path).get("help.md").variants["gzip"] != marker
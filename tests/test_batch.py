@@ -0,0 +1,96 @@
+import io
+import json
+import time
+import pytest
+import solvers
+from batch import collect_rosters, main, read_stdin_events, run_batch, solve_event
+from storage import find_store
+
+def write_roster(path, names, exclusions=None):
+    exclusions = exclusions or {}
+    participants = [{"name": name, "exclusions": exclusions.get(name, [])} for name in names]
+    path.write_text(json.dumps({"participants": participants}))
+    return path
+
+@pytest.fixture
+def rosters(tmp_path):
+    directory = tmp_path / "rosters"
+    directory.mkdir()
+    write_roster(directory / "sales.json", ["Alice", "Bob", "Charlie"])
+    # Bob must draw Alice and Alice must draw Bob, so Charlie is left over
+    write_roster(directory / "stuck.json", ["Alice", "Bob", "Charlie"],
+                 {"Charlie": ["Alice", "Bob"]})
+    (directory / "broken.csv").write_text("name\nAlice\nAlice\n")
+    (directory / "notes.txt").write_text("not a roster")
+    return directory
+
+def test_collect_rosters_from_directory_and_glob(rosters):
+    tasks = collect_rosters([str(rosters)])
+    assert [(event_id, fmt) for event_id, fmt, _, _ in tasks] == [
+        ("broken", "csv"), ("sales", "json"), ("stuck", "json")
+    ]
+    assert [task[0] for task in collect_rosters([str(rosters / "s*.json")])] == ["sales", "stuck"]
+
+def test_multi_dot_filenames_stay_separate_events(tmp_path):
+    for year in (2024, 2025):
+        write_roster(tmp_path / f"office.{year}.json", ["Alice", "Bob"])
+    (tmp_path / "office.2026.NDJSON").write_text('{"name": "Alice"}\n{"name": "Bob"}\n')
+    tasks = collect_rosters([str(tmp_path)])
+    assert [(event_id, fmt) for event_id, fmt, _, _ in tasks] == [
+        ("office.2024", "json"), ("office.2025", "json"), ("office.2026", "ndjson")
+    ]
+    results = run_batch(tasks, output=str(tmp_path / "out"))
+    assert [r["status"] for r in results] == ["ok", "ok", "ok"]
+    assert find_store(tmp_path / "out" / "office.2024") is not None
+
+def test_read_stdin_events():
+    stream = io.BytesIO(b'{"event_id": "team-a", "participants": []}\n\n{"participants": []}\n')
+    assert [task[0] for task in read_stdin_events(stream)] == ["team-a", "event-3"]
+
+def test_run_batch_reports_each_outcome(rosters, tmp_path):
+    output = tmp_path / "out"
+    results = run_batch(collect_rosters([str(rosters)]), output=str(output))
+    assert [(r["event_id"], r["status"]) for r in results] == [
+        ("broken", "invalid"), ("sales", "ok"), ("stuck", "infeasible")
+    ]
+    assert results[0]["errors"] == ["row 2: Duplicate participant: Alice"]
+    assert results[2]["errors"] == ["Error: No valid pairings exist for these exclusions"]
+    
+    master_list = find_store(output / "sales").read_master_list()
+    assert sorted(master_list["pairings"]) == ["Alice", "Bob", "Charlie"]
+    assert find_store(output / "stuck") is None
+
+def test_run_batch_in_process_pool(rosters, tmp_path):
+    tasks = collect_rosters([str(rosters / "sales.json")]) + list(read_stdin_events(io.BytesIO(
+        b'{"event_id": "team-b", "participants": [{"name": "A"}, {"name": "B"}]}\n'
+    )))
+    results = run_batch(tasks, workers=2, output=str(tmp_path / "out"))
+    assert [r["status"] for r in results] == ["ok", "ok"]
+    assert find_store(tmp_path / "out" / "team-b").lookup("A")["receiver"] == "B"
+
+def test_duplicate_and_unsafe_event_ids(tmp_path):
+    roster = b'{"event_id": "../escape", "participants": [{"name": "A"}, {"name": "B"}]}\n'
+    tasks = list(read_stdin_events(io.BytesIO(roster + roster)))
+    results = run_batch(tasks, output=str(tmp_path / "out"))
+    assert results[0]["status"] == "invalid"
+    assert results[1]["errors"] == ["Duplicate event id: ../escape"]
+    assert not (tmp_path / "escape").exists()
+
+def test_time_budget(monkeypatch, rosters, tmp_path):
+    def stall(model, stats=None):
+        time.sleep(5)
+    
+    monkeypatch.setitem(solvers.STRATEGIES, "auto", stall)
+    result = solve_event(collect_rosters([str(rosters / "sales.json")])[0],
+                         output=str(tmp_path), time_budget=0.05)
+    assert result["status"] == "timeout"
+    assert result["seconds"] < 1
+
+def test_main_writes_report(rosters, tmp_path, capsys):
+    report = tmp_path / "report.json"
+    code = main([str(rosters / "sales.json"), str(rosters / "stuck.json"),
+                 "--output", str(tmp_path / "out"), "--workers", "1", "--report", str(report)])
+    assert code == 1
+    summary = json.loads(report.read_text())
+    assert (summary["events"], summary["ok"], summary["infeasible"]) == (2, 1, 1)
+    assert "1 ok, 1 infeasible" in capsys.readouterr().out
@@ -0,0 +1,45 @@
+import time
+from cache import LRUCache
+
+def test_get_and_set():
+    cache = LRUCache(maxsize=2)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 1, 'evictions': 0}
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+def test_entries_expire():
+    cache = LRUCache(ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_invalidate_where():
+    cache = LRUCache()
+    cache.set(("event1", "Alice"), 1)
+    cache.set(("event1", "Bob"), 2)
+    cache.set(("event2", "Alice"), 3)
+    assert cache.invalidate_where(lambda key: key[0] == "event1") == 2
+    assert cache.get(("event2", "Alice")) == 3
+    cache.invalidate(("event2", "Alice"))
+    assert len(cache) == 0
+
+def test_on_evict_reports_evicted_keys():
+    evicted = []
+    cache = LRUCache(maxsize=1, on_evict=evicted.append)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("b")
+    assert evicted == ["a"]
@@ -0,0 +1,78 @@
+import pytest
+from constraints import ConstraintModel
+
+@pytest.fixture
+def participants():
+    return {
+        "Alice": {"Bob"},
+        "Bob": set(),
+        "Charlie": {"Alice"},
+        "Diana": set()
+    }
+
+def test_compile_interns_names(participants):
+    model = ConstraintModel.compile(participants)
+    assert len(model) == 4
+    assert model.names == ["Alice", "Bob", "Charlie", "Diana"]
+    assert model.index["Charlie"] == 2
+
+def test_exclusions_are_symmetric(participants):
+    model = ConstraintModel.compile(participants)
+    alice, bob, charlie, diana = range(4)
+    assert not model.allowed(alice, bob)
+    assert not model.allowed(bob, alice)
+    assert not model.allowed(alice, charlie)
+    assert not model.allowed(charlie, alice)
+    assert model.allowed(bob, charlie)
+    assert model.allowed(diana, alice)
+    assert model.exclusion_count() == 2
+
+def test_no_self_assignment(participants):
+    model = ConstraintModel.compile(participants)
+    for i in range(len(model)):
+        assert not model.allowed(i, i)
+
+def test_unconstrained_participants_share_empty_set():
+    model = ConstraintModel.compile({"A": set(), "B": set(), "C": set()})
+    assert model.blocked[0] is model.blocked[2]
+    assert model.exclusion_count() == 0
+
+def test_groups_exclude_members_from_each_other():
+    participants = {"A": set(), "B": set(), "C": set(), "D": set()}
+    model = ConstraintModel.compile(participants, {"A": {"Smiths"}, "B": {"Smiths", "Sales"}, "C": {"Sales"}})
+    a, b, c, d = range(4)
+    assert not model.allowed(a, b)
+    assert not model.allowed(b, a)
+    assert not model.allowed(b, c)
+    assert model.allowed(a, c)
+    assert model.allowed(d, a)
+    assert model.exclusion_count() == 2
+    # Groups are not expanded into pairwise exclusions
+    assert all(not blocked for blocked in model.blocked)
+
+def allowed_pairs(model):
+    return {(model.names[g], model.names[r]) for g in range(len(model)) for r in range(len(model)) if model.allowed(g, r)}
+
+def test_add_and_remove_match_compile(participants):
+    groups = {"Bob": {"Smiths"}, "Diana": {"Smiths"}}
+    model = ConstraintModel.compile(participants, groups)
+    model.remove("Alice")
+    model.add("Eve", ["Charlie"], ["Smiths", "Sales"])
+    model.add("Frank", [], ["Sales"])
+    model.remove("Bob")
+    
+    expected = ConstraintModel.compile({"Charlie": set(), "Diana": set(), "Eve": {"Charlie"}, "Frank": set()},
+                                       {"Diana": {"Smiths"}, "Eve": {"Smiths", "Sales"}, "Frank": {"Sales"}})
+    assert sorted(model.names) == sorted(expected.names)
+    assert all(model.names[model.index[name]] == name for name in model.names)
+    assert allowed_pairs(model) == allowed_pairs(expected)
+    assert model.exclusion_count() == expected.exclusion_count()
+
+def test_copy_is_independent(participants):
+    model = ConstraintModel.compile(participants)
+    clone = model.copy()
+    clone.remove("Alice")
+    clone.add("Eve", ["Bob"])
+    assert model.names == ["Alice", "Bob", "Charlie", "Diana"]
+    assert not model.allowed(0, 1)
+    assert model.blocked[1] == {0}
@@ -0,0 +1,90 @@
+import time
+import pytest
+from event_state import EventStateStore
+from secret_santa import SecretSanta
+
+@pytest.fixture
+def santa():
+    santa = SecretSanta()
+    santa.add_participant("Alice", ["Bob"])
+    santa.add_participant("Bob")
+    santa.add_participant("Charlie")
+    return santa
+
+def test_save_and_load_across_stores(tmp_path, santa):
+    path = tmp_path / "events.db"
+    EventStateStore(path).save("event1", santa)
+    
+    # A second store stands in for another worker
+    loaded = EventStateStore(path).load("event1")
+    assert loaded.participants == santa.participants
+    assert loaded.passwords == santa.passwords
+
+def test_load_unknown_event(tmp_path):
+    assert EventStateStore(tmp_path / "events.db").load("missing") is None
+
+def test_load_reuses_decoded_roster_until_changed(tmp_path, santa):
+    path = tmp_path / "events.db"
+    worker1 = EventStateStore(path)
+    worker2 = EventStateStore(path)
+    worker1.save("event1", santa)
+    first = worker2.load("event1")
+    assert worker2.load("event1") is first
+    
+    santa.add_participant("Diana")
+    worker1.save("event1", santa)
+    assert "Diana" in worker2.load("event1").participants
+
+def test_delete_and_clear(tmp_path, santa):
+    store = EventStateStore(tmp_path / "events.db")
+    store.save("event1", santa)
+    store.save("event2", santa)
+    assert "event1" in store
+    assert len(store) == 2
+    store.delete("event1")
+    assert store.load("event1") is None
+    store.clear()
+    assert len(store) == 0
+
+def test_roundtrip_state(santa):
+    assert SecretSanta.from_state(santa.to_state()).participants == santa.participants
+
+def test_events_expire_after_ttl(tmp_path, santa, monkeypatch):
+    store = EventStateStore(tmp_path / "events.db", ttl=60)
+    store.save("default", santa)
+    store.save("short", santa, ttl=10)
+    store.save("forever", santa, ttl=0)
+    now = time.time()
+    assert store.expired(now) == []
+    assert store.expired(now + 30) == ["short"]
+    assert sorted(store.expired(now + 90)) == ["default", "short"]
+    
+    # Saving again restarts the clock and keeps the event's own TTL
+    store.save("short", santa)
+    assert store.expired(time.time() + 30) == ["short"]
+    # Touching restarts the clock too, leaving the roster alone
+    monkeypatch.setattr(time, "time", lambda: now + 50)
+    assert store.touch("default")
+    monkeypatch.undo()
+    assert store.expired(now + 90) == ["short"]
+    assert store.delete("short")
+    assert not store.delete("short")
+    assert not store.touch("short")
+
+def test_loaded_rosters_are_bounded(tmp_path, santa):
+    evicted = []
+    store = EventStateStore(tmp_path / "events.db", max_loaded=1, on_evict=evicted.append)
+    store.save("event1", santa)
+    store.save("event2", santa)
+    assert evicted == ["event1"]
+    # Evicted rosters are decoded again from the shared store
+    assert store.load("event1").participants == santa.participants
+
+def test_revocations(tmp_path):
+    store = EventStateStore(tmp_path / "events.db")
+    store.revoke("event1")
+    store.revoke("event2", ["Alice", "Bob"])
+    revocations = store.revocations()
+    assert sorted(revocations) == [("event1", ""), ("event2", "Alice"), ("event2", "Bob")]
+    assert store.prune_revocations(time.time() + 1) == 3
+    assert store.revocations() == {}
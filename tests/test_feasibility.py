@@ -0,0 +1,24 @@
+import json
+from feasibility import main
+
+def write_roster(path, participants):
+    path.write_text(json.dumps({"participants": participants}))
+    return str(path)
+
+def test_feasible_roster(tmp_path, capsys):
+    roster = write_roster(tmp_path / "roster.json", [{"name": "Alice"}, {"name": "Bob"}])
+    assert main([roster]) == 0
+    assert "Feasible" in capsys.readouterr().out
+
+def test_infeasible_roster_names_conflict(tmp_path, capsys):
+    roster = write_roster(tmp_path / "roster.json", [
+        {"name": "Alice", "exclusions": ["Charlie"]},
+        {"name": "Bob", "exclusions": ["Charlie"]},
+        {"name": "Charlie"},
+    ])
+    assert main([roster, "--json"]) == 1
+    assert json.loads(capsys.readouterr().out) == {"feasible": False, "participants": ["Charlie"], "receivers": []}
+
+def test_invalid_roster(tmp_path):
+    roster = write_roster(tmp_path / "roster.json", [{"name": "Alice", "exclusions": ["Zoe"]}])
+    assert main([roster]) == 2
@@ -0,0 +1,74 @@
+import pytest
+import json
+from constraints import ConstraintModel
+from history import load_master_list, pair_costs
+from secret_santa import SecretSanta
+
+@pytest.fixture
+def model():
+    return ConstraintModel.compile({
+        "Alice": set(),
+        "Bob": set(),
+        "Charlie": set()
+    })
+
+def test_load_master_list(tmp_path):
+    master = tmp_path / "master_list.json"
+    with open(master, 'w') as f:
+        json.dump({"pairings": {"Alice": "Bob"}, "passwords": {}}, f)
+    assert load_master_list(str(master)) == {"Alice": "Bob"}
+
+def test_load_master_list_missing_pairings(tmp_path):
+    master = tmp_path / "master_list.json"
+    with open(master, 'w') as f:
+        json.dump({"passwords": {}}, f)
+    with pytest.raises(ValueError):
+        load_master_list(str(master))
+
+def test_pair_costs_by_recency(model):
+    history = [
+        {"Alice": "Bob", "Bob": "Charlie"},
+        {"Alice": "Bob", "Charlie": "Alice"},
+        {"Bob": "Alice"},
+        {"Charlie": "Bob"}
+    ]
+    costs = pair_costs(model, history)
+    assert costs == {(0, 1): 110, (1, 2): 100, (2, 0): 10, (1, 0): 1}
+
+def test_pair_costs_skips_departed_participants(model):
+    assert pair_costs(model, [{"Alice": "Zoe", "Zoe": "Bob"}]) == {}
+
+def test_weighted_avoids_last_year(tmp_path):
+    santa = SecretSanta()
+    names = [f"P{i}" for i in range(30)]
+    for name in names:
+        santa.add_participant(name)
+    last_year = {name: names[(i + 1) % 30] for i, name in enumerate(names)}
+    master = tmp_path / "master_list.json"
+    with open(master, 'w') as f:
+        json.dump({"pairings": last_year}, f)
+    
+    assert santa.load_history([str(master)]) is True
+    pairings = santa.generate_pairings(strategy="weighted")
+    assert pairings is not None
+    assert all(pairings[giver] != receiver for giver, receiver in last_year.items())
+
+def test_weighted_falls_back_to_cheapest_repeat():
+    santa = SecretSanta()
+    for name in ["Alice", "Bob", "Charlie"]:
+        santa.add_participant(name)
+    # Only two 3-cycles exist; both repeat something, the second repeats less recently
+    santa.history = [
+        {"Alice": "Bob", "Bob": "Charlie", "Charlie": "Alice"},
+        {"Alice": "Charlie"}
+    ]
+    assert santa.generate_pairings(strategy="weighted") == {
+        "Alice": "Charlie", "Charlie": "Bob", "Bob": "Alice"
+    }
+
+def test_load_history_missing_file(tmp_path):
+    santa = SecretSanta()
+    assert santa.load_history([str(tmp_path / "missing.json")]) is False
+
+def test_pair_costs_multi_gift(model):
+    assert pair_costs(model, [{"Alice": ["Bob", "Charlie"]}]) == {(0, 1): 100, (0, 2): 100}
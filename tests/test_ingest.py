@@ -0,0 +1,143 @@
+import io
+import json
+import hashlib
+import tempfile
+import pytest
+from ingest import RosterTooLarge, format_for_filename, parse_roster, roster_digest
+
+def stream(text):
+    return io.BytesIO(text.encode())
+
+def test_format_for_filename():
+    assert format_for_filename("roster.json") == "json"
+    assert format_for_filename("ROSTER.CSV") == "csv"
+    assert format_for_filename("roster.jsonl") == "ndjson"
+    assert format_for_filename("roster.txt") is None
+
+def test_parse_json():
+    data = {"participants": [{"name": "Alice", "exclusions": ["Bob"]}, {"name": "Bob"}]}
+    participants, errors = parse_roster(stream(json.dumps(data)), "json")
+    assert errors == []
+    assert participants == [("Alice", ["Bob"], []), ("Bob", [], [])]
+
+def test_parse_ndjson():
+    text = '{"name": "Alice", "exclusions": ["Bob"]}\n\n{"name": "Bob"}\n'
+    participants, errors = parse_roster(stream(text), "ndjson")
+    assert errors == []
+    assert participants == [("Alice", ["Bob"], []), ("Bob", [], [])]
+
+def test_parse_csv():
+    text = 'name,exclusions\r\nAlice,Bob;Charlie\r\nBob,\r\n"Charlie",Alice\r\n'
+    participants, errors = parse_roster(stream(text), "csv")
+    assert errors == []
+    assert participants == [("Alice", ["Bob", "Charlie"], []), ("Bob", [], []), ("Charlie", ["Alice"], [])]
+
+def test_csv_requires_name_column():
+    participants, errors = parse_roster(stream("person\nAlice\n"), "csv")
+    assert participants == []
+    assert errors[0]["row"] == 0
+
+def test_per_row_errors():
+    text = '{"name": "Alice"}\nnot json\n{"exclusions": []}\n{"name": "Alice"}\n'
+    participants, errors = parse_roster(stream(text), "ndjson")
+    assert participants == []
+    assert [error["row"] for error in errors] == [2, 3, 4]
+    assert "Duplicate" in errors[2]["message"]
+
+def test_unknown_exclusions_reported_by_row():
+    text = '{"name": "Alice", "exclusions": ["Zoe"]}\n{"name": "Bob"}\n'
+    participants, errors = parse_roster(stream(text), "ndjson")
+    assert participants == []
+    assert errors == [{"row": 1, "message": "Alice has invalid exclusions: Zoe"}]
+
+def test_invalid_json_document():
+    participants, errors = parse_roster(stream("invalid json"), "json")
+    assert participants == []
+    assert errors[0]["row"] == 0
+
+def test_byte_limit():
+    text = "".join(f'{{"name": "P{i}"}}\n' for i in range(10000))
+    participants, errors = parse_roster(stream(text), "ndjson", max_bytes=1000)
+    assert participants == []
+    assert "bytes" in errors[-1]["message"]
+
+def test_participant_limit():
+    text = "".join(f'{{"name": "P{i}"}}\n' for i in range(10))
+    participants, errors = parse_roster(stream(text), "ndjson", max_participants=5)
+    assert participants == []
+    assert "participants" in errors[-1]["message"]
+
+def test_stops_after_max_errors():
+    text = "not json\n" * 1000
+    participants, errors = parse_roster(stream(text), "ndjson", max_errors=10)
+    assert len(errors) == 10
+
+def test_parse_participant_groups():
+    text = '{"name": "Alice", "groups": ["Smiths"]}\n{"name": "Bob", "groups": ["Smiths", "Sales"]}\n'
+    participants, errors = parse_roster(stream(text), "ndjson")
+    assert errors == []
+    assert participants == [("Alice", [], ["Smiths"]), ("Bob", [], ["Smiths", "Sales"])]
+
+def test_parse_top_level_groups():
+    data = {
+        "participants": [{"name": "Alice"}, {"name": "Bob", "groups": ["Sales"]}],
+        "groups": {"Smiths": ["Alice", "Bob"]}
+    }
+    participants, errors = parse_roster(stream(json.dumps(data)), "json")
+    assert errors == []
+    assert participants == [("Alice", [], ["Smiths"]), ("Bob", [], ["Sales", "Smiths"])]
+
+def test_top_level_group_with_unknown_member():
+    data = {"participants": [{"name": "Alice"}], "groups": {"Smiths": ["Alice", "Zoe"]}}
+    participants, errors = parse_roster(stream(json.dumps(data)), "json")
+    assert participants == []
+    assert errors == [{"row": 0, "message": "Group Smiths has unknown members: Zoe"}]
+
+def test_parse_csv_groups():
+    text = 'name,exclusions,groups\nAlice,,Smiths\nBob,,Smiths;Sales\n'
+    participants, errors = parse_roster(stream(text), "csv")
+    assert errors == []
+    assert participants == [("Alice", [], ["Smiths"]), ("Bob", [], ["Smiths", "Sales"])]
+
+class _Unseekable(io.RawIOBase):
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readinto(self, buffer):
+        return self.data.readinto(buffer)
+
+    def readable(self):
+        return True
+
+class _BodyLike:
+    """Only read(), like gunicorn's request body."""
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self.data.read(size)
+
+def test_roster_digest_rewinds_for_parsing():
+    data = b'{"name": "Alice"}\n{"name": "Bob"}\n'
+    spooled = tempfile.SpooledTemporaryFile(max_size=8)
+    spooled.write(data)
+    spooled.seek(0)
+    for source in (io.BytesIO(data), spooled):
+        digest = roster_digest(source)
+        assert digest == hashlib.sha256(data).hexdigest()
+        participants, errors = parse_roster(source, "ndjson")
+        assert [name for name, _, _ in participants] == ["Alice", "Bob"]
+
+def test_roster_digest_leaves_unseekable_streams_to_the_parser():
+    data = b'{"name": "Alice"}\n{"name": "Bob"}\n'
+    for source in (_Unseekable(data), _BodyLike(data)):
+        assert roster_digest(source) is None
+        digest = hashlib.sha256()
+        participants, errors = parse_roster(source, "ndjson", digest=digest)
+        assert [name for name, _, _ in participants] == ["Alice", "Bob"]
+        assert digest.hexdigest() == hashlib.sha256(data).hexdigest()
+
+def test_roster_digest_enforces_limit():
+    with pytest.raises(RosterTooLarge):
+        roster_digest(io.BytesIO(b"x" * 100), max_bytes=10)
@@ -0,0 +1,115 @@
+import time
+import pytest
+import jobs
+from jobs import JobRunner, JobStore, run_generation
+from profiling import profile_path
+from secret_santa import SecretSanta
+from storage import find_store
+
+def stall(payload, conn, store_path, job_id):
+    time.sleep(30)
+
+def stall_profiled(payload, conn, store_path, job_id):
+    SecretSanta.generate_pairings = lambda *args, **kwargs: time.sleep(30)
+    run_generation(payload, conn, store_path, job_id)
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(tmp_path / "jobs.db")
+
+def wait_for(store, job_id, timeout=20):
+    deadline = time.time() + timeout
+    while store.get(job_id)["status"] in ("queued", "running"):
+        assert time.time() < deadline
+        time.sleep(0.02)
+    return store.get(job_id)
+
+def payload(tmp_path, names=("Alice", "Bob", "Charlie")):
+    santa = SecretSanta()
+    for name in names:
+        santa.add_participant(name)
+    return {"event_id": "event", "roster": santa.to_state(), "strategy": "auto",
+            "base_dir": str(tmp_path / "event")}
+
+def test_job_succeeds(store, tmp_path):
+    finished = []
+    runner = JobRunner(store, on_finish=lambda *args: finished.append(args))
+    job_id = store.create("event", 10)
+    assert runner.submit(job_id, payload(tmp_path), 10)
+
+    job = wait_for(store, job_id)
+    assert job["status"] == "succeeded"
+    assert job["phase"] == "done"
+    assert job["result"]["participants"] == 3
+    assert find_store(tmp_path / "event").lookup("Alice") is not None
+    deadline = time.time() + 5
+    while not finished:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    assert finished[0][2]["success"]
+
+def test_infeasible_job_fails(store, tmp_path):
+    runner = JobRunner(store)
+    data = payload(tmp_path)
+    data["roster"]["participants"] = [["Alice", ["Bob"]], ["Bob", []]]
+    job_id = store.create("event", 10)
+    runner.submit(job_id, data, 10)
+    job = wait_for(store, job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "Error: No valid pairings exist for these exclusions"
+
+def test_job_time_limit(store, tmp_path):
+    runner = JobRunner(store, target=stall)
+    job_id = store.create("event", 0.5)
+    runner.submit(job_id, payload(tmp_path), 0.5)
+    job = wait_for(store, job_id)
+    assert job["status"] == "timed_out"
+    assert job["finished"] - job["started"] < 5
+
+def test_cancel_running_and_queued_jobs(store, tmp_path):
+    runner = JobRunner(store, workers=1, target=stall)
+    running = store.create("event", 30)
+    queued = store.create("event", 30)
+    runner.submit(running, payload(tmp_path), 30)
+    runner.submit(queued, payload(tmp_path), 30)
+
+    assert store.request_cancel(queued)
+    assert store.get(queued)["status"] == "cancelled"
+    while store.get(running)["status"] == "queued":
+        time.sleep(0.01)
+    assert store.request_cancel(running)
+    assert wait_for(store, running)["status"] == "cancelled"
+    assert not store.request_cancel(running)
+
+def test_queue_limit(store, tmp_path):
+    runner = JobRunner(store, workers=1, max_queued=1, target=stall)
+    jobs_ids = [store.create("event", 30) for _ in range(3)]
+    accepted = [runner.submit(job_id, payload(tmp_path), 30) for job_id in jobs_ids]
+    # The first may already be running, leaving room for the second
+    assert accepted[-1] is False
+    for job_id in jobs_ids:
+        store.request_cancel(job_id)
+
+def test_stale_job_is_lost(store, monkeypatch):
+    job_id = store.create("event", 10)
+    monkeypatch.setattr(jobs, "STALE_AFTER", -1)
+    job = store.get(job_id)
+    assert job["status"] == "lost"
+    assert store.get(job_id)["error"] == "The worker running this job stopped"
+
+def test_profiled_job_keeps_profile_on_timeout(store, tmp_path):
+    runner = JobRunner(store)
+    data = payload(tmp_path)
+    data["profile"] = True
+    job_id = store.create("event", 10)
+    runner.submit(job_id, data, 10)
+    job = wait_for(store, job_id)
+    assert job["status"] == "succeeded"
+    assert profile_path(job["profile_id"], ".prof") is not None
+
+    runner = JobRunner(store, target=stall_profiled)
+    job_id = store.create("event", 0.5)
+    runner.submit(job_id, data, 0.5)
+    job = wait_for(store, job_id)
+    assert job["status"] == "timed_out"
+    assert profile_path(job["profile_id"], ".json") is not None
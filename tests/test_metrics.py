@@ -0,0 +1,48 @@
+import multiprocessing
+import pytest
+from metrics import Registry
+
+@pytest.fixture
+def registry(tmp_path):
+    return Registry(tmp_path, flush_interval=0)
+
+def test_counter(registry):
+    registry.inc('secret_santa_requests_total', {'route': '/', 'status': 200})
+    registry.inc('secret_santa_requests_total', {'route': '/', 'status': 200})
+    text = registry.render()
+    assert '# TYPE secret_santa_requests_total counter' in text
+    assert 'secret_santa_requests_total{route="/",status="200"} 2' in text
+
+def test_histogram(registry):
+    registry.observe('secret_santa_request_duration_seconds', 0.003, {'route': '/'})
+    registry.observe('secret_santa_request_duration_seconds', 0.2, {'route': '/'})
+    text = registry.render()
+    assert 'secret_santa_request_duration_seconds_bucket{route="/",le="0.001"} 0' in text
+    assert 'secret_santa_request_duration_seconds_bucket{route="/",le="0.005"} 1' in text
+    assert 'secret_santa_request_duration_seconds_bucket{route="/",le="+Inf"} 2' in text
+    assert 'secret_santa_request_duration_seconds_count{route="/"} 2' in text
+    assert 'secret_santa_request_duration_seconds_sum{route="/"} 0.203' in text
+
+def test_gauges(registry):
+    text = registry.render({'secret_santa_events': 3})
+    assert 'secret_santa_events 3' in text
+
+def _worker(directory):
+    Registry(directory, flush_interval=0).inc(
+        'secret_santa_solver_runs_total', {'strategy': 'shuffle', 'result': 'success'}, 2)
+
+def test_aggregates_across_workers(registry, tmp_path):
+    registry.inc('secret_santa_solver_runs_total', {'strategy': 'shuffle', 'result': 'success'})
+    process = multiprocessing.Process(target=_worker, args=(tmp_path,))
+    process.start()
+    process.join()
+    assert 'secret_santa_solver_runs_total{result="success",strategy="shuffle"} 3' in registry.render()
+
+def test_label_values_are_escaped(registry):
+    registry.inc('secret_santa_requests_total', {'route': 'a"b'})
+    assert 'route="a\\"b"' in registry.render()
+
+def test_reset_directory(registry, tmp_path):
+    registry.inc('secret_santa_requests_total')
+    registry.reset_directory()
+    assert list(tmp_path.glob('*.json')) == []
@@ -0,0 +1,102 @@
+import json
+import pstats
+import threading
+import pytest
+import profiling
+import solvers
+from constraints import ConstraintModel
+from profiling import Profile, authorized, profile_path, requested
+from secret_santa import SecretSanta
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "DEFAULT_DIRECTORY", str(tmp_path / "profiles"))
+    return tmp_path / "profiles"
+
+def test_profile_records_stats_and_solver_trace(profile_dir):
+    # B and C may only draw each other, so most shuffles hit a dead end
+    model = ConstraintModel.compile({"A": {"B", "C"}, "B": set(), "C": set(), "D": set()})
+    with Profile("shuffle") as profile:
+        solvers.shuffle_pairings(model, max_attempts=50)
+    assert solvers._trace is None
+    
+    report = json.loads(profile_path(profile.id, ".json").read_text())
+    assert report["name"] == "shuffle"
+    assert "shuffle_pairings" in report["summary"]
+    assert all(event["event"] == "dead_end" and event["giver"] in "ABCD" for event in report["events"])
+    pstats.Stats(str(profile_path(profile.id, ".prof")))
+
+def test_infeasible_matching_names_giver(profile_dir):
+    model = ConstraintModel.compile({"A": {"B", "C"}, "B": set(), "C": set()})
+    with Profile("matching") as profile:
+        assert solvers.matching_pairings(model) is None
+    assert profile.events[-1]["event"] == "infeasible"
+    assert profile.events[-1]["giver"] in ("A", "B", "C")
+
+def test_trace_events_are_capped(monkeypatch):
+    monkeypatch.setattr(profiling, "MAX_EVENTS", 2)
+    with Profile("capped") as profile:
+        for _ in range(5):
+            profile.event("tick")
+    assert len(profile.events) == 2
+    assert profile.dropped == 3
+
+def test_trace_hook_is_per_thread(profile_dir):
+    model = ConstraintModel.compile({"A": {"B", "C"}, "B": set(), "C": set()})
+    started, resume = threading.Event(), threading.Event()
+    profiles = []
+
+    def profiled_run():
+        with Profile("thread") as profile:
+            profiles.append(profile)
+            started.set()
+            resume.wait(5)
+            solvers.matching_pairings(model)
+
+    thread = threading.Thread(target=profiled_run)
+    thread.start()
+    started.wait(5)
+    # Neither an unprofiled run nor another profile's stop touches the thread's hook
+    solvers.matching_pairings(model)
+    with Profile("main") as main:
+        solvers.matching_pairings(model)
+    resume.set()
+    thread.join(5)
+
+    assert [event["event"] for event in main.events] == ["infeasible"]
+    assert [event["event"] for event in profiles[0].events] == ["infeasible"]
+    assert solvers._trace is None
+
+def test_old_profiles_are_pruned(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "MAX_PROFILES", 2)
+    for i in range(4):
+        Profile(f"run{i}").start().stop()
+    assert len(list(profile_dir.glob("*.json"))) == 2
+    assert len(list(profile_dir.glob("*.prof"))) == 2
+
+def test_secret_santa_run_profile(profile_dir):
+    santa = SecretSanta()
+    for name in ["Alice", "Bob", "Charlie"]:
+        santa.add_participant(name)
+    assert santa.generate_pairings() is not None
+    assert "profile_id" not in santa.last_stats
+    
+    santa.profile = True
+    assert santa.generate_pairings() is not None
+    report = json.loads(profile_path(santa.last_stats["profile_id"], ".json").read_text())
+    assert report["events"][-1]["event"] == "result"
+    assert report["events"][-1]["success"] is True
+
+def test_requested(monkeypatch):
+    assert not requested("anything")
+    monkeypatch.setattr(profiling, "TOKEN", "secret")
+    assert requested("secret")
+    assert not requested("wrong")
+    assert not requested(None)
+    monkeypatch.setattr(profiling, "ENABLED", True)
+    assert requested(None)
+    assert not authorized(None)
+    assert authorized("secret")
+
+def test_profile_path_rejects_traversal():
+    assert profile_path("../jobs", ".json") is None
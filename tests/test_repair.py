@@ -0,0 +1,110 @@
+import pytest
+from constraints import ConstraintModel
+from secret_santa import SecretSanta
+from solvers import repair_pairings
+
+def assert_valid(santa, pairings):
+    assert sorted(pairings) == sorted(pairings.values()) == sorted(santa.participants)
+    for giver, receiver in pairings.items():
+        assert giver != receiver
+        assert receiver not in santa.participants[giver]
+        assert giver not in santa.participants[receiver]
+
+@pytest.fixture
+def santa():
+    santa = SecretSanta()
+    for i in range(20):
+        santa.add_participant(f"P{i}")
+    return santa
+
+def test_repair_keeps_valid_pairs():
+    model = ConstraintModel.compile({"A": set(), "B": set(), "C": set()})
+    assert repair_pairings(model, {"A": "B", "B": "C", "C": "A"}) == {}
+
+def test_remove_splices_around_participant(santa):
+    pairings = {f"P{i}": f"P{(i + 1) % 20}" for i in range(20)}
+    changed = santa.remove_participant("P5", pairings)
+    assert changed == {"P4": "P6"}
+    assert "P5" not in santa.participants
+    assert "P5" not in santa.passwords
+    assert_valid(santa, pairings)
+
+def test_remove_respects_exclusions(santa):
+    santa.add_participant("P4", ["P6"])
+    pairings = {f"P{i}": f"P{(i + 1) % 20}" for i in range(20)}
+    changed = santa.remove_participant("P5", pairings)
+    assert "P4" in changed
+    assert len(changed) <= 3
+    assert_valid(santa, pairings)
+
+def test_remove_drops_exclusions_of_removed(santa):
+    santa.add_participant("P1", ["P5"])
+    pairings = santa.generate_pairings(strategy="matching")
+    assert santa.remove_participant("P5", pairings) is not None
+    assert santa.participants["P1"] == set()
+    assert_valid(santa, pairings)
+
+def test_add_late_participant(santa):
+    pairings = {f"P{i}": f"P{(i + 1) % 20}" for i in range(20)}
+    passwords = dict(santa.passwords)
+    changed = santa.add_late_participant("New", ["P0"], pairings)
+    assert "New" in changed
+    assert len(changed) == 2
+    assert "New" in santa.passwords
+    assert all(santa.passwords[name] == password for name, password in passwords.items())
+    assert_valid(santa, pairings)
+
+def test_add_late_participant_impossible():
+    santa = SecretSanta()
+    santa.add_participant("A")
+    santa.add_participant("B")
+    pairings = {"A": "B", "B": "A"}
+    assert santa.add_late_participant("C", ["A", "B"], pairings) is None
+    assert "C" not in santa.participants
+    assert pairings == {"A": "B", "B": "A"}
+
+def test_add_existing_participant(santa):
+    assert santa.add_late_participant("P1", [], {}) is None
+
+def test_remove_unknown_participant(santa):
+    assert santa.remove_participant("Nobody", {}) is None
+
+def test_save_changes_rewrites_only_changed(santa, tmp_path):
+    pairings = {f"P{i}": f"P{(i + 1) % 20}" for i in range(20)}
+    base_dir = str(tmp_path / "event")
+    santa.save_pairings(pairings, base_dir=base_dir)
+    changed = santa.remove_participant("P5", pairings)
+    santa.save_changes(changed, removed=["P5"], base_dir=base_dir)
+    
+    from storage import find_store
+    master = find_store(base_dir).read_master_list()
+    assert master["pairings"] == pairings
+    assert master["passwords"] == santa.passwords
+
+def test_late_changes_edit_model_in_place(santa):
+    pairings = {f"P{i}": f"P{(i + 1) % 20}" for i in range(20)}
+    model = santa.compile_model()
+    assert santa.add_late_participant("New", ["P3"], pairings, groups=["Sales"]) is not None
+    assert santa.remove_participant("P7", pairings) is not None
+    assert santa.compile_model() is model
+    
+    expected = ConstraintModel.compile(santa.participants, santa.groups)
+    assert sorted(model.names) == sorted(expected.names)
+    assert not model.allowed(model.index["New"], model.index["P3"])
+    assert_valid(santa, pairings)
+
+def test_late_changes_copy_shared_model():
+    first = SecretSanta()
+    first.load_participants([(f"P{i}", [], []) for i in range(10)])
+    shared = first.shared_model()
+    second = SecretSanta()
+    second.load_participants([(f"P{i}", [], []) for i in range(10)], shared)
+    pairings = {f"P{i}": f"P{(i + 1) % 10}" for i in range(10)}
+    
+    assert second.add_late_participant("New", [], pairings) is not None
+    assert second.compile_model() is not shared
+    assert "New" not in shared.index
+    first_pairings = {f"P{i}": f"P{(i + 1) % 10}" for i in range(10)}
+    assert first.remove_participant("P1", first_pairings) is not None
+    assert first.compile_model() is not shared
+    assert len(shared) == 10
@@ -0,0 +1,47 @@
+import tarfile
+import time
+import pytest
+from event_state import EventStateStore
+from jobs import JobStore
+from retention import Sweeper
+from secret_santa import SecretSanta
+from storage import event_directory, find_store
+
+@pytest.fixture
+def state(tmp_path):
+    return EventStateStore(tmp_path / "events.db", ttl=60)
+
+def save_event(state, root, event_id, **kwargs):
+    santa = SecretSanta()
+    santa.add_participant("Alice")
+    santa.add_participant("Bob")
+    state.save(event_id, santa, **kwargs)
+    santa.save_pairings(santa.generate_pairings(), base_dir=event_directory(event_id, root))
+
+def test_sweep_removes_expired_events(tmp_path, state):
+    root = tmp_path / "pairings"
+    jobs = JobStore(tmp_path / "jobs.db")
+    save_event(state, root, "old-event", ttl=10)
+    save_event(state, root, "new-event")
+    job_id = jobs.create("old-event", 10)
+    jobs.update(job_id, status="succeeded")
+    evicted = []
+    sweeper = Sweeper(state, jobs, root=root, interval=0, on_evict=evicted.append)
+    
+    assert sweeper.sweep(time.time() + 30) == 1
+    assert evicted == ["old-event"]
+    assert state.load("old-event") is None
+    assert not event_directory("old-event", root).exists()
+    assert jobs.get(job_id) is None
+    assert state.load("new-event") is not None
+    assert find_store(event_directory("new-event", root)) is not None
+    # Another worker sweeping the same events finds nothing left to do
+    assert Sweeper(state, jobs, root=root, interval=0).sweep(time.time() + 30) == 0
+
+def test_sweep_archives_expired_events(tmp_path, state):
+    root = tmp_path / "pairings"
+    save_event(state, root, "old-event", ttl=10)
+    sweeper = Sweeper(state, root=root, interval=0, archive=tmp_path / "archive")
+    assert sweeper.sweep(time.time() + 30) == 1
+    with tarfile.open(tmp_path / "archive" / "old-event.tar.gz") as archive:
+        assert "./pairings.db" in archive.getnames()
@@ -108,7 +108,7 @@ def test_save_pairings(santa, tmp_path):
     pairings = {"Alice": "Bob", "Bob": "Alice"}
     # Pass base_dir to save in tmp_path
     base_dir = str(tmp_path / "secret_santa_pairings")
-    santa.save_pairings(pairings, base_dir=base_dir)
+    santa.save_pairings(pairings, base_dir=base_dir, backend="json")
     
     # Check that files were created
     assert (tmp_path / "secret_santa_pairings" / "Alice.json").exists()
@@ -120,4 +120,131 @@ def test_save_pairings(santa, tmp_path):
         alice_data = json.load(f)
         assert alice_data["giver"] == "Alice"
         assert alice_data["receiver"] == "Bob"
-        assert "password" in alice_data 
\ No newline at end of file
+        assert "password" in alice_data 
+
+def test_save_pairings_sqlite(santa, tmp_path):
+    santa.add_participant("Alice")
+    santa.add_participant("Bob")
+    
+    pairings = {"Alice": "Bob", "Bob": "Alice"}
+    base_dir = tmp_path / "secret_santa_pairings"
+    santa.save_pairings(pairings, base_dir=str(base_dir), backend="sqlite")
+    
+    # A single file holds the whole event
+    assert [p.name for p in base_dir.iterdir()] == ["pairings.db"]
+
+def test_generate_pairings_matching(santa):
+    santa.add_participant("Alice", ["Bob"])
+    santa.add_participant("Bob", ["Alice"])
+    santa.add_participant("Charlie")
+    santa.add_participant("Diana")
+    
+    pairings = santa.generate_pairings(strategy="matching")
+    assert pairings is not None
+    assert sorted(pairings) == sorted(pairings.values()) == ["Alice", "Bob", "Charlie", "Diana"]
+    for giver, receiver in pairings.items():
+        assert giver != receiver
+    assert pairings["Alice"] != "Bob"
+    assert pairings["Bob"] != "Alice"
+
+def test_generate_pairings_matching_impossible(santa):
+    santa.add_participant("Alice", ["Bob", "Charlie"])
+    santa.add_participant("Bob", ["Alice", "Charlie"])
+    santa.add_participant("Charlie", ["Alice", "Bob"])
+    
+    assert santa.generate_pairings(strategy="matching") is None
+
+def test_generate_pairings_matching_large_roster(santa):
+    # Households of four who must not draw each other
+    for i in range(2000):
+        household = [f"P{j}" for j in range(i - i % 4, i - i % 4 + 4) if j != i]
+        santa.add_participant(f"P{i}", household)
+    
+    pairings = santa.generate_pairings(strategy="matching")
+    assert pairings is not None
+    assert len(set(pairings.values())) == 2000
+    for giver, receiver in pairings.items():
+        assert receiver != giver
+        assert receiver not in santa.participants[giver]
+
+def test_generate_pairings_unknown_strategy(santa):
+    santa.add_participant("Alice")
+    santa.add_participant("Bob")
+    assert santa.generate_pairings(strategy="bogus") is None
+
+def test_compile_model_is_cached(santa):
+    santa.add_participant("Alice", ["Bob"])
+    santa.add_participant("Bob")
+    model = santa.compile_model()
+    assert model is santa.compile_model()
+    assert not model.allowed(model.index["Bob"], model.index["Alice"])
+    
+    # Adding a participant invalidates the compiled model
+    santa.add_participant("Charlie")
+    assert santa.compile_model() is not model
+    assert len(santa.compile_model()) == 3
+
+def test_compile_model_invalid_exclusions(santa):
+    santa.add_participant("Alice", ["Nobody"])
+    assert santa.compile_model() is None
+
+@pytest.mark.parametrize("strategy", ["auto", "derangement", "cycle"])
+def test_generate_pairings_fast_paths(santa, strategy):
+    for i in range(50):
+        santa.add_participant(f"P{i}", [f"P{i + 1}"] if i % 10 == 0 else [])
+    
+    pairings = santa.generate_pairings(strategy=strategy)
+    assert pairings is not None
+    assert sorted(pairings.values()) == sorted(santa.participants)
+    for giver, receiver in pairings.items():
+        assert giver != receiver
+        assert receiver not in santa.participants[giver]
+        assert giver not in santa.participants[receiver]
+
+def test_generate_pairings_cycle_is_single_circle(santa):
+    for i in range(30):
+        santa.add_participant(f"P{i}", [f"P{(i + 1) % 30}"])
+    
+    pairings = santa.generate_pairings(strategy="cycle")
+    assert pairings is not None
+    giver, seen = "P0", set()
+    while giver not in seen:
+        seen.add(giver)
+        giver = pairings[giver]
+    assert len(seen) == 30
+
+def test_generate_pairings_derangement_impossible(santa):
+    santa.add_participant("Alice", ["Bob", "Charlie"])
+    santa.add_participant("Bob", ["Alice", "Charlie"])
+    santa.add_participant("Charlie", ["Alice", "Bob"])
+    
+    assert santa.generate_pairings(strategy="derangement") is None
+    assert santa.generate_pairings(strategy="cycle") is None
+
+@pytest.mark.parametrize("strategy", ["auto", "matching", "shuffle", "derangement", "cycle"])
+def test_generate_pairings_respects_groups(santa, strategy):
+    for i in range(40):
+        santa.add_participant(f"P{i}", groups=[f"Team{i % 4}"])
+    
+    pairings = santa.generate_pairings(strategy=strategy)
+    assert pairings is not None
+    for giver, receiver in pairings.items():
+        assert santa.groups[giver].isdisjoint(santa.groups[receiver])
+
+def test_generate_pairings_group_too_large(santa):
+    for i in range(5):
+        santa.add_participant(f"P{i}", groups=["Everyone"] if i < 3 else [])
+    assert santa.generate_pairings(strategy="matching") is None
+
+def test_check_feasibility_reports_conflict(santa):
+    for i in range(5):
+        santa.add_participant(f"P{i}", groups=["Everyone"] if i < 3 else [])
+    assert santa.check_feasibility() == {"feasible": False, "participants": ["P0", "P1", "P2"],
+                                         "receivers": ["P3", "P4"]}
+    santa.add_participant("P5")
+    assert santa.check_feasibility() == {"feasible": True}
+
+def test_groups_survive_state_roundtrip(santa):
+    santa.add_participant("Alice", groups=["Smiths"])
+    santa.add_participant("Bob")
+    assert SecretSanta.from_state(santa.to_state()).groups == {"Alice": {"Smiths"}}
@@ -0,0 +1,161 @@
+import random
+import pytest
+from collections import Counter
+from itertools import permutations
+from constraints import ConstraintModel
+import solvers
+from solvers import hall_violator, multi_gift_pairings, weighted_pairings, random_cycle, random_derangement, sharded_pairings, uniform_pairings
+
+def test_random_derangement_has_no_fixed_points():
+    for size in [2, 3, 10, 1000]:
+        values = random_derangement(size)
+        assert sorted(values) == list(range(size))
+        assert all(value != i for i, value in enumerate(values))
+
+def test_random_derangement_is_uniform():
+    # There are 9 derangements of 4 elements
+    counts = Counter(tuple(random_derangement(4)) for _ in range(9000))
+    assert len(counts) == 9
+    assert min(counts.values()) > 800
+
+def test_random_cycle_is_single_cycle():
+    values = random_cycle(100)
+    node, seen = 0, set()
+    while node not in seen:
+        seen.add(node)
+        node = values[node]
+    assert len(seen) == 100
+
+def test_multi_gift_pairings_are_regular_and_valid():
+    participants = {f"P{i}": set() for i in range(200)}
+    participants["P0"] = {"P1", "P2"}
+    model = ConstraintModel.compile(participants, {f"P{i}": {f"H{i // 4}"} for i in range(200)})
+    pairings = multi_gift_pairings(model, 3)
+    
+    assert sorted(pairings) == sorted(participants)
+    received = Counter(receiver for receivers in pairings.values() for receiver in receivers)
+    assert set(received.values()) == {3}
+    for giver, receivers in pairings.items():
+        assert len(set(receivers)) == 3
+        assert all(model.allowed(model.index[giver], model.index[r]) for r in receivers)
+
+def test_multi_gift_pairings_infeasible():
+    model = ConstraintModel.compile({"A": set(), "B": set(), "C": set()})
+    # Everyone has exactly two possible receivers
+    assert len(multi_gift_pairings(model, 2)["A"]) == 2
+    assert multi_gift_pairings(model, 3) is None
+    blocked = ConstraintModel.compile({"A": {"B"}, "B": set(), "C": set()})
+    assert multi_gift_pairings(blocked, 2) is None
+
+def test_uniform_pairings_is_uniform_over_valid_assignments():
+    model = ConstraintModel.compile({"A": {"B"}, "B": set(), "C": set(), "D": set(), "E": set()})
+    valid = [p for p in permutations(range(5)) if all(model.allowed(g, r) for g, r in enumerate(p))]
+    counts = Counter(tuple(sorted(uniform_pairings(model, steps=200).items())) for _ in range(len(valid) * 200))
+    assert len(counts) == len(valid)
+    assert min(counts.values()) > 120
+    assert max(counts.values()) < 290
+
+def test_uniform_pairings_at_scale():
+    participants = {f"P{i}": {f"P{(i + 1) % 5000}", f"P{(i + 7) % 5000}"} for i in range(5000)}
+    model = ConstraintModel.compile(participants, {f"P{i}": {f"H{i // 5}"} for i in range(5000)})
+    stats = {}
+    pairings = uniform_pairings(model, stats=stats)
+    assert sorted(pairings.values()) == sorted(participants)
+    assert all(model.allowed(model.index[g], model.index[r]) for g, r in pairings.items())
+    assert stats['accepted'] > stats['steps'] // 2
+
+def test_uniform_pairings_infeasible():
+    model = ConstraintModel.compile({"A": {"B"}, "B": set()})
+    assert uniform_pairings(model) is None
+
+def test_sharded_pairings_respects_cross_shard_exclusions(monkeypatch):
+    monkeypatch.setattr(solvers, "MIN_SHARD_SIZE", 10)
+    participants = {f"P{i}": {f"P{(i + 1) % 200}", f"P{(i + 50) % 200}"} for i in range(200)}
+    model = ConstraintModel.compile(participants, {f"P{i}": {f"H{i // 4}"} for i in range(200)})
+    stats = {}
+    pairings = sharded_pairings(model, shards=4, workers=2, stats=stats)
+    assert stats['shards'] == 4
+    assert sorted(pairings.values()) == sorted(participants)
+    assert all(model.allowed(model.index[g], model.index[r]) for g, r in pairings.items())
+
+def test_sharded_pairings_repairs_infeasible_blocks(monkeypatch):
+    monkeypatch.setattr(solvers, "MIN_SHARD_SIZE", 2)
+    # Everyone in one group except one outsider: no block without the
+    # outsider can be solved alone, and neither can the whole roster
+    model = ConstraintModel.compile({f"P{i}": set() for i in range(8)}, {f"P{i}": {"team"} for i in range(7)})
+    assert sharded_pairings(model, shards=4, workers=1) is None
+    
+    # Two teams of four: a block may fail on its own, but the repair finds a global answer
+    model = ConstraintModel.compile({f"P{i}": set() for i in range(8)}, {f"P{i}": {f"T{i % 2}"} for i in range(8)})
+    stats = {}
+    pairings = sharded_pairings(model, shards=4, workers=1, stats=stats)
+    assert all(model.allowed(model.index[g], model.index[r]) for g, r in pairings.items())
+    assert sorted(pairings.values()) == sorted(model.names)
+
+def test_sharded_pairings_small_roster_uses_auto():
+    stats = {}
+    model = ConstraintModel.compile({"A": set(), "B": set(), "C": set()})
+    assert len(sharded_pairings(model, stats=stats)) == 3
+    assert stats['shards'] == 1
+
+def test_hall_violator_none_for_feasible_roster():
+    model = ConstraintModel.compile({"A": {"B"}, "B": set(), "C": set(), "D": set()})
+    assert hall_violator(model) is None
+
+def test_hall_violator_finds_minimal_conflict():
+    # Six of ten share a household: any five of them only have the four outsiders to draw
+    names = [f"P{i}" for i in range(10)]
+    model = ConstraintModel.compile({name: set() for name in names}, {f"P{i}": {"home"} for i in range(6)})
+    givers, receivers = hall_violator(model)
+    assert len(givers) == 5 and set(givers) <= {f"P{i}" for i in range(6)}
+    assert receivers == ["P6", "P7", "P8", "P9"]
+
+def test_hall_violator_deadline():
+    model = ConstraintModel.compile({"A": {"B", "C"}, "B": set(), "C": set()})
+    with pytest.raises(TimeoutError):
+        hall_violator(model, deadline=0)
+    assert hall_violator(model) == (["A"], [])
+
+def test_hall_violator_certificate_is_valid():
+    for trial in range(200):
+        names = [f"P{i}" for i in range(6)]
+        participants = {name: {other for other in names if other != name and random.random() < 0.5} for name in names}
+        model = ConstraintModel.compile(participants)
+        feasible = any(all(model.allowed(g, r) for g, r in enumerate(p)) for p in permutations(range(6)))
+        conflict = hall_violator(model)
+        assert (conflict is None) == feasible
+        if conflict is not None:
+            givers = [model.index[name] for name in conflict[0]]
+            drawable = {model.names[r] for g in givers for r in range(6) if model.allowed(g, r)}
+            assert sorted(drawable) == sorted(conflict[1])
+            assert len(drawable) < len(givers)
+
+def test_weighted_pairings_finds_cheapest_assignment():
+    for trial in range(200):
+        size = random.randint(2, 6)
+        names = [f"P{i}" for i in range(size)]
+        participants = {name: {other for other in names if other != name and random.random() < 0.2} for name in names}
+        model = ConstraintModel.compile(participants, {name: {"team"} for name in names if random.random() < 0.2})
+        # Dense penalties force the exact fallback most of the time
+        costs = {(g, r): random.choice([1, 10, 100]) for g in range(size) for r in range(size) if random.random() < 0.6}
+        valid = [p for p in permutations(range(size)) if all(model.allowed(g, r) for g, r in enumerate(p))]
+        pairings = weighted_pairings(model, costs)
+        if not valid:
+            assert pairings is None
+            continue
+        receiver_of = [model.index[pairings[name]] for name in names]
+        assert receiver_of in [list(p) for p in valid]
+        cost = sum(costs.get((g, r), 0) for g, r in enumerate(receiver_of))
+        assert cost == min(sum(costs.get((g, r), 0) for g, r in enumerate(p)) for p in valid)
+
+def test_matching_pairings_large_teams_need_few_repairs():
+    participants = {f"P{i}": set() for i in range(4000)}
+    # Three teams, one of them nearly half the roster, plus households
+    groups = {f"P{i}": {"T0" if i < 1900 else "T1" if i < 3400 else "T2", f"H{i // 4}"} for i in range(4000)}
+    model = ConstraintModel.compile(participants, groups)
+    stats = {}
+    pairings = solvers.matching_pairings(model, stats=stats)
+
+    assert sorted(pairings.values()) == sorted(participants)
+    assert all(model.allowed(model.index[g], model.index[r]) for g, r in pairings.items())
+    assert stats['repairs'] < 100
@@ -0,0 +1,92 @@
+import pytest
+from storage import (DirectoryStore, SQLiteStore, event_directories, event_directory, find_store,
+                     migrate_directory, open_store)
+
+PAIRINGS = {"Alice": "Bob", "Bob": "Charlie", "Charlie": "Alice"}
+PASSWORDS = {"Alice": "111111", "Bob": "222222", "Charlie": "333333"}
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    return open_store(tmp_path / "event", request.param)
+
+def test_write_and_lookup(store):
+    assert not store.exists()
+    store.write(PAIRINGS, PASSWORDS)
+    assert store.exists()
+    assert store.lookup("Bob") == {"giver": "Bob", "receiver": "Charlie", "password": "222222"}
+    assert store.lookup("Zoe") is None
+
+def test_read_master_list(store):
+    store.write(PAIRINGS, PASSWORDS)
+    assert store.read_master_list() == {"pairings": PAIRINGS, "passwords": PASSWORDS}
+
+def test_sqlite_rewrite_replaces_event(tmp_path):
+    store = SQLiteStore(tmp_path)
+    store.write(PAIRINGS, PASSWORDS)
+    store.write({"Alice": "Bob", "Bob": "Alice"}, PASSWORDS)
+    assert store.lookup("Charlie") is None
+    assert store.lookup("Bob")["receiver"] == "Alice"
+
+def test_lookup_missing_sqlite_file(tmp_path):
+    assert SQLiteStore(tmp_path).lookup("Alice") is None
+
+def test_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        open_store(tmp_path, "redis")
+
+def test_find_store_prefers_sqlite(tmp_path):
+    assert find_store(tmp_path) is None
+    DirectoryStore(tmp_path).write(PAIRINGS, PASSWORDS)
+    assert isinstance(find_store(tmp_path), DirectoryStore)
+    SQLiteStore(tmp_path).write(PAIRINGS, PASSWORDS)
+    assert isinstance(find_store(tmp_path), SQLiteStore)
+
+def test_migrate_directory(tmp_path):
+    DirectoryStore(tmp_path).write(PAIRINGS, PASSWORDS)
+    assert migrate_directory(tmp_path, remove_json=True) is True
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["pairings.db"]
+    assert SQLiteStore(tmp_path).read_master_list() == {"pairings": PAIRINGS, "passwords": PASSWORDS}
+
+def test_migrate_directory_without_event(tmp_path):
+    assert migrate_directory(tmp_path) is False
+
+def test_multi_gift_receivers(store):
+    pairings = {"Alice": ["Bob", "Charlie"], "Bob": ["Charlie", "Alice"], "Charlie": ["Alice", "Bob"]}
+    store.write(pairings, PASSWORDS)
+    assert store.lookup("Bob") == {
+        "giver": "Bob", "receiver": "Charlie", "receivers": ["Charlie", "Alice"], "password": "222222"
+    }
+    store.update({"Alice": ["Charlie", "Bob"]}, PASSWORDS)
+    assert store.read_master_list()["pairings"]["Alice"] == ["Charlie", "Bob"]
+
+def test_sqlite_file_without_receivers_column(tmp_path):
+    import sqlite3
+    tmp_path.mkdir(exist_ok=True)
+    conn = sqlite3.connect(tmp_path / "pairings.db")
+    with conn:
+        conn.execute("CREATE TABLE assignments (giver TEXT PRIMARY KEY, receiver TEXT NOT NULL, "
+                     "password TEXT NOT NULL) WITHOUT ROWID")
+        conn.execute("INSERT INTO assignments VALUES ('Alice', 'Bob', '111111')")
+    conn.close()
+    store = SQLiteStore(tmp_path)
+    assert store.lookup("Alice") == {"giver": "Alice", "receiver": "Bob", "password": "111111"}
+    store.update({"Bob": ["Alice", "Charlie"]}, PASSWORDS)
+    assert store.lookup("Bob")["receivers"] == ["Alice", "Charlie"]
+
+def test_event_directory_is_sharded(tmp_path):
+    assert event_directory("ab12-event", tmp_path) == tmp_path / "ab" / "ab12-event"
+    # Events saved before sharding stay where they are
+    (tmp_path / "old-event").mkdir()
+    assert event_directory("old-event", tmp_path) == tmp_path / "old-event"
+    
+    SQLiteStore(event_directory("ab12-event", tmp_path)).write({"A": "B", "B": "A"}, {"A": "1", "B": "2"})
+    assert event_directories(tmp_path) == [tmp_path / "ab" / "ab12-event", tmp_path / "old-event"]
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_assignments_in_pages(tmp_path, backend):
+    store = open_store(tmp_path, backend)
+    store.write({"A": "B", "B": "C", "C": "A"}, {"C": "3", "A": "1", "B": "2"})
+    givers = lambda records: [(r["giver"], r["receiver"], r["password"]) for r in records]
+    assert givers(store.assignments()) == [("A", "B", "1"), ("B", "C", "2"), ("C", "A", "3")]
+    assert givers(store.assignments(limit=2)) == [("A", "B", "1"), ("B", "C", "2")]
+    assert givers(store.assignments(after="B")) == [("C", "A", "3")]
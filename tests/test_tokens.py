@@ -0,0 +1,56 @@
+import base64
+import pytest
+from tokens import RevocationCache, TokenError, issue, verify
+
+SECRET = "server-secret"
+
+def test_issue_and_verify():
+    token = issue(SECRET, "event1", "Alice", "Bob", ttl=60, now=1000.5)
+    claims = verify(SECRET, token, now=1010)
+    assert claims == {"event_id": "event1", "giver": "Alice", "receiver": "Bob", "issued": 1000.5, "expires": 1060}
+    # The receiver is encrypted, not just signed
+    assert "Bob" not in token and b"Bob" not in token.encode()
+    assert verify(SECRET, issue(SECRET, "event1", "Alice", ["Bob", "Carol"]))["receiver"] == ["Bob", "Carol"]
+
+@pytest.mark.parametrize("tamper", [
+    lambda token: token[:-2] + ("A" if token[-2] != "A" else "B") + token[-1],
+    lambda token: token[:10] + ("A" if token[10] != "A" else "B") + token[11:],
+    lambda token: token[:20],
+    lambda token: "not a token!",
+])
+def test_rejects_tampered_tokens(tamper):
+    token = issue(SECRET, "event1", "Alice", "Bob")
+    with pytest.raises(TokenError):
+        verify(SECRET, tamper(token))
+
+def test_rejects_other_versions():
+    token = issue(SECRET, "event1", "Alice", "Bob")
+    raw = bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    raw[0] = 1
+    with pytest.raises(TokenError, match="Malformed"):
+        verify(SECRET, base64.urlsafe_b64encode(bytes(raw)).decode())
+
+def test_rejects_other_secret_and_expired_tokens():
+    token = issue(SECRET, "event1", "Alice", "Bob", ttl=60, now=1000)
+    with pytest.raises(TokenError, match="Invalid"):
+        verify("other-secret", token, now=1010)
+    with pytest.raises(TokenError, match="expired"):
+        verify(SECRET, token, now=1060)
+
+def test_revocation_cache():
+    revoked = {}
+    loads = []
+    cache = RevocationCache(lambda: loads.append(1) or dict(revoked), refresh=3600)
+    claims = {"event_id": "event1", "giver": "Alice", "issued": 100.0}
+    assert not cache.revoked(claims)
+    
+    revoked[("event1", "Alice")] = 150.0
+    assert not cache.revoked(claims)  # Still using the cached list
+    cache.invalidate()
+    assert cache.revoked(claims)
+    assert not cache.revoked({**claims, "giver": "Bob"})
+    revoked[("event1", "")] = 150.0
+    cache.invalidate()
+    assert cache.revoked({**claims, "giver": "Bob"})
+    assert not cache.revoked({**claims, "issued": 200.0})
+    assert len(loads) == 3
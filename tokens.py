@@ -0,0 +1,117 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Server secret every replica must share; reveal tokens are off without it
+SECRET = os.environ.get("REVEAL_TOKEN_KEY", "")
+# Seconds a token stays valid after it is issued
+DEFAULT_TTL = float(os.environ.get("REVEAL_TOKEN_TTL", 30 * 24 * 3600))
+# Seconds a worker keeps using its copy of the revocation list
+REFRESH_INTERVAL = 5.0
+
+# Version 1 tokens used a home-made cipher and no longer verify
+VERSION = 2
+NONCE_BYTES = 12
+TAG_BYTES = 16
+
+
+class TokenError(Exception):
+    """Raised for tokens that are malformed, forged, expired or revoked."""
+
+
+def event_key(secret: Union[str, bytes], event_id: str) -> bytes:
+    """Derive an event's key from the server secret.
+
+    Keys are never stored: any replica holding the secret derives the
+    same key from the event id carried in the token.
+    """
+    if isinstance(secret, str):
+        secret = secret.encode()
+    return hmac.new(secret, b"event:" + event_id.encode(), hashlib.sha256).digest()
+
+
+def issue(secret: Union[str, bytes], event_id: str, giver: str, receiver: Union[str, List[str]],
+          ttl: float = DEFAULT_TTL, now: Optional[float] = None) -> str:
+    """Return a URL-safe token revealing ``giver``'s receiver(s).
+
+    The event id travels in the clear so the verifier can derive the key;
+    the giver, receiver and times are encrypted with AES-256-GCM, which
+    also authenticates the event id.
+    """
+    if now is None:
+        now = time.time()
+    plaintext = json.dumps({"g": giver, "r": receiver, "iat": now, "exp": int(now + ttl)},
+                           separators=(",", ":")).encode()
+    nonce = os.urandom(NONCE_BYTES)
+    event = event_id.encode()
+    header = struct.pack(">BH", VERSION, len(event)) + event
+    sealed = AESGCM(event_key(secret, event_id)).encrypt(nonce, plaintext, header)
+    return base64.urlsafe_b64encode(header + nonce + sealed).decode().rstrip("=")
+
+
+def verify(secret: Union[str, bytes], token: str, now: Optional[float] = None) -> Dict:
+    """Check a token and return its claims.
+
+    The result has ``event_id``, ``giver``, ``receiver``, ``issued`` and
+    ``expires``. Raises TokenError for anything that does not verify.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        version, length = struct.unpack_from(">BH", raw)
+        event_id = raw[3:3 + length].decode()
+    except (ValueError, struct.error, UnicodeDecodeError):
+        raise TokenError("Malformed token")
+    start = 3 + length + NONCE_BYTES
+    if version != VERSION or len(raw) < start + TAG_BYTES:
+        raise TokenError("Malformed token")
+
+    header, nonce = raw[:3 + length], raw[3 + length:start]
+    try:
+        plaintext = AESGCM(event_key(secret, event_id)).decrypt(nonce, raw[start:], header)
+    except InvalidTag:
+        raise TokenError("Invalid token")
+    claims = json.loads(plaintext)
+
+    if (time.time() if now is None else now) >= claims["exp"]:
+        raise TokenError("Token expired")
+    return {"event_id": event_id, "giver": claims["g"], "receiver": claims["r"],
+            "issued": claims["iat"], "expires": claims["exp"]}
+
+
+class RevocationCache:
+    """A worker's copy of the revoked events and givers.
+
+    ``load()`` returns ``{(event_id, giver): revoked_before}``, with an
+    empty giver for a whole event. It is called at most every ``refresh``
+    seconds, so checking a token stays free of I/O; a revocation reaches
+    every worker within that delay.
+    """
+
+    def __init__(self, load: Callable[[], Dict[Tuple[str, str], float]], refresh: float = REFRESH_INTERVAL):
+        self.load = load
+        self.refresh = refresh
+        self._revoked: Dict[Tuple[str, str], float] = {}
+        self._loaded = None
+
+    def revoked(self, claims: Dict) -> bool:
+        """Whether the token with these claims was issued before a revocation."""
+        now = time.monotonic()
+        if self._loaded is None or now - self._loaded >= self.refresh:
+            self._revoked = self.load()
+            self._loaded = now
+        for key in ((claims["event_id"], ""), (claims["event_id"], claims["giver"])):
+            if claims["issued"] <= self._revoked.get(key, float("-inf")):
+                return True
+        return False
+
+    def invalidate(self) -> None:
+        """Reload on the next check, e.g. after this worker revoked something."""
+        self._loaded = None